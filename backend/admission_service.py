@@ -0,0 +1,215 @@
+import os
+import math
+import time
+import logging
+import threading
+from functools import lru_cache
+from contextlib import contextmanager
+from config import get_int_env, get_float_env
+from ingest_service import open_mapped
+
+logger = logging.getLogger(__name__)
+
+# 渲染后的页面按 RGB 每像素3字节估算
+BYTES_PER_PIXEL = 3
+# 文本提取：PyPDF2 解析出的对象约为文件大小的数倍，另加每页文本
+PARSE_BYTES_PER_FILE_BYTE = 4
+TEXT_BYTES_PER_PAGE = 64 * 1024
+# 降级渲染时的最低DPI
+MIN_RENDER_DPI = 36
+# 单个请求最多占用全局内存预算的比例，超出时先降级
+REQUEST_BUDGET_RATIO = 0.5
+# 读不到页面尺寸时按 A4 估算
+DEFAULT_PAGE_SIZE = (595, 842)
+# CPU耗时的粗略估算（单核秒）：渲染按页数和像素数，文本提取按页数和文件大小
+RENDER_SECONDS_PER_PAGE = 0.05
+RENDER_SECONDS_PER_MEGAPIXEL = 0.1
+EXTRACT_SECONDS_PER_PAGE = 0.03
+EXTRACT_SECONDS_PER_MB = 0.5
+
+class DocumentTooLargeError(Exception):
+    """文档超出处理上限，降级后仍无法处理（返回413）"""
+
+class AdmissionBusyError(Exception):
+    """内存预算暂时不足，排队等待超时（返回503）"""
+
+class MemoryBudget:
+    """进程内的内存预算，按估算值预留和归还，预算不足时排队等待"""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.used = 0
+        self.cond = threading.Condition()
+
+    def acquire(self, amount, timeout):
+        """预留 amount 字节，timeout 秒内预留不到返回 False（math.inf 表示一直等待）"""
+        deadline = time.monotonic() + timeout
+        with self.cond:
+            while self.used + amount > self.capacity:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self.cond.wait(None if math.isinf(remaining) else remaining)
+            self.used += amount
+            return True
+
+    def release(self, amount):
+        with self.cond:
+            self.used -= amount
+            self.cond.notify_all()
+
+_budget = None
+_budget_lock = threading.Lock()
+
+def get_budget():
+    """获取（并按需创建）全局内存预算"""
+    global _budget
+    with _budget_lock:
+        if _budget is None:
+            _budget = MemoryBudget(max(1, get_int_env('ADMISSION_MEMORY_BUDGET_MB', 1024)) * 1024 * 1024)
+        return _budget
+
+def _mb(amount):
+    return math.ceil(amount / (1024 * 1024))
+
+@contextmanager
+def reserve(amount, operation, timeout=None):
+    """
+    在全局内存预算中预留估算的内存，操作结束后归还
+
+    超过整个预算的操作直接拒绝；预算暂时不足时最多等待 timeout 秒，
+    默认 ADMISSION_QUEUE_TIMEOUT，后台任务传 math.inf 一直等待。
+    """
+    budget = get_budget()
+    if amount > budget.capacity:
+        raise DocumentTooLargeError(f"{operation}预计需要约{_mb(amount)}MB内存，超出服务器处理上限")
+    if timeout is None:
+        timeout = get_float_env('ADMISSION_QUEUE_TIMEOUT', 30)
+    if not budget.acquire(amount, timeout):
+        logger.warning(f"内存预算不足，{operation}排队超时（需要{_mb(amount)}MB）")
+        raise AdmissionBusyError("服务器繁忙，请稍后重试")
+    try:
+        yield
+    finally:
+        budget.release(amount)
+
+def inspect_pdf(pdf_path):
+    """
+    读取PDF的页数和页面尺寸（只解析页面字典，不渲染）
+
+    Returns:
+        包含 pages、max_width、max_height（单位：点，1/72英寸）的字典
+    """
+    stat = os.stat(pdf_path)
+    return _inspect_pdf(os.path.abspath(pdf_path), stat.st_size, stat.st_mtime)
+
+@lru_cache(maxsize=256)
+def _inspect_pdf(pdf_path, size, mtime):
+    import PyPDF2
+
+    with open_mapped(pdf_path) as f:
+        reader = PyPDF2.PdfReader(f)
+        max_width, max_height = 0, 0
+        for page in reader.pages:
+            try:
+                box = page.mediabox
+                width, height = abs(float(box.width)), abs(float(box.height))
+            except Exception:
+                width, height = DEFAULT_PAGE_SIZE
+            max_width, max_height = max(max_width, width), max(max_height, height)
+        return {
+            'pages': len(reader.pages),
+            'max_width': max_width or DEFAULT_PAGE_SIZE[0],
+            'max_height': max_height or DEFAULT_PAGE_SIZE[1],
+            'size': size
+        }
+
+def _page_bytes(info, dpi):
+    """按最大页面尺寸估算单页渲染后的内存"""
+    return int(info['max_width'] / 72 * dpi) * int(info['max_height'] / 72 * dpi) * BYTES_PER_PIXEL
+
+def _max_cpu_seconds():
+    """单个操作允许的估算CPU耗时（秒）"""
+    return max(1, get_int_env('ADMISSION_MAX_CPU_SECONDS', 120))
+
+def render_seconds(info, dpi, pages):
+    """估算渲染 pages 页所需的CPU时间：页数 × (固定开销 + 像素数)，像素数与 DPI² 成正比"""
+    megapixels = _page_bytes(info, dpi) / BYTES_PER_PIXEL / 1e6
+    return pages * (RENDER_SECONDS_PER_PAGE + megapixels * RENDER_SECONDS_PER_MEGAPIXEL)
+
+def _capped_dpi(info, dpi):
+    """单页像素数不超过 ADMISSION_MAX_PAGE_MEGAPIXELS，超大页面（海报、工程图）自动降低DPI"""
+    max_pixels = get_int_env('ADMISSION_MAX_PAGE_MEGAPIXELS', 25) * 1000 * 1000
+    area = (info['max_width'] / 72) * (info['max_height'] / 72)
+    return min(dpi, int(math.sqrt(max_pixels / area)))
+
+def plan_page_render(info, dpi):
+    """
+    规划单页预览的渲染
+
+    Returns:
+        (实际使用的DPI, 预计内存字节数)
+    """
+    capped = _capped_dpi(info, dpi)
+    if capped < MIN_RENDER_DPI:
+        raise DocumentTooLargeError("页面尺寸过大，无法生成预览")
+    if capped < dpi:
+        logger.info(f"页面尺寸过大，预览DPI从{dpi}降为{capped}")
+    return capped, _page_bytes(info, capped)
+
+def plan_full_preview(info, dpi, batch_pages, workers):
+    """
+    规划整本预览：页数超过 PREVIEW_MAX_PAGES 时只预览前面的页面，
+    预计内存超过单个请求的份额时依次降低DPI和并行批次数；
+    预计CPU耗时超过 ADMISSION_MAX_CPU_SECONDS 时继续降低DPI，仍超出时减少预览页数
+
+    Returns:
+        包含 pages、dpi、workers、memory、cpu_seconds、downgraded 的字典
+    """
+    request_limit = int(get_budget().capacity * REQUEST_BUDGET_RATIO)
+    pages = min(info['pages'], max(1, get_int_env('PREVIEW_MAX_PAGES', 200)))
+    planned_dpi = max(MIN_RENDER_DPI, _capped_dpi(info, dpi))
+    in_flight = max(1, batch_pages * workers)
+    while _page_bytes(info, planned_dpi) * in_flight > request_limit:
+        if planned_dpi > MIN_RENDER_DPI:
+            planned_dpi = max(MIN_RENDER_DPI, planned_dpi * 3 // 4)
+        elif workers > 1:
+            workers -= 1
+            in_flight = batch_pages * workers
+        else:
+            break
+
+    max_seconds = _max_cpu_seconds()
+    while planned_dpi > MIN_RENDER_DPI and render_seconds(info, planned_dpi, pages) > max_seconds:
+        planned_dpi = max(MIN_RENDER_DPI, planned_dpi * 3 // 4)
+    if render_seconds(info, planned_dpi, pages) > max_seconds:
+        pages = max(1, int(max_seconds / render_seconds(info, planned_dpi, 1)))
+
+    plan = {
+        'pages': pages,
+        'dpi': planned_dpi,
+        'workers': workers,
+        'memory': _page_bytes(info, planned_dpi) * in_flight,
+        'cpu_seconds': render_seconds(info, planned_dpi, pages),
+        'downgraded': pages < info['pages'] or planned_dpi < dpi
+    }
+    if plan['downgraded']:
+        logger.info(f"整本预览降级: {info['pages']}页 -> {pages}页，DPI {dpi} -> {planned_dpi}，并行批次 {workers}")
+    return plan
+
+def extraction_memory(page_count, size):
+    """
+    估算提取文本所需的内存；页数超过 ADMISSION_MAX_PAGES，
+    或估算的CPU耗时超过 ADMISSION_MAX_CPU_SECONDS 时拒绝
+
+    Args:
+        page_count: 页数（文本文件为1）
+        size: 文件大小（字节）
+    """
+    max_pages = get_int_env('ADMISSION_MAX_PAGES', 2000)
+    if page_count > max_pages:
+        raise DocumentTooLargeError(f"文档共{page_count}页，超出{max_pages}页的处理上限")
+    seconds = page_count * EXTRACT_SECONDS_PER_PAGE + size / (1024 * 1024) * EXTRACT_SECONDS_PER_MB
+    if seconds > _max_cpu_seconds():
+        raise DocumentTooLargeError(f"提取文档文本预计需要约{math.ceil(seconds)}秒，超出服务器处理上限")
+    return size * PARSE_BYTES_PER_FILE_BYTE + page_count * TEXT_BYTES_PER_PAGE
@@ -1,14 +1,53 @@
 import json
 import re
 import logging
-from config import get_model
+from llm_gateway import call_model
+from quiz_parser import extract_json
 import ast
 
 logger = logging.getLogger(__name__)
 
+def grade_answers(user_answers, quiz_json):
+    """
+    逐题判分
+
+    Returns:
+        作答题目的列表，每项包含 name、type、title、choices、answer、correct_answer、is_correct
+    """
+    responses = []
+    try:
+        # 假设测验结构有pages和elements
+        for page in quiz_json.get('pages', []):
+            for question in page.get('elements', []):
+                question_id = question.get('name')
+                if not (question_id and question_id in user_answers):
+                    continue
+                user_answer = user_answers[question_id]
+                correct_answer = question.get('correctAnswer')
+
+                # 处理不同题型
+                if question.get('type') == 'text':  # 填空题
+                    # 填空题可能需要更灵活的答案匹配
+                    is_correct = str(user_answer).strip().lower() == str(correct_answer).strip().lower()
+                else:  # 选择题或其他类型
+                    is_correct = user_answer == correct_answer
+                responses.append({
+                    'name': question_id,
+                    'type': question.get('type'),
+                    'title': question.get('title'),
+                    'choices': question.get('choices'),
+                    'answer': user_answer,
+                    'correct_answer': correct_answer,
+                    'is_correct': is_correct
+                })
+    except Exception as e:
+        logger.error(f"处理答案时出错: {str(e)}")
+        # 继续执行，使用已收集的信息
+    return responses
+
 # 修改function signature以接受quiz_json参数
-def analyze_quiz_results(user_answers, quiz_json=None):
-    """分析测验结果"""
+def analyze_quiz_results(user_answers, quiz_json=None, responses=None):
+    """分析测验结果（responses 为 grade_answers 已经算好的判分结果，可省略）"""
     # 加载测验题目
     if quiz_json:
         # 使用传入的quiz_json
@@ -40,11 +79,10 @@ def analyze_quiz_results(user_answers, quiz_json=None):
                         quiz_json = create_default_quiz_json()
             except json.JSONDecodeError as e:
                 logger.error(f"JSON解析错误: {str(e)}")
-                # 尝试清理JSON字符串
-                json_str = clean_json_string(json_match.group(1) if json_match else content)
+                # 尝试修复JSON字符串
                 try:
-                    quiz_json = json.loads(json_str)
-                except:
+                    quiz_json = extract_json(json_match.group(1) if json_match else content)
+                except ValueError:
                     logger.warning("清理后仍无法解析JSON，使用默认结构")
                     quiz_json = create_default_quiz_json()
         except Exception as e:
@@ -53,47 +91,25 @@ def analyze_quiz_results(user_answers, quiz_json=None):
             quiz_json = create_default_quiz_json()
     
     # 比较答案，找出错误的题目
+    if responses is None:
+        responses = grade_answers(user_answers, quiz_json)
     incorrect_questions = []
-    correct_count = 0
-    total_questions = 0
-    
-    try:
-        # 假设测验结构有pages和elements
-        for page in quiz_json.get('pages', []):
-            for question in page.get('elements', []):
-                question_id = question.get('name')
-                if question_id and question_id in user_answers:
-                    total_questions += 1
-                    user_answer = user_answers[question_id]
-                    correct_answer = question.get('correctAnswer')
-                    
-                    # 处理不同题型
-                    if question.get('type') == 'text':  # 填空题
-                        # 填空题可能需要更灵活的答案匹配
-                        is_correct = user_answer.strip().lower() == correct_answer.strip().lower()
-                        if not is_correct:
-                            incorrect_questions.append({
-                                'question': question.get('title'),
-                                'userAnswer': user_answer,
-                                'correctAnswer': correct_answer,
-                                'type': 'text'  # 表明这是填空题
-                            })
-                        else:
-                            correct_count += 1
-                    else:  # 选择题或其他类型
-                        if user_answer != correct_answer:
-                            incorrect_questions.append({
-                                'question': question.get('title'),
-                                'userAnswer': user_answer,
-                                'correctAnswer': correct_answer,
-                                'options': question.get('choices'),
-                                'type': 'radiogroup'  # 表明这是选择题
-                            })
-                        else:
-                            correct_count += 1
-    except Exception as e:
-        logger.error(f"处理答案时出错: {str(e)}")
-        # 继续执行，使用已收集的信息
+    for response in responses:
+        if response['is_correct']:
+            continue
+        incorrect = {
+            'question': response['title'],
+            'userAnswer': response['answer'],
+            'correctAnswer': response['correct_answer'],
+        }
+        if response['type'] == 'text':
+            incorrect['type'] = 'text'  # 表明这是填空题
+        else:
+            incorrect['options'] = response['choices']
+            incorrect['type'] = 'radiogroup'  # 表明这是选择题
+        incorrect_questions.append(incorrect)
+    total_questions = len(responses)
+    correct_count = total_questions - len(incorrect_questions)
     
     # 使用AI分析结果
     try:
@@ -111,20 +127,6 @@ def analyze_quiz_results(user_answers, quiz_json=None):
         "knowledgeAnalysis": knowledge_analysis
     }
 
-def clean_json_string(json_str):
-    """清理JSON字符串中的问题"""
-    # 替换一些可能导致问题的特殊序列
-    replacements = [
-        (r'\\(?!["\\/bfnrt])', r'\\\\'),  # 修复不正确的转义
-        (r'(?<=[^\\])"(?=[^"]*"[^"]*$)', r'\\"'),  # 转义内部引号
-        (r'[\x00-\x1F]', ''),  # 移除控制字符
-    ]
-    
-    for pattern, replacement in replacements:
-        json_str = re.sub(pattern, replacement, json_str)
-    
-    return json_str
-
 def create_default_quiz_json():
     """创建一个默认的测验JSON结构"""
     return {
@@ -145,8 +147,6 @@ def create_default_quiz_json():
 
 def generate_analysis(total_questions, correct_count, incorrect_questions):
     """生成知识点分析"""
-    model = get_model()
-    
     # 如果没有错误题目，直接返回成功信息
     if not incorrect_questions:
         return "恭喜！您回答了所有问题正确。"
@@ -170,7 +170,7 @@ def generate_analysis(total_questions, correct_count, incorrect_questions):
     """
     
     try:
-        analysis_response = model.generate_content(analysis_prompt)
+        analysis_response = call_model(analysis_prompt)
         logger.info("成功生成知识点分析")
         return analysis_response.text
     except Exception as e:
@@ -1,25 +1,38 @@
-from flask import Flask, request, jsonify, g
+from flask import Flask, request, jsonify, g, Response, stream_with_context, send_file
 from flask_cors import CORS
 import logging
 import os
-import time
+import multiprocessing
 from functools import wraps
 import json
 import jwt as pyjwt
 from datetime import datetime, timedelta
 import hashlib
 from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.exceptions import RequestEntityTooLarge
 
 import config
-from quiz_service import generate_quiz, update_survey_json
-from file_service import extract_text_from_pdf, generate_pdf_previews
-from analysis_service import analyze_quiz_results
-from db_service import init_database, save_quiz, save_analysis, get_quiz_by_id, get_analysis_by_id, get_all_quizzes, get_all_analyses
+from http_client import get_pool_stats
+from llm_gateway import get_gateway_stats, ModelUnavailableError
+from quiz_service import generate_quiz_stream, update_survey_json
+from file_service import generate_pdf_previews
+from analysis_service import analyze_quiz_results, grade_answers
 from db_manager import (
     init_database, save_quiz, save_analysis, get_quiz_by_id, 
-    get_analysis_by_id, get_all_quizzes, get_all_analyses,
-    execute_query, insert_data, update_data, delete_data_by_id
+    get_analysis_by_id, list_quizzes, list_analyses, InvalidCursorError,
+    execute_query, insert_data, update_data, delete_data_by_id, assign_quiz_to_chapter,
+    transaction, release_connection, start_background_migrations,
+    save_item_responses, hardest_items, item_misses, teacher_owns_quiz
 )
+from job_service import submit_quiz_job, get_job, resume_pending_jobs, JobQueueFullError
+from question_bank import lookup_bank_quiz, store_quiz_questions, has_course_access, BANK_FILE_NAME
+from preview_service import register_document, get_page_preview, PreviewNotFoundError
+from document_store import (
+    save_document, require_document, get_documents_text, document_title, get_page_scores,
+    get_document_chapters, get_document_chapter, DocumentNotFoundError
+)
+from ingest_service import max_request_bytes, max_upload_bytes, UploadTooLargeError
+from admission_service import extraction_memory, DocumentTooLargeError, AdmissionBusyError
 # 确保从backend/manage导入正确的数据库操作函数
 import sys
 from os.path import dirname, abspath, join
@@ -36,35 +49,34 @@ logger = logging.getLogger(__name__)
 app = Flask(__name__)
 CORS(app)
 
-init_database()  # 初始化测验数据库
-# 初始化配置
-config.init_configuration()
+# 文本提取进程池以 spawn 方式启动子进程，子进程会重新导入本模块，此时跳过初始化
+if multiprocessing.parent_process() is None:
+    init_database()  # 初始化测验数据库
+    # 旧数据在后台逐步压缩JSON、补写逐题记录
+    start_background_migrations()
+    # 初始化配置（连接检查在后台预热线程中进行，不阻塞启动）
+    config.init_configuration()
+    # 恢复重启前未完成的生成任务（debug 模式下只在重载子进程中执行）
+    if __name__ != "__main__" or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        resume_pending_jobs()
+
+@app.teardown_appcontext
+def _release_db_connection(exc):
+    """请求结束后把数据库连接归还连接池"""
+    release_connection()
 
 # 添加 JWT 密钥配置
 app.config['JWT_SECRET_KEY'] = os.environ.get('JWT_SECRET_KEY', 'your-secret-key-for-jwt')
 app.config['JWT_EXPIRATION_DELTA'] = timedelta(hours=24)
+# 请求体大小上限：Content-Length 超限时在读取请求体之前拒绝，分块传输时读到超限即中止
+app.config['MAX_CONTENT_LENGTH'] = max_request_bytes()
+
+def _too_large_response():
+    return jsonify({"error": f"上传文件超过{max_upload_bytes() // (1024 * 1024)}MB上限"}), 413
 
-def with_retry(max_retries=3, backoff_factor=0.5, errors=(Exception,)):
-    """创建一个带有重试功能的装饰器"""
-    def decorator(func):
-        @wraps(func)
-        def wrapper(*args, **kwargs):
-            retries = 0
-            while retries < max_retries:
-                try:
-                    return func(*args, **kwargs)
-                except errors as e:
-                    retries += 1
-                    if retries >= max_retries:
-                        app.logger.error(f"函数 {func.__name__} 执行失败，已达到最大重试次数: {e}")
-                        raise
-                    
-                    # 指数退避
-                    sleep_time = backoff_factor * (2 ** (retries - 1))
-                    app.logger.warning(f"函数 {func.__name__} 失败，{retries}/{max_retries}次尝试。等待{sleep_time:.2f}秒后重试: {e}")
-                    time.sleep(sleep_time)
-        return wrapper
-    return decorator
+@app.errorhandler(RequestEntityTooLarge)
+def handle_request_too_large(e):
+    return _too_large_response()
 
 # 认证装饰器
 def token_required(f):
@@ -95,6 +107,31 @@ def token_required(f):
     
     return decorated
 
+def _optional_user():
+    """读取请求中的用户（不要求登录，令牌缺失或无效时返回None）"""
+    auth_header = request.headers.get('Authorization')
+    if not (auth_header and auth_header.startswith('Bearer ')):
+        return None
+    try:
+        data = pyjwt.decode(auth_header.split(' ')[1], app.config['JWT_SECRET_KEY'], algorithms=["HS256"])
+        return {'id': data['id'], 'username': data['username'], 'user_type': data['user_type']}
+    except Exception:
+        return None
+
+@app.route('/health/live', methods=['GET'])
+def health_live():
+    """存活检查：进程能响应即返回成功"""
+    return jsonify({"status": "alive"}), 200
+
+@app.route('/health/ready', methods=['GET'])
+def health_ready():
+    """就绪检查：后台预热（API连接、模型初始化）完成后返回成功"""
+    readiness = config.get_readiness()
+    readiness['http_pool'] = get_pool_stats()
+    readiness['llm_gateway'] = get_gateway_stats()
+    status_code = 200 if readiness['status'] == 'ready' else 503
+    return jsonify(readiness), status_code
+
 # 用户登录接口修改示例
 @app.route('/api/login', methods=['POST'])
 def login():
@@ -213,25 +250,154 @@ def preview_pdf():
         if file.filename == '' or not file.filename.lower().endswith('.pdf'):
             return jsonify({"error": "未选择PDF文件"}), 400
         
+        # 按页加载模式：只注册文档并返回页数，预览图通过 /pdf-preview/<doc_id>/<page> 按需获取
+        if request.form.get('mode') == 'lazy':
+            user = _optional_user()
+            doc_id, total_pages = register_document(file, user['id'] if user else None)
+            return jsonify({
+                "success": True,
+                "docId": doc_id,
+                "totalPages": total_pages
+            }), 200
+        
         # 生成预览图
-        previews = generate_pdf_previews(file)
+        result = generate_pdf_previews(file)
         
-        # 返回预览数据
+        # 返回预览数据（文档过大时只包含前面的页面，downgraded 为 true）
         return jsonify({
             "success": True, 
-            "previews": previews,
-            "totalPages": len(previews)
+            "previews": result['previews'],
+            "totalPages": result['total_pages'],
+            "downgraded": result['downgraded']
         }), 200
+    except (UploadTooLargeError, RequestEntityTooLarge):
+        return _too_large_response()
+    except DocumentTooLargeError as e:
+        return jsonify({"error": str(e)}), 413
+    except AdmissionBusyError as e:
+        return jsonify({"error": str(e)}), 503
     except Exception as e:
         logger.error(f"生成PDF预览失败: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
-# 修改 generate-quiz 接口，支持直接布置测验到特定课程
-@app.route('/generate-quiz', methods=['POST'])
+@app.route('/pdf-preview/<doc_id>/<int:page>', methods=['GET'])
 @token_required
-def create_quiz(current_user):
+def preview_pdf_page(current_user, doc_id, page):
+    """获取单页预览图（JPEG），支持 ETag 协商缓存"""
+    try:
+        path, etag = get_page_preview(doc_id, page, request.args.get('dpi', type=int))
+        response = send_file(path, mimetype='image/jpeg', etag=etag, conditional=True, max_age=86400)
+        # 需要登录才能获取，只允许浏览器缓存
+        response.cache_control.private = True
+        return response
+    except PreviewNotFoundError as e:
+        return jsonify({"error": str(e)}), 404
+    except DocumentTooLargeError as e:
+        return jsonify({"error": str(e)}), 413
+    except AdmissionBusyError as e:
+        return jsonify({"error": str(e)}), 503
+    except Exception as e:
+        logger.error(f"生成PDF单页预览失败: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+def _parse_quiz_params(form):
+    """从表单中解析测验生成参数"""
+    # 获取参数
+    question_count = int(form.get('questionCount', 10))
+    difficulty = form.get('difficulty', 'medium')
+    
+    # 获取题目类型
+    include_multiple_choice = form.get('includeMultipleChoice', 'true').lower() in ('true', '1', 't')
+    include_fill_in_blank = form.get('includeFillInBlank', 'false').lower() in ('true', '1', 't')
+    
+    # 如果两种题型都没选，默认选择选择题
+    if not include_multiple_choice and not include_fill_in_blank:
+        include_multiple_choice = True
+    
+    # 获取选定页面列表
+    selected_pages = form.get('selectedPages')
+    if selected_pages:
+        try:
+            selected_pages = json.loads(selected_pages)
+        except json.JSONDecodeError:
+            selected_pages = None
+    
+    # 是否跳过空白页、页眉页脚页和目录页，未指定时按 PAGE_TRIAGE_ENABLED
+    page_triage = form.get('pageTriage')
+    
+    # 按文档中识别出的章节生成（见 /documents/<doc_id>/chapters）
+    chapter_no = form.get('chapterNo')
+    if chapter_no not in (None, ''):
+        if not chapter_no.isdigit():
+            raise _InvalidSelectionError("chapterNo 必须是非负整数")
+        chapter_no = int(chapter_no)
+    else:
+        chapter_no = None
+    
+    return {
+        'question_count': question_count,
+        'difficulty': difficulty,
+        'include_multiple_choice': include_multiple_choice,
+        'include_fill_in_blank': include_fill_in_blank,
+        # 获取备注信息（可选）
+        'notes': form.get('notes', ''),
+        # 是否允许使用生成缓存（重新生成时可传 false）
+        'use_cache': form.get('useCache', 'true').lower() in ('true', '1', 't'),
+        # 是否从章节题库直接组卷（不上传文档时使用），默认不使用
+        'use_bank': form.get('useBank', 'false').lower() in ('true', '1', 't'),
+        'selected_pages': selected_pages,
+        'page_triage': page_triage.lower() in ('true', '1', 't') if page_triage else None,
+        'chapter_no': chapter_no,
+        # 如果是教师且指定了课程，则生成后直接布置测验到课程
+        'course_id': form.get('courseId'),
+        'chapter_name': form.get('chapterName') or None
+    }
+
+def _apply_document_scope(documents, params):
+    """
+    检查页面选择，并按识别出的章节限定页面范围
+
+    只有该章的页面会被提取并发送给模型；同时选择了页面时取两者的交集。
+    未填写章节名称时使用识别出的章节标题。多份文档时 selectedPages 需按文档ID分别指定，
+    且不支持按章节生成。
+    """
+    chapter_no = params.get('chapter_no')
+    if not documents:
+        if chapter_no is not None:
+            raise _InvalidSelectionError("按章节生成需要指定文档")
+        params['chapter_name'] = params['chapter_name'] or '默认章节'
+        return
+    if len(documents) > 1:
+        if chapter_no is not None:
+            raise _InvalidSelectionError("多文档生成时不支持按章节生成")
+        if params['selected_pages'] is not None and not isinstance(params['selected_pages'], dict):
+            raise _InvalidSelectionError("多文档生成时 selectedPages 需按文档ID分别指定")
+    elif isinstance(params['selected_pages'], dict):
+        params['selected_pages'] = params['selected_pages'].get(documents[0]['doc_id'])
+    
+    if chapter_no is None:
+        params['chapter_name'] = params['chapter_name'] or '默认章节'
+        return
+    
+    chapter = get_document_chapter(documents[0]['doc_id'], chapter_no)
+    if chapter is None:
+        raise _InvalidSelectionError(f"文档中不存在第{chapter_no + 1}章")
+    
+    chapter_pages = range(chapter['start_page'], chapter['end_page'] + 1)
+    if params['selected_pages']:
+        params['selected_pages'] = [page for page in params['selected_pages'] if page in chapter_pages]
+        if not params['selected_pages']:
+            raise _InvalidSelectionError("所选页面都不在该章范围内")
+    else:
+        params['selected_pages'] = list(chapter_pages)
+    params['chapter_name'] = params['chapter_name'] or chapter['title']
+
+# 修改 generate-quiz 接口：提交后台生成任务，立即返回任务ID
+@app.route('/documents', methods=['POST'])
+@token_required
+def upload_document(current_user):
+    """上传文档到文档存储，返回文档ID供预览和生成测验时引用"""
     try:
-        # 获取上传的文件
         if 'file' not in request.files:
             return jsonify({"error": "未上传文件"}), 400
         
@@ -239,97 +405,205 @@ def create_quiz(current_user):
         if file.filename == '':
             return jsonify({"error": "未选择文件"}), 400
         
-        # 获取参数
-        question_count = int(request.form.get('questionCount', 10))
-        difficulty = request.form.get('difficulty', 'medium')
-        
-        # 获取题目类型
-        include_multiple_choice = request.form.get('includeMultipleChoice', 'true').lower() in ('true', '1', 't')
-        include_fill_in_blank = request.form.get('includeFillInBlank', 'false').lower() in ('true', '1', 't')
-        
-        # 如果两种题型都没选，默认选择选择题
-        if not include_multiple_choice and not include_fill_in_blank:
-            include_multiple_choice = True
-        
-        # 获取备注信息（可选）
-        notes = request.form.get('notes', '')
-        
-        # 获取选定页面列表
-        selected_pages = request.form.get('selectedPages')
-        if selected_pages:
-            try:
-                selected_pages = json.loads(selected_pages)
-            except json.JSONDecodeError:
-                selected_pages = None
-        
-        # 提取文本
-        if file.filename.lower().endswith('.pdf'):
-            content = extract_text_from_pdf(file, selected_pages)
-        else:
-            content = file.read().decode('utf-8')
-        
-        # 生成测验题目
-        quiz_json = generate_quiz(content, question_count, difficulty, 
-                                 include_multiple_choice, include_fill_in_blank, notes)
-        
-        # 更新前端文件（保留原有功能）
-        update_survey_json(quiz_json)
-        
-        # 保存到数据库
-        file_name = file.filename
-        title = f"{file_name} - {difficulty}难度 ({question_count}题)"
-        quiz_id = save_quiz(title, file_name, quiz_json, question_count, difficulty)
-        
-        # 如果是教师且指定了课程，则直接布置测验到课程
-        course_id = request.form.get('courseId')
-        chapter_name = request.form.get('chapterName', '默认章节')
-        
-        if current_user['user_type'] == 'teacher' and course_id:
-            teacher_id = current_user['id']
+        document = save_document(file, user_id=current_user['id'])
+        return jsonify({
+            "success": True,
+            "docId": document['doc_id'],
+            "fileName": document['file_name'],
+            "totalPages": document['page_count']
+        }), 200
+    except (UploadTooLargeError, RequestEntityTooLarge):
+        return _too_large_response()
+    except Exception as e:
+        logger.error(f"上传文档失败: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/documents/<doc_id>/chapters', methods=['GET'])
+@token_required
+def get_document_chapter_list(current_user, doc_id):
+    """获取文档的章节划分（书签或章节标题识别），可按章节生成和布置测验"""
+    try:
+        return jsonify({"success": True, "chapters": get_document_chapters(doc_id)}), 200
+    except DocumentNotFoundError as e:
+        return jsonify({"error": str(e)}), 404
+    except DocumentTooLargeError as e:
+        return jsonify({"error": str(e)}), 413
+    except AdmissionBusyError as e:
+        return jsonify({"error": str(e)}), 503
+    except Exception as e:
+        logger.error(f"获取文档章节失败: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/documents/<doc_id>/pages', methods=['GET'])
+@token_required
+def get_document_pages(current_user, doc_id):
+    """获取文档每一页的价值评分，供预览界面标记和默认跳过低价值页面"""
+    try:
+        return jsonify({"success": True, "pages": get_page_scores(doc_id)}), 200
+    except DocumentNotFoundError as e:
+        return jsonify({"error": str(e)}), 404
+    except DocumentTooLargeError as e:
+        return jsonify({"error": str(e)}), 413
+    except AdmissionBusyError as e:
+        return jsonify({"error": str(e)}), 503
+    except Exception as e:
+        logger.error(f"获取页面评分失败: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+class _MissingFileError(Exception):
+    """请求中既没有文档ID也没有上传文件"""
+
+class _InvalidSelectionError(Exception):
+    """请求的页面或章节选择无效"""
+
+def _resolve_documents(req, user_id, allow_empty=False):
+    """
+    获取请求引用的文档：表单中的 docId 和上传的 file 都可以有多个
+
+    Args:
+        user_id: 当前用户，文档标题使用其上传时的文件名
+        allow_empty: 是否允许不引用文档（useBank=true 时只从题库组卷）
+
+    Returns:
+        文档信息列表（按 docId、file 的顺序，重复的文档只保留一次）
+    """
+    documents = [require_document(doc_id, user_id) for doc_id in req.form.getlist('docId') if doc_id]
+    for file in req.files.getlist('file'):
+        if file.filename:
+            documents.append(save_document(file, user_id=user_id))
+    if not documents and not allow_empty:
+        raise _MissingFileError("未上传文件" if 'file' not in req.files else "未选择文件")
+    
+    unique = {}
+    for document in documents:
+        unique.setdefault(document['doc_id'], document)
+    return list(unique.values())
+
+@app.route('/generate-quiz', methods=['POST'])
+@token_required
+def create_quiz(current_user):
+    try:
+        params = _parse_quiz_params(request.form)
+        # 获取文档（已上传的文档ID或新上传的文件，可以有多个）
+        documents = _resolve_documents(request, current_user['id'], allow_empty=params['use_bank'])
+        _apply_document_scope(documents, params)
+        # 页数超出上限的文档在提交任务前直接拒绝
+        for document in documents:
+            extraction_memory(document['page_count'], document['size'])
+        job_id = submit_quiz_job(documents, params, current_user)
+        return jsonify({"success": True, "job_id": job_id, "status": "queued"}), 202
+    except (_MissingFileError, _InvalidSelectionError) as e:
+        return jsonify({"error": str(e)}), 400
+    except (UploadTooLargeError, RequestEntityTooLarge):
+        return _too_large_response()
+    except DocumentNotFoundError as e:
+        return jsonify({"error": str(e)}), 404
+    except DocumentTooLargeError as e:
+        return jsonify({"error": str(e)}), 413
+    except JobQueueFullError as e:
+        return jsonify({"error": str(e)}), 503
+    except Exception as e:
+        logger.error(f"提交测验生成任务失败: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+def _sse_event(event, data):
+    """格式化一条 server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.route('/generate-quiz/stream', methods=['POST'])
+@token_required
+def stream_quiz(current_user):
+    """流式生成测验，每道题生成完成后立即通过SSE推送"""
+    try:
+        params = _parse_quiz_params(request.form)
+        documents = _resolve_documents(request, current_user['id'], allow_empty=params['use_bank'])
+        _apply_document_scope(documents, params)
+        file_name = document_title(documents) or BANK_FILE_NAME
+        
+        # 未引用文档且章节题库中已有足够题目时直接组卷，不提取文本也不调用模型
+        bank_quiz = lookup_bank_quiz(dict(params, doc_ids=[document['doc_id'] for document in documents]),
+                                     current_user['id'], current_user['user_type'])
+        if bank_quiz is None and not documents:
+            raise _MissingFileError("题库中符合条件的题目不足，请上传文件生成")
+        if bank_quiz is None:
+            # 提取文本（同一文档只解析一次）
+            content = get_documents_text([document['doc_id'] for document in documents],
+                                         params['selected_pages'], params['page_triage'])
+    except (_MissingFileError, _InvalidSelectionError) as e:
+        return jsonify({"error": str(e)}), 400
+    except (UploadTooLargeError, RequestEntityTooLarge):
+        return _too_large_response()
+    except DocumentNotFoundError as e:
+        return jsonify({"error": str(e)}), 404
+    except DocumentTooLargeError as e:
+        return jsonify({"error": str(e)}), 413
+    except AdmissionBusyError as e:
+        return jsonify({"error": str(e)}), 503
+    except Exception as e:
+        logger.error(f"生成测验失败: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+    
+    def generate():
+        try:
+            if bank_quiz is not None:
+                quiz_json = bank_quiz
+                for page in quiz_json['pages']:
+                    for question in page['elements']:
+                        yield _sse_event('question', question)
+            else:
+                quiz_json = None
+                for event in generate_quiz_stream(content, params['question_count'], params['difficulty'],
+                                                  params['include_multiple_choice'], params['include_fill_in_blank'],
+                                                  params['notes'], use_cache=params['use_cache']):
+                    if event['type'] == 'question':
+                        yield _sse_event('question', event['question'])
+                    else:
+                        quiz_json = event['quiz']
             
-            # 验证课程是否属于该教师
-            course_result = execute_query(
-                "SELECT * FROM course WHERE cno=? AND tno=?", 
-                (course_id, teacher_id)
-            )
+            # 更新前端文件（保留原有功能）
+            update_survey_json(quiz_json)
             
-            if course_result:
-                # 检查章节是否已存在
-                chapter_result = execute_query(
-                    "SELECT * FROM question WHERE qname=? AND cno=?",
-                    (chapter_name, course_id)
-                )
-                
-                if chapter_result:
-                    chapter_id = chapter_result[0]['qid']
-                else:
-                    # 创建新章节
-                    chapter_id = execute_query(
-                        "INSERT INTO question (qname, cno) VALUES (?, ?)",
-                        (chapter_name, course_id)
-                    )
-                
-                # 关联测验和章节
-                execute_query(
-                    "INSERT INTO quiz_chapters (quiz_id, chapter_id) VALUES (?, ?)",
-                    (quiz_id, chapter_id)
-                )
-                
-                return jsonify({
-                    "success": True, 
-                    "quiz_id": quiz_id, 
-                    "chapter_id": chapter_id,
-                    "message": "测验已成功创建并布置到课程"
-                }), 200
+            # 保存到数据库
+            title = f"{file_name} - {params['difficulty']}难度 ({params['question_count']}题)"
+            chapter_id = None
+            with transaction():
+                quiz_id = save_quiz(title, file_name, quiz_json, params['question_count'], params['difficulty'],
+                                    current_user['id'])
+                if current_user['user_type'] == 'teacher' and params['course_id']:
+                    chapter_id = assign_quiz_to_chapter(quiz_id, params['course_id'], current_user['id'],
+                                                        params['chapter_name'] or '默认章节')
+            if bank_quiz is None:
+                store_quiz_questions(quiz_json, params, chapter_id, quiz_id)
             
-        # 普通情况返回
-        return jsonify({"success": True, "quiz_id": quiz_id}), 200
+            yield _sse_event('done', {"success": True, "quiz_id": quiz_id, "chapter_id": chapter_id})
+        except ModelUnavailableError as e:
+            # 熔断或限流时快速失败，提示前端稍后重试
+            logger.warning(f"模型服务暂不可用: {str(e)}")
+            yield _sse_event('error', {"error": str(e), "status": 503})
+        except Exception as e:
+            logger.error(f"流式生成测验失败: {str(e)}")
+            yield _sse_event('error', {"error": str(e)})
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+@token_required
+def get_job_status(current_user, job_id):
+    """查询测验生成任务的进度和结果"""
+    try:
+        job = get_job(job_id)
+        if not job or job['user_id'] != str(current_user['id']):
+            return jsonify({"error": "任务不存在"}), 404
+        job.pop('user_id')
+        return jsonify(job), 200
     except Exception as e:
-        logger.error(f"生成测验失败: {str(e)}")
+        logger.error(f"获取任务状态失败: {str(e)}")
         return jsonify({"error": str(e)}), 500
     
 @app.route('/analyze-quiz', methods=['POST'])
-@with_retry(max_retries=3, backoff_factor=0.5)
 def analyze_quiz():
     try:
         # 获取用户答案和测验ID
@@ -345,14 +619,19 @@ def analyze_quiz():
             quiz = get_quiz_by_id(quiz_id)
             if not quiz:
                 return jsonify({"error": "测验不存在"}), 404
-            result = analyze_quiz_results(data['answers'], quiz['quiz_json'])
+            responses = grade_answers(data['answers'], quiz['quiz_json'])
+            result = analyze_quiz_results(data['answers'], quiz['quiz_json'], responses)
         else:
             # 从本地文件分析（兼容旧版本）
             result = analyze_quiz_results(data['answers'])
         
-        # 保存分析结果到数据库
+        # 保存分析结果和逐题作答到数据库
         if quiz_id:
-            analysis_id = save_analysis(quiz_id, result)
+            current_user = _optional_user()
+            user_id = current_user['id'] if current_user else None
+            with transaction():
+                analysis_id = save_analysis(quiz_id, result, user_id)
+                save_item_responses(analysis_id, quiz_id, user_id, responses, quiz['quiz_json'])
             result["analysis_id"] = analysis_id
         
         return jsonify(result), 200
@@ -361,12 +640,32 @@ def analyze_quiz():
         logger.error(f"测验分析错误: {str(e)}")
         return jsonify({"error": f"测验分析失败: {str(e)}"}), 500
 
+# 历史列表每页条数
+HISTORY_PAGE_SIZE = 20
+HISTORY_MAX_PAGE_SIZE = 100
+
+def _history_params(req):
+    """解析历史列表的分页和筛选参数"""
+    try:
+        limit = int(req.args.get('limit', HISTORY_PAGE_SIZE))
+    except ValueError:
+        limit = HISTORY_PAGE_SIZE
+    return {
+        'limit': min(max(1, limit), HISTORY_MAX_PAGE_SIZE),
+        'cursor': req.args.get('cursor') or None,
+        'user_id': req.args.get('userId') or None,
+        'course_id': req.args.get('courseId') or None,
+        'difficulty': req.args.get('difficulty') or None
+    }
+
 @app.route('/quizzes', methods=['GET'])
 def get_quizzes():
-    """获取所有测验"""
+    """分页获取测验列表，支持按用户、课程和难度筛选"""
     try:
-        quizzes = get_all_quizzes()
-        return jsonify(quizzes), 200
+        quizzes, next_cursor = list_quizzes(**_history_params(request))
+        return jsonify({"items": quizzes, "next_cursor": next_cursor}), 200
+    except InvalidCursorError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         logger.error(f"获取测验列表失败: {str(e)}")
         return jsonify({"error": str(e)}), 500
@@ -385,10 +684,12 @@ def get_quiz(quiz_id):
 
 @app.route('/analyses', methods=['GET'])
 def get_analyses():
-    """获取所有分析结果"""
+    """分页获取分析列表，支持按用户、课程和难度筛选"""
     try:
-        analyses = get_all_analyses()
-        return jsonify(analyses), 200
+        analyses, next_cursor = list_analyses(**_history_params(request))
+        return jsonify({"items": analyses, "next_cursor": next_cursor}), 200
+    except InvalidCursorError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         logger.error(f"获取分析列表失败: {str(e)}")
         return jsonify({"error": str(e)}), 500
@@ -405,6 +706,34 @@ def get_analysis(analysis_id):
         logger.error(f"获取分析结果失败: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/courses/<course_id>/hardest-items', methods=['GET'])
+@token_required
+def get_hardest_items(current_user, course_id):
+    """课程（可按章节）中答错率最高的题目，只有任课教师可以查看"""
+    try:
+        if current_user['user_type'] != 'teacher' or not has_course_access(course_id, current_user['id'], 'teacher'):
+            return jsonify({"error": "无权查看该课程"}), 403
+        chapter_id = request.args.get('chapterId', type=int)
+        limit = min(max(1, request.args.get('limit', 10, type=int)), HISTORY_MAX_PAGE_SIZE)
+        min_responses = max(1, request.args.get('minResponses', 1, type=int))
+        items = hardest_items(course_id, chapter_id, limit, min_responses)
+        return jsonify({"success": True, "items": items}), 200
+    except Exception as e:
+        logger.error(f"获取错题统计失败: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/quizzes/<int:quiz_id>/items/<int:item_no>/misses', methods=['GET'])
+@token_required
+def get_item_misses(current_user, quiz_id, item_no):
+    """答错某道题的学生，只有布置该测验的教师可以查看"""
+    try:
+        if current_user['user_type'] != 'teacher' or not teacher_owns_quiz(quiz_id, current_user['id']):
+            return jsonify({"error": "无权查看该测验"}), 403
+        return jsonify({"success": True, "students": item_misses(quiz_id, item_no)}), 200
+    except Exception as e:
+        logger.error(f"获取答错学生失败: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
 # 获取用户个人信息
 @app.route('/api/user/profile', methods=['GET'])
 @token_required
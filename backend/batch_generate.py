@@ -0,0 +1,272 @@
+"""
+批量生成测验（命令行）
+
+学期开始前按清单为各课程各章节预先生成测验，运行方式（在 backend 目录下）:
+
+    python batch_generate.py --input-dir materials --manifest manifest.csv
+
+清单为 CSV 或 JSON（对象数组），每行一个生成条目，字段：
+    file           材料文件名（相对 --input-dir），PDF 或 TXT
+    course_id      课程号
+    chapter        章节名称，测验布置到该章节（不存在时自动创建）
+    difficulty     easy / medium / hard，默认 medium
+    count          题目数量，默认 10
+    chapter_no     可选，只使用文档中识别出的第几章（从0开始，见 /documents/<doc_id>/chapters）
+    fill_in_blank  可选，是否包含填空题，默认 false
+    notes          可选，备注
+
+已完成的条目记录在 batch_items 表中，中断后重新运行同一命令会跳过这些条目。
+"""
+import os
+import csv
+import sys
+import json
+import time
+import hashlib
+import logging
+import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import config
+from config import get_int_env
+from db_manager import init_database, execute_query, transaction, save_quiz_items
+from blob_codec import encode_json
+from document_store import save_document, index_documents, get_document_text, get_document_chapter
+from quiz_service import generate_quiz
+from question_bank import store_quiz_questions
+
+logger = logging.getLogger(__name__)
+
+STATUS_DONE = 'done'
+STATUS_FAILED = 'failed'
+
+TRUE_VALUES = ('true', '1', 't', 'yes', 'y')
+
+def load_manifest(path):
+    """读取并校验生成清单"""
+    with open(path, 'r', encoding='utf-8-sig') as f:
+        if path.lower().endswith('.json'):
+            rows = json.load(f)
+        else:
+            rows = list(csv.DictReader(f))
+
+    items = []
+    for line, row in enumerate(rows, 1):
+        row = {key.strip(): (value.strip() if isinstance(value, str) else value)
+               for key, value in row.items() if key}
+        missing = [field for field in ('file', 'course_id', 'chapter') if not row.get(field)]
+        if missing:
+            raise ValueError(f"清单第{line}项缺少字段: {', '.join(missing)}")
+        chapter_no = row.get('chapter_no')
+        items.append({
+            'file': row['file'],
+            'course_id': str(row['course_id']),
+            'chapter': row['chapter'],
+            'difficulty': row.get('difficulty') or 'medium',
+            'count': int(row.get('count') or 10),
+            'chapter_no': int(chapter_no) if chapter_no not in (None, '') else None,
+            'fill_in_blank': str(row.get('fill_in_blank') or 'false').lower() in TRUE_VALUES,
+            'notes': row.get('notes') or ''
+        })
+    return items
+
+def item_key(item):
+    """条目的稳定标识，清单不变时重复运行得到相同的值"""
+    fields = [item['file'], item['course_id'], item['chapter'], item['difficulty'], item['count'],
+              item['chapter_no'], item['fill_in_blank'], item['notes']]
+    return hashlib.sha1(json.dumps(fields, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+def _completed_keys():
+    rows = execute_query("SELECT item_key FROM batch_items WHERE status = ?", (STATUS_DONE,))
+    return {row['item_key'] for row in rows}
+
+def ingest(items, input_dir):
+    """
+    保存清单中用到的所有文件，并在进程池中并行提取文本
+
+    Returns:
+        (文件名到文档信息的映射, 提取的总页数, 无法读取的文件及原因)
+    """
+    documents = {}
+    errors = {}
+    for file_name in sorted({item['file'] for item in items}):
+        path = os.path.join(input_dir, file_name)
+        try:
+            with open(path, 'rb') as f:
+                documents[file_name] = save_document(f, os.path.basename(file_name))
+        except Exception as e:
+            errors[file_name] = str(e)
+    index_documents([document['doc_id'] for document in documents.values()])
+    return documents, sum(document['page_count'] for document in documents.values()), errors
+
+def generate_item(item, document):
+    """为一个条目提取内容并生成测验"""
+    selected_pages = None
+    if item['chapter_no'] is not None:
+        chapter = get_document_chapter(document['doc_id'], item['chapter_no'])
+        if chapter is None:
+            raise ValueError(f"文档中不存在第{item['chapter_no'] + 1}章")
+        selected_pages = list(range(chapter['start_page'], chapter['end_page'] + 1))
+    content = get_document_text(document['doc_id'], selected_pages)
+    return generate_quiz(content, item['count'], item['difficulty'], True, item['fill_in_blank'],
+                         item['notes'], use_cache=True)
+
+def write_batch(results):
+    """
+    在一个事务中保存一批结果：测验、章节、测验章节关联和条目状态
+
+    Args:
+        results: (条目, 文档信息, 测验JSON或None, 错误信息) 列表
+
+    Returns:
+        成功保存的 (条目, 测验JSON, 测验ID, 章节ID) 列表
+    """
+    saved = []
+    now = time.time()
+    with transaction() as conn:
+        for item, document, quiz_json, error in results:
+            key = item_key(item)
+            if quiz_json is None:
+                conn.execute(
+                    "INSERT OR REPLACE INTO batch_items (item_key, file_name, course_id, chapter_name, "
+                    "status, error, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (key, item['file'], item['course_id'], item['chapter'], STATUS_FAILED, error, now)
+                )
+                continue
+
+            title = f"{document['file_name']} - {item['difficulty']}难度 ({item['count']}题)"
+            value, json_format = encode_json(quiz_json)
+            quiz_id = conn.execute(
+                "INSERT INTO quizzes (title, file_name, quiz_json, json_format, question_count, difficulty) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (title, document['file_name'], value, json_format, item['count'], item['difficulty'])
+            ).lastrowid
+            save_quiz_items(quiz_id, quiz_json)
+            chapter = conn.execute("SELECT qid FROM question WHERE qname = ? AND cno = ?",
+                                   (item['chapter'], item['course_id'])).fetchone()
+            if chapter:
+                chapter_id = chapter['qid']
+            else:
+                chapter_id = conn.execute("INSERT INTO question (qname, cno) VALUES (?, ?)",
+                                          (item['chapter'], item['course_id'])).lastrowid
+            conn.execute("INSERT INTO quiz_chapters (quiz_id, chapter_id) VALUES (?, ?)", (quiz_id, chapter_id))
+            conn.execute(
+                "INSERT OR REPLACE INTO batch_items (item_key, file_name, course_id, chapter_name, "
+                "status, quiz_id, chapter_id, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, item['file'], item['course_id'], item['chapter'], STATUS_DONE, quiz_id, chapter_id, now)
+            )
+            saved.append((item, quiz_json, quiz_id, chapter_id))
+    return saved
+
+def _flush(buffer, stats):
+    if not buffer:
+        return
+    for item, quiz_json, quiz_id, chapter_id in write_batch(buffer):
+        stats['questions'] += sum(len(page.get('elements', [])) for page in quiz_json.get('pages', []))
+        store_quiz_questions(quiz_json, {'course_id': item['course_id'], 'difficulty': item['difficulty']},
+                             chapter_id, quiz_id)
+    buffer.clear()
+
+def run(items, input_dir, concurrency, batch_size):
+    """执行批量生成，返回统计信息"""
+    stats = {'total': len(items), 'skipped': 0, 'succeeded': 0, 'failed': 0, 'questions': 0,
+             'pages': 0, 'extract_seconds': 0.0, 'generate_seconds': 0.0, 'failures': [], 'interrupted': False}
+    completed = _completed_keys()
+    pending = [item for item in items if item_key(item) not in completed]
+    stats['skipped'] = len(items) - len(pending)
+    if not pending:
+        return stats
+
+    courses = {row['cno'] for row in execute_query("SELECT cno FROM course")}
+    buffer = []
+
+    def fail(item, document, error):
+        stats['failed'] += 1
+        stats['failures'].append((item, error))
+        buffer.append((item, document, None, error))
+
+    start = time.perf_counter()
+    documents, stats['pages'], file_errors = ingest(pending, input_dir)
+    stats['extract_seconds'] = time.perf_counter() - start
+
+    runnable = []
+    for item in pending:
+        if item['file'] in file_errors:
+            fail(item, None, f"无法读取文件: {file_errors[item['file']]}")
+        elif item['course_id'] not in courses:
+            fail(item, None, f"课程不存在: {item['course_id']}")
+        else:
+            runnable.append(item)
+
+    start = time.perf_counter()
+    executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='batch-generate')
+    try:
+        futures = {executor.submit(generate_item, item, documents[item['file']]): item for item in runnable}
+        for done, future in enumerate(as_completed(futures), 1):
+            item = futures[future]
+            document = documents[item['file']]
+            try:
+                buffer.append((item, document, future.result(), None))
+                stats['succeeded'] += 1
+            except Exception as e:
+                fail(item, document, str(e))
+            print(f"[{done}/{len(runnable)}] {item['course_id']} {item['chapter']} "
+                  f"{'失败' if buffer[-1][2] is None else '完成'}", flush=True)
+            if len(buffer) >= batch_size:
+                _flush(buffer, stats)
+    except KeyboardInterrupt:
+        # 已完成的结果先写入数据库，下次运行从剩余条目继续
+        stats['interrupted'] = True
+        executor.shutdown(wait=False, cancel_futures=True)
+    finally:
+        _flush(buffer, stats)
+        executor.shutdown(wait=False)
+        stats['generate_seconds'] = time.perf_counter() - start
+    return stats
+
+def print_summary(stats, elapsed):
+    """打印吞吐量汇总"""
+    print()
+    print("========== 批量生成汇总 ==========")
+    if stats['interrupted']:
+        print("已中断，重新运行同一命令可继续剩余条目")
+    print(f"条目: 共{stats['total']}，跳过已完成{stats['skipped']}，成功{stats['succeeded']}，失败{stats['failed']}")
+    if stats['pages']:
+        print(f"文本提取: {stats['pages']}页，用时{stats['extract_seconds']:.1f}秒"
+              f"（{stats['pages'] / max(stats['extract_seconds'], 1e-6):.1f}页/秒）")
+    if stats['succeeded']:
+        minutes = max(stats['generate_seconds'], 1e-6) / 60
+        print(f"测验生成: {stats['succeeded']}份，{stats['questions']}题，用时{stats['generate_seconds']:.1f}秒"
+              f"（每分钟{stats['succeeded'] / minutes:.1f}份、{stats['questions'] / minutes:.1f}题）")
+    print(f"总用时: {elapsed:.1f}秒")
+    for item, error in stats['failures']:
+        print(f"  失败: {item['file']} / {item['course_id']} / {item['chapter']}: {error}")
+
+def main():
+    parser = argparse.ArgumentParser(description='按清单批量生成测验并布置到课程章节')
+    parser.add_argument('--input-dir', required=True, help='材料文件所在目录')
+    parser.add_argument('--manifest', required=True, help='生成清单（CSV 或 JSON）')
+    parser.add_argument('--workers', type=int, default=None, help='文本提取进程数，默认 PDF_EXTRACT_WORKERS')
+    parser.add_argument('--concurrency', type=int, default=None,
+                        help='同时进行的生成数，默认 LLM_MAX_CONCURRENCY')
+    parser.add_argument('--batch-size', type=int, default=20, help='每个数据库事务写入的测验数')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+    if args.workers:
+        os.environ['PDF_EXTRACT_WORKERS'] = str(args.workers)
+    # 命令行不需要后台预热，模型在第一次生成时初始化
+    os.environ.setdefault('STARTUP_WARMUP', 'false')
+
+    init_database()
+    config.init_configuration()
+    items = load_manifest(args.manifest)
+    concurrency = max(1, args.concurrency or get_int_env('LLM_MAX_CONCURRENCY', 4))
+
+    start = time.perf_counter()
+    stats = run(items, args.input_dir, concurrency, max(1, args.batch_size))
+    print_summary(stats, time.perf_counter() - start)
+    sys.exit(130 if stats['interrupted'] else (1 if stats['failed'] else 0))
+
+if __name__ == '__main__':
+    main()
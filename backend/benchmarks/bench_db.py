@@ -0,0 +1,146 @@
+"""
+数据库连接基准测试
+
+用多个线程模拟请求（读取学生课程和测验、提交分析并更新答题情况、教师布置测验），比较：
+  1. 原有方式：每条语句新建连接，默认回滚日志，每条语句单独提交
+  2. 连接管理器：线程长期连接 + 连接池，WAL 模式和调优的 PRAGMA，多语句操作使用显式事务
+
+运行方式（在 backend 目录下）:
+
+    python benchmarks/bench_db.py --requests 2000 --threads 8 --write-ratio 0.2
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import sqlite3
+import argparse
+import tempfile
+import threading
+from contextlib import nullcontext
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+QUIZ_JSON = json.dumps({"pages": [{"elements": [
+    {"type": "radiogroup", "name": f"question{i}", "title": f"Question {i}",
+     "choices": ["A", "B", "C", "D"], "correctAnswer": "A"} for i in range(10)
+]}]})
+
+def legacy_execute(query, params=None, fetchall=True):
+    """原有的 execute_query：每条语句新建连接并单独提交"""
+    conn = sqlite3.connect('legacy.db')
+    conn.row_factory = sqlite3.Row
+    try:
+        cursor = conn.execute(query, params or ())
+        if query.strip().upper().startswith('SELECT'):
+            return cursor.fetchall() if fetchall else cursor.fetchone()
+        conn.commit()
+        return cursor.lastrowid
+    finally:
+        conn.close()
+
+def make_request(execute, scope, rng, write_ratio):
+    """一次模拟请求"""
+    sno = f"B{rng.randrange(200):03d}"
+    cno = f"C{rng.randrange(20):02d}"
+    if rng.random() >= write_ratio:
+        execute("SELECT c.* FROM course c JOIN student_course sc ON c.cno = sc.cno WHERE sc.sno = ?", (sno,))
+        execute("SELECT q.qid, q.qname FROM question q WHERE q.cno = ?", (cno,))
+        quiz = execute("SELECT * FROM quizzes WHERE id = ?", (rng.randrange(1, 200),), fetchall=False)
+        if quiz:
+            json.loads(quiz['quiz_json'])
+        return
+
+    if rng.random() < 0.5:
+        # 学生提交测验：保存分析并更新答题情况
+        with scope():
+            execute("INSERT INTO analyses (quiz_id, analysis_json) VALUES (?, ?)",
+                    (rng.randrange(1, 200), '{"score": 80}'))
+            execute("INSERT OR IGNORE INTO student_answer VALUES (?, ?, ?, 0, 0)", (sno, cno, 1))
+            execute("UPDATE student_answer SET allcnt = allcnt + 10, correctcnt = correctcnt + 8 "
+                    "WHERE sno = ? AND cno = ? AND qid = ?", (sno, cno, 1))
+    else:
+        # 教师布置测验：保存测验、查找或创建章节、关联
+        with scope():
+            quiz_id = execute("INSERT INTO quizzes (title, file_name, quiz_json, question_count, difficulty) "
+                              "VALUES (?, ?, ?, ?, ?)", ('bench', 'bench.pdf', QUIZ_JSON, 10, 'medium'))
+            chapter_name = f"第{rng.randrange(10)}章"
+            chapter = execute("SELECT qid FROM question WHERE qname = ? AND cno = ?", (chapter_name, cno))
+            chapter_id = chapter[0]['qid'] if chapter else execute(
+                "INSERT INTO question (qname, cno) VALUES (?, ?)", (chapter_name, cno))
+            execute("INSERT OR IGNORE INTO quiz_chapters (quiz_id, chapter_id) VALUES (?, ?)", (quiz_id, chapter_id))
+
+def seed(execute):
+    for i in range(20):
+        execute("INSERT INTO course VALUES (?, ?, ?, ?)", (f"C{i:02d}", f"课程{i}", "T001", 3))
+    for i in range(200):
+        execute("INSERT INTO student VALUES (?, ?, ?, ?, ?, ?)", (f"B{i:03d}", "学生", "x", "男", "学院", "专业"))
+        for j in range(3):
+            execute("INSERT OR IGNORE INTO student_course VALUES (?, ?)", (f"B{i:03d}", f"C{(i + j) % 20:02d}"))
+        execute("INSERT INTO quizzes (title, file_name, quiz_json, question_count, difficulty) "
+                "VALUES (?, ?, ?, ?, ?)", ('seed', 'seed.pdf', QUIZ_JSON, 10, 'medium'))
+
+def run(label, execute, scope, after_request, args):
+    counter = iter(range(args.requests))
+    lock = threading.Lock()
+    errors = []
+
+    def worker(index):
+        rng = random.Random(index)
+        while True:
+            with lock:
+                if next(counter, None) is None:
+                    return
+            try:
+                make_request(execute, scope, rng, args.write_ratio)
+            except sqlite3.OperationalError as e:
+                errors.append(str(e))
+            finally:
+                after_request()
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(args.threads)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<40} {elapsed:8.2f}s  {args.requests / elapsed:8.0f} req/s  errors: {len(errors)}")
+
+def main():
+    parser = argparse.ArgumentParser(description='对比每条语句新建连接与连接管理器的请求吞吐量')
+    parser.add_argument('--requests', type=int, default=2000, help='模拟请求总数')
+    parser.add_argument('--threads', type=int, default=8, help='并发线程数')
+    parser.add_argument('--write-ratio', type=float, default=0.2, help='写请求比例')
+    args = parser.parse_args()
+
+    # 在临时目录中运行，避免修改仓库中的数据库
+    workdir = tempfile.mkdtemp(prefix='bench_db_')
+    cwd = os.getcwd()
+    try:
+        os.chdir(workdir)
+        from db_manager import init_database, execute_query, transaction, release_connection
+
+        # 原有方式：同样的表结构建在另一个使用回滚日志的数据库文件中
+        init_database()
+        execute_query("VACUUM INTO 'legacy.db'")
+        legacy = sqlite3.connect('legacy.db')
+        legacy.execute("PRAGMA journal_mode=DELETE")
+        legacy.close()
+        seed(legacy_execute)
+        with transaction():
+            seed(execute_query)
+        release_connection()
+
+        print(f"requests: {args.requests}, threads: {args.threads}, write ratio: {args.write_ratio}")
+        run("connect per statement (rollback journal)", legacy_execute, nullcontext, lambda: None, args)
+        run("pooled connections (WAL + transactions)", execute_query, transaction, release_connection, args)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""
+PDF 文本提取基准测试
+
+生成一份合成的多页PDF（默认500页），比较：
+  1. 原有方式：PdfReader 逐页顺序提取
+  2. 按页段并行提取（进程池）
+  3. 页面文本建立索引后，读取另一组 selectedPages（只读数据库）
+
+运行方式（在 backend 目录下）:
+
+    python benchmarks/bench_extract.py --pages 500 --workers 4
+"""
+import os
+import sys
+import time
+import random
+import shutil
+import argparse
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+WORDS = ("process thread memory cache kernel scheduler network protocol packet "
+         "router database index query transaction lock compiler parser token").split()
+
+def _escape(text):
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+def write_synthetic_pdf(path, pages, lines_per_page=40, seed=42):
+    """写出一份每页若干行英文文本的PDF（Helvetica，无需额外依赖）"""
+    rng = random.Random(seed)
+    objects = []
+
+    def add(body):
+        objects.append(body)
+        return len(objects)
+
+    catalog_id = add(None)
+    pages_id = add(None)
+    font_id = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+    page_ids = []
+    for page_no in range(pages):
+        lines = [f"Page {page_no + 1}"] + [
+            ' '.join(rng.choice(WORDS) for _ in range(12)) for _ in range(lines_per_page)
+        ]
+        ops = ["BT", "/F1 10 Tf", "14 TL", "50 760 Td"]
+        ops += [f"({_escape(line)}) '" for line in lines]
+        ops.append("ET")
+        stream = '\n'.join(ops).encode('latin-1')
+        content_id = add(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        page_ids.append(add(
+            f"<< /Type /Page /Parent {pages_id} 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 {font_id} 0 R >> >> /Contents {content_id} 0 R >>".encode()
+        ))
+
+    kids = ' '.join(f"{page_id} 0 R" for page_id in page_ids)
+    objects[pages_id - 1] = f"<< /Type /Pages /Kids [{kids}] /Count {len(page_ids)} >>".encode()
+    objects[catalog_id - 1] = f"<< /Type /Catalog /Pages {pages_id} 0 R >>".encode()
+
+    with open(path, 'wb') as f:
+        f.write(b"%PDF-1.4\n")
+        offsets = []
+        for number, body in enumerate(objects, 1):
+            offsets.append(f.tell())
+            f.write(b"%d 0 obj\n" % number + body + b"\nendobj\n")
+        xref_offset = f.tell()
+        f.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+        for offset in offsets:
+            f.write(b"%010d 00000 n \n" % offset)
+        f.write(b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n"
+                % (len(objects) + 1, catalog_id, xref_offset))
+
+def timed(label, func):
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<36} {elapsed * 1000:10.1f} ms")
+    return result, elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description='PDF 文本提取基准测试')
+    parser.add_argument('--pages', type=int, default=500, help='合成PDF的页数')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='并行提取的进程数')
+    args = parser.parse_args()
+
+    # 在临时目录中运行，避免修改仓库中的数据库和文档存储
+    workdir = tempfile.mkdtemp(prefix='bench_extract_')
+    cwd = os.getcwd()
+    try:
+        os.chdir(workdir)
+        from db_manager import init_database
+        from file_service import extract_text_from_pdf, extract_pdf_pages
+        from document_store import save_document, get_document_text
+
+        init_database()
+        pdf_path = os.path.join(workdir, 'synthetic.pdf')
+        write_synthetic_pdf(pdf_path, args.pages)
+        print(f"pages: {args.pages}, size: {os.path.getsize(pdf_path) / 1024:.0f} KB, workers: {args.workers}")
+
+        with open(pdf_path, 'rb') as f:
+            sequential, _ = timed("sequential extract_text_from_pdf", lambda: extract_text_from_pdf(f))
+        pages, _ = timed(f"parallel extract_pdf_pages (x{args.workers})",
+                         lambda: extract_pdf_pages(pdf_path, workers=args.workers))
+        assert ''.join(pages) == sequential, "并行提取结果与顺序提取不一致"
+
+        with open(pdf_path, 'rb') as f:
+            document = save_document(f, 'synthetic.pdf')
+        doc_id = document['doc_id']
+        os.environ['PDF_EXTRACT_WORKERS'] = str(args.workers)
+        timed("first generation (extract + index)", lambda: get_document_text(doc_id))
+        subset = list(range(0, args.pages, 3))
+        timed(f"reselect {len(subset)} pages (index read)", lambda: get_document_text(doc_id, subset))
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""
+启动耗时基准测试
+
+在独立子进程中多次导入 app 模块，统计从解释器启动到 Flask 应用可服务的耗时，
+并列出导入耗时最高的模块。运行方式（在 backend 目录下）:
+
+    python benchmarks/bench_startup.py --runs 5
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 未配置 .env 时使用的占位环境变量，保证 init_configuration 能通过校验
+DEFAULT_ENV = {
+    'API_KEY': 'benchmark',
+    'MODEL': 'gemini-2.0-flash',
+    'API_URL': 'http://127.0.0.1:9',
+    'EXAMPLE_JSON': json.dumps({"pages": [{"elements": []}]}),
+    'ENVIRONMENT': 'production',
+}
+
+IMPORT_SNIPPET = (
+    "import time, sys; start = time.perf_counter(); "
+    f"sys.path.insert(0, {BACKEND_DIR!r}); "
+    "import app; "
+    "print(time.perf_counter() - start)"
+)
+
+def run_once(workdir, env, importtime=False):
+    """在子进程中导入一次 app，返回 (导入耗时, 进程总耗时, stderr)"""
+    cmd = [sys.executable]
+    if importtime:
+        cmd += ['-X', 'importtime']
+    cmd += ['-c', IMPORT_SNIPPET]
+    start = time.perf_counter()
+    result = subprocess.run(cmd, cwd=workdir, env=env, capture_output=True, text=True)
+    total = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr[-2000:])
+    return float(result.stdout.strip().splitlines()[-1]), total, result.stderr
+
+def slowest_imports(stderr, top):
+    """解析 -X importtime 输出，返回累计耗时最高的模块"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative_us, name = line.split('|')
+        rows.append((int(cumulative_us), name.rstrip()))
+    return sorted(rows, reverse=True)[:top]
+
+def main():
+    parser = argparse.ArgumentParser(description='app 模块启动耗时基准测试')
+    parser.add_argument('--runs', type=int, default=5, help='测量次数')
+    parser.add_argument('--top', type=int, default=10, help='列出最慢的导入模块数量')
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    for key, value in DEFAULT_ENV.items():
+        env.setdefault(key, value)
+
+    # 在临时目录中运行，避免修改仓库中的数据库文件
+    workdir = tempfile.mkdtemp(prefix='bench_startup_')
+    try:
+        import_times, total_times = [], []
+        for _ in range(args.runs):
+            import_time, total_time, _ = run_once(workdir, env)
+            import_times.append(import_time)
+            total_times.append(total_time)
+
+        print(f"runs: {args.runs}")
+        print(f"import app: median {statistics.median(import_times) * 1000:.1f} ms, "
+              f"min {min(import_times) * 1000:.1f} ms")
+        print(f"process total: median {statistics.median(total_times) * 1000:.1f} ms, "
+              f"min {min(total_times) * 1000:.1f} ms")
+
+        _, _, stderr = run_once(workdir, env, importtime=True)
+        print("slowest imports (cumulative):")
+        for cumulative_us, name in slowest_imports(stderr, args.top):
+            print(f"  {cumulative_us / 1000:8.1f} ms  {name}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+import os
+import json
+import zlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 格式标记：NULL 为旧版本保存的明文JSON
+FORMAT_JSON = 'json'
+FORMAT_ZLIB = 'zlib'
+FORMAT_ZSTD = 'zstd'
+
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 3
+
+_zstd = None
+
+def _zstd_module():
+    """zstandard 为可选依赖，未安装时返回 None"""
+    global _zstd
+    if _zstd is None:
+        try:
+            import zstandard
+            _zstd = zstandard
+        except ImportError:
+            _zstd = False
+    return _zstd or None
+
+def write_format():
+    """
+    新写入数据使用的格式，由 BLOB_COMPRESSION 决定：
+    auto（默认，安装了 zstandard 时用 zstd，否则 zlib）、zstd、zlib、none
+    """
+    setting = os.getenv('BLOB_COMPRESSION', 'auto').lower()
+    if setting == 'none':
+        return FORMAT_JSON
+    if setting in ('auto', FORMAT_ZSTD):
+        if _zstd_module():
+            return FORMAT_ZSTD
+        if setting == FORMAT_ZSTD:
+            logger.warning("未安装 zstandard，压缩格式回退到 zlib")
+    return FORMAT_ZLIB
+
+def encode_json(data, fmt=None):
+    """
+    序列化并压缩JSON数据
+
+    Args:
+        data: 可序列化的对象或已经序列化的JSON字符串
+        fmt: 压缩格式，默认见 write_format()
+
+    Returns:
+        (存入数据库的值, 格式标记)
+    """
+    text = data if isinstance(data, str) else json.dumps(data, ensure_ascii=False)
+    fmt = fmt or write_format()
+    if fmt == FORMAT_ZSTD:
+        return _zstd_module().ZstdCompressor(level=ZSTD_LEVEL).compress(text.encode('utf-8')), fmt
+    if fmt == FORMAT_ZLIB:
+        return zlib.compress(text.encode('utf-8'), ZLIB_LEVEL), fmt
+    return text, FORMAT_JSON
+
+def decode_text(value, fmt):
+    """按格式标记还原JSON文本"""
+    if fmt == FORMAT_ZSTD:
+        module = _zstd_module()
+        if module is None:
+            raise RuntimeError("数据使用 zstd 压缩，但未安装 zstandard")
+        return module.ZstdDecompressor().decompress(value).decode('utf-8')
+    if fmt == FORMAT_ZLIB:
+        return zlib.decompress(value).decode('utf-8')
+    return value
+
+def decode_json(value, fmt):
+    """按格式标记解压并解析JSON"""
+    return json.loads(decode_text(value, fmt))
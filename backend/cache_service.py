@@ -0,0 +1,126 @@
+import os
+import json
+import time
+import hashlib
+import logging
+from config import get_int_env
+from db_manager import execute_query
+
+logger = logging.getLogger(__name__)
+
+# 缓存键格式版本，提示词或解析逻辑变化时递增以使旧缓存失效
+# 2: 长文档按段落分段生成后合并，不再截取前3000字符
+# 3: 新的提示词和 extract_json 题目校验
+# 4: 备注在分段后按段筛选内容，课程和章节名不再参与筛选
+CACHE_KEY_VERSION = 4
+
+def is_cache_enabled():
+    """是否启用测验生成缓存"""
+    return os.getenv('QUIZ_CACHE_ENABLED', 'true').lower() in ('true', '1', 't')
+
+def _normalize_text(text):
+    """规范化文本：合并所有空白字符"""
+    return ' '.join((text or '').split())
+
+def make_cache_key(content, question_count, difficulty, include_multiple_choice=True,
+                   include_fill_in_blank=False, notes=None, **extra):
+    """
+    根据规范化后的提示输入计算缓存键
+
+    Args:
+        content: 参考内容文本
+        question_count: 题目数量
+        difficulty: 难度
+        include_multiple_choice: 是否包含选择题
+        include_fill_in_blank: 是否包含填空题
+        notes: 备注信息
+        extra: 其他会影响生成结果的参数
+
+    Returns:
+        SHA-256 十六进制字符串
+    """
+    payload = {
+        'version': CACHE_KEY_VERSION,
+        'model': os.getenv('MODEL'),
+        'example_json': hashlib.sha256((os.getenv('EXAMPLE_JSON') or '').encode('utf-8')).hexdigest(),
+        'content': hashlib.sha256(_normalize_text(content).encode('utf-8')).hexdigest(),
+        'question_count': int(question_count),
+        'difficulty': (difficulty or '').strip().lower(),
+        'include_multiple_choice': bool(include_multiple_choice),
+        'include_fill_in_blank': bool(include_fill_in_blank),
+        'notes': _normalize_text(notes),
+    }
+    for name, value in sorted(extra.items()):
+        payload[name] = _normalize_text(value) if isinstance(value, str) else value
+    raw = json.dumps(payload, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+def get_cached_quiz(cache_key):
+    """获取缓存的测验，未命中或已过期返回None"""
+    if not is_cache_enabled():
+        return None
+    try:
+        row = execute_query(
+            "SELECT quiz_json, created_at FROM quiz_cache WHERE cache_key = ?",
+            (cache_key,), fetchall=False
+        )
+        if not row:
+            return None
+
+        ttl = get_int_env('QUIZ_CACHE_TTL', 7 * 24 * 3600)
+        now = time.time()
+        if ttl > 0 and now - row['created_at'] > ttl:
+            execute_query("DELETE FROM quiz_cache WHERE cache_key = ?", (cache_key,))
+            return None
+
+        execute_query(
+            "UPDATE quiz_cache SET hit_count = hit_count + 1, last_used_at = ? WHERE cache_key = ?",
+            (now, cache_key)
+        )
+        logger.info(f"测验缓存命中: {cache_key[:12]}")
+        return json.loads(row['quiz_json'])
+    except Exception as e:
+        # 缓存不可用时不影响正常生成
+        logger.warning(f"读取测验缓存失败: {str(e)}")
+        return None
+
+def save_cached_quiz(cache_key, quiz_json):
+    """保存测验到缓存并按TTL和容量淘汰旧条目"""
+    if not is_cache_enabled():
+        return
+    try:
+        now = time.time()
+        execute_query(
+            """
+            INSERT OR REPLACE INTO quiz_cache (cache_key, quiz_json, hit_count, created_at, last_used_at)
+            VALUES (?, ?, 0, ?, ?)
+            """,
+            (cache_key, json.dumps(quiz_json, ensure_ascii=False), now, now)
+        )
+        evict_expired_entries(now)
+    except Exception as e:
+        logger.warning(f"写入测验缓存失败: {str(e)}")
+
+def evict_expired_entries(now=None):
+    """删除过期条目，并按最近使用时间淘汰超出容量的条目"""
+    now = now or time.time()
+    ttl = get_int_env('QUIZ_CACHE_TTL', 7 * 24 * 3600)
+    max_entries = get_int_env('QUIZ_CACHE_MAX_ENTRIES', 500)
+
+    if ttl > 0:
+        execute_query("DELETE FROM quiz_cache WHERE created_at < ?", (now - ttl,))
+    if max_entries > 0:
+        execute_query(
+            """
+            DELETE FROM quiz_cache WHERE cache_key IN (
+                SELECT cache_key FROM quiz_cache
+                ORDER BY last_used_at DESC
+                LIMIT -1 OFFSET ?
+            )
+            """,
+            (max_entries,)
+        )
+
+def clear_cache():
+    """清空测验生成缓存"""
+    return execute_query("DELETE FROM quiz_cache")
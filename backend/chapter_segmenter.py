@@ -0,0 +1,125 @@
+import re
+import logging
+from ingest_service import open_mapped
+
+logger = logging.getLogger(__name__)
+
+SOURCE_OUTLINE = 'outline'
+SOURCE_HEADING = 'heading'
+SOURCE_WHOLE = 'whole'
+
+# 每页只在开头几行中查找章节标题
+HEADING_LINES = 3
+MAX_TITLE_LENGTH = 100
+
+_CN_NUMERALS = '零〇一二三四五六七八九十百'
+_HEADING_PATTERNS = (
+    # "第三章 进程管理"、"第 2 讲"
+    re.compile(rf'^第\s*([{_CN_NUMERALS}\d]+)\s*[章讲篇部]'),
+    # "Chapter 3: Processes"、"Lecture 2"
+    re.compile(r'^(?:chapter|lecture|unit|part)\s+(\d+|[ivxlc]+)\b', re.IGNORECASE),
+)
+
+def _build_ranges(starts, page_count, source):
+    """
+    由各章起始页生成连续的页码范围
+
+    Args:
+        starts: (标题, 起始页) 列表，按页码排序
+        page_count: 文档总页数
+        source: 分章来源
+
+    Returns:
+        章节列表；第一章之前的页面（封面、目录）并入第一章
+    """
+    chapters = []
+    for i, (title, start) in enumerate(starts):
+        end = starts[i + 1][1] - 1 if i + 1 < len(starts) else page_count - 1
+        chapters.append({
+            'chapter_no': i,
+            'title': title[:MAX_TITLE_LENGTH],
+            'start_page': 0 if i == 0 else start,
+            'end_page': end,
+            'source': source
+        })
+    return chapters
+
+def outline_chapters(pdf_path, page_count):
+    """
+    按PDF书签的第一级条目分章
+
+    Returns:
+        章节列表，书签少于两个有效条目时返回None
+    """
+    import PyPDF2
+
+    try:
+        with open_mapped(pdf_path) as f:
+            reader = PyPDF2.PdfReader(f)
+            starts = []
+            for item in reader.outline:
+                # 嵌套列表是上一个条目的子书签
+                if isinstance(item, list):
+                    continue
+                try:
+                    page = reader.get_destination_page_number(item)
+                except Exception:
+                    continue
+                title = str(item.title or '').strip()
+                if title and 0 <= page < page_count:
+                    starts.append((title, page))
+    except Exception as e:
+        logger.warning(f"读取PDF书签失败: {str(e)}")
+        return None
+
+    # 同一页多个书签只保留第一个，页码倒退的条目忽略
+    deduped = []
+    for title, page in starts:
+        if not deduped or page > deduped[-1][1]:
+            deduped.append((title, page))
+    if len(deduped) < 2:
+        return None
+    return _build_ranges(deduped, page_count, SOURCE_OUTLINE)
+
+def _heading_key(line):
+    for pattern in _HEADING_PATTERNS:
+        match = pattern.match(line)
+        if match:
+            return match.group(1).lower()
+    return None
+
+def heading_chapters(pages, labels=None):
+    """
+    按页面开头的章节标题分章（没有书签时使用）
+
+    幻灯片常在每页重复章节标题，只有章节编号变化时才开始新的一章。
+
+    Args:
+        pages: 每页文本的列表
+        labels: 每页的筛选标签（page_triage），目录页中的标题不参与分章
+
+    Returns:
+        章节列表，识别出的章节少于两个时返回None
+    """
+    starts = []
+    current_key = None
+    for page_no, text in enumerate(pages):
+        if labels and labels[page_no] == 'toc':
+            continue
+        lines = [line.strip() for line in (text or '').splitlines() if line.strip()][:HEADING_LINES]
+        for line in lines:
+            key = _heading_key(line)
+            if key is None:
+                continue
+            if key != current_key:
+                starts.append((line, page_no))
+                current_key = key
+            break
+    if len(starts) < 2:
+        return None
+    return _build_ranges(starts, len(pages), SOURCE_HEADING)
+
+def whole_document(title, page_count):
+    """无法分章时，整份文档作为一章"""
+    return [{'chapter_no': 0, 'title': title[:MAX_TITLE_LENGTH], 'start_page': 0,
+             'end_page': max(0, page_count - 1), 'source': SOURCE_WHOLE}]
@@ -1,88 +1,76 @@
 import os
 import json
+import time
 import logging
-import httpx
+import threading
 from dotenv import load_dotenv
-import google.generativeai as genai
 
 # 全局变量
 model = None
 logger = logging.getLogger(__name__)
 
+_model_lock = threading.Lock()
+
+# 后台预热状态，供就绪检查接口使用
+_readiness = {
+    'status': 'starting',
+    'checks': {},
+    'error': None,
+    'started_at': None,
+    'finished_at': None
+}
+_readiness_lock = threading.Lock()
+
 def init_configuration():
-    """初始化所有配置"""
-    global model
-    
+    """初始化所有配置（不发起网络请求，连接检查在后台预热中进行）"""
     # 配置代理
     setup_proxy()
-    
+
     # 加载环境变量
     load_dotenv()
-    
+
     try:
-        # 配置 Gemini API
         api_key = os.getenv('API_KEY')
         model_name = os.getenv('MODEL')
         example_json = os.getenv('EXAMPLE_JSON')
         api_url = os.getenv('API_URL')
-        
+
         if not all([api_key, model_name, example_json, api_url]):
             raise ValueError("环境变量未正确加载")
-        
-        # 配置请求头
-        headers = {
-            "Content-Type": "application/json",
-            "x-goog-api-key": api_key
-        }
-        
-        # 测试网络连接
-        test_connection(api_url, headers)
-        
+
         # 尝试解析 EXAMPLE_JSON
         try:
             json.loads(example_json)
         except json.JSONDecodeError as e:
             logger.error(f"解析 EXAMPLE_JSON 失败: {str(e)}")
             raise
-        
-        # 配置 Gemini
-        genai.configure(
-            api_key=api_key,
-            transport='rest'
-        )
-        
-        # 验证模型是否可用
-        try:
-            model = genai.GenerativeModel(model_name)
-            # 发送一个简单的测试请求
-            response = model.generate_content("test")
-            logger.info("Gemini API 配置成功")
-        except Exception as e:
-            logger.error(f"Gemini API 配置失败: {str(e)}")
-            raise
-        
+
     except Exception as e:
         logger.error(f"初始化失败: {str(e)}", exc_info=True)
         raise
+
+    if os.getenv('STARTUP_WARMUP', 'true').lower() in ('true', '1', 't'):
+        start_warmup()
+    else:
+        with _readiness_lock:
+            _readiness.update(status='ready', checks={'warmup': 'skipped'}, finished_at=time.time())
+
 def setup_proxy():
     """设置网络代理"""
     # 只在非生产环境使用代理
     if os.getenv('ENVIRONMENT') != 'production':
         os.environ['HTTPS_PROXY'] = 'http://127.0.0.1:7890'
         os.environ['HTTP_PROXY'] = 'http://127.0.0.1:7890'
-    
-    # 配置 httpx 客户端超时
-    timeout = httpx.Timeout(30.0, connect=20.0)
-    return httpx.Client(timeout=timeout)
 
 def test_connection(api_url, headers):
-    """测试API连接"""
-    client = setup_proxy()
+    """测试API连接（使用共享连接池，顺便建立到API的长连接）"""
+    import http_client
+
     try:
         test_url = f"{api_url}/models"
         logger.debug(f"正在测试API连接: {test_url}")
-        response = client.get(test_url, headers=headers)
-        
+        response = http_client.request('GET', test_url, headers=headers)
+
         if response.status_code == 200:
             logger.info("API 连接测试成功")
             logger.debug(f"API 响应: {response.text}")
@@ -95,7 +83,88 @@ def test_connection(api_url, headers):
         logger.error("请检查网络连接、代理设置和API密钥")
         raise
 
+def start_warmup():
+    """启动后台预热线程：测试API连接并提前创建模型实例"""
+    with _readiness_lock:
+        if _readiness['started_at'] is not None:
+            return
+        _readiness['started_at'] = time.time()
+    thread = threading.Thread(target=_warmup, name='config-warmup', daemon=True)
+    thread.start()
+
+def _warmup():
+    """后台预热任务"""
+    checks = {}
+    error = None
+    try:
+        headers = {
+            "Content-Type": "application/json",
+            "x-goog-api-key": os.getenv('API_KEY')
+        }
+
+        # 测试网络连接
+        test_connection(os.getenv('API_URL'), headers)
+        checks['connection'] = 'ok'
+
+        # 提前创建模型实例，避免首个请求承担导入和初始化开销
+        get_model()
+        checks['model'] = 'ok'
+
+        # 可选：发送一个简单的测试请求（会消耗一次API调用）
+        if os.getenv('WARMUP_MODEL_PROBE', 'false').lower() in ('true', '1', 't'):
+            get_model().generate_content("test")
+            checks['model_probe'] = 'ok'
+        logger.info("Gemini API 预热完成")
+    except Exception as e:
+        error = str(e)
+        logger.error(f"Gemini API 预热失败: {error}")
+
+    with _readiness_lock:
+        _readiness['checks'] = checks
+        _readiness['error'] = error
+        _readiness['status'] = 'ready' if error is None else 'degraded'
+        _readiness['finished_at'] = time.time()
+
+def get_readiness():
+    """获取后台预热状态"""
+    with _readiness_lock:
+        return dict(_readiness, checks=dict(_readiness['checks']))
+
+def get_int_env(name, default):
+    """读取整数类型的环境变量，缺失或格式错误时返回默认值"""
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+def get_float_env(name, default):
+    """读取浮点类型的环境变量，缺失或格式错误时返回默认值"""
+    try:
+        return float(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
 def get_model():
-    """获取AI模型实例"""
+    """
+    获取AI模型实例，首次调用时才创建
+
+    默认通过共享 HTTP 连接池直接调用 REST 接口；MODEL_TRANSPORT=sdk 时使用 google.generativeai。
+    """
     global model
-    return model
\ No newline at end of file
+    if model is None:
+        with _model_lock:
+            if model is None:
+                if os.getenv('MODEL_TRANSPORT', 'httpx').lower() == 'sdk':
+                    import google.generativeai as genai
+
+                    # 配置 Gemini
+                    genai.configure(
+                        api_key=os.getenv('API_KEY'),
+                        transport='rest'
+                    )
+                    model = genai.GenerativeModel(os.getenv('MODEL'))
+                else:
+                    from gemini_client import GeminiModel
+                    model = GeminiModel(os.getenv('MODEL'), os.getenv('API_KEY'), os.getenv('API_URL'))
+                logger.info("Gemini 模型实例已创建")
+    return model
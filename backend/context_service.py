@@ -0,0 +1,111 @@
+import re
+import math
+import logging
+from collections import Counter
+from config import get_int_env
+
+logger = logging.getLogger(__name__)
+
+# BM25 参数
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+_CJK_RUN = re.compile(r'[㐀-䶿一-鿿豈-﫿]+')
+_LATIN_WORD = re.compile(r'[a-z0-9]+')
+
+def tokenize(text):
+    """分词：英文按单词，中文连续片段按字二元组（单字片段保留单字）"""
+    text = (text or '').lower()
+    tokens = _LATIN_WORD.findall(text)
+    for run in _CJK_RUN.findall(text):
+        if len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+def estimate_tokens(text):
+    """粗略估算模型 token 数：中文约一字一 token，其余约四个字符一 token"""
+    cjk_chars = sum(len(run) for run in _CJK_RUN.findall(text or ''))
+    other_chars = len(text or '') - cjk_chars
+    return cjk_chars + math.ceil(other_chars / 4)
+
+def split_passages(text, target_chars=600):
+    """按段落切分文本，过短的段落合并、过长的段落拆开，使每段约 target_chars 个字符"""
+    passages = []
+    current = ''
+    for paragraph in re.split(r'\n\s*\n', text or ''):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        for i in range(0, len(paragraph), target_chars):
+            piece = paragraph[i:i + target_chars]
+            if current and len(current) + len(piece) > target_chars:
+                passages.append(current)
+                current = ''
+            current = f"{current}\n\n{piece}" if current else piece
+    if current:
+        passages.append(current)
+    return passages
+
+def bm25_scores(passages, query):
+    """计算每个段落相对查询的 BM25 得分"""
+    query_terms = set(tokenize(query))
+    if not query_terms or not passages:
+        return [0.0] * len(passages)
+
+    term_counts = [Counter(tokenize(passage)) for passage in passages]
+    lengths = [sum(counts.values()) for counts in term_counts]
+    avg_length = (sum(lengths) / len(lengths)) or 1
+    doc_freq = Counter(term for counts in term_counts for term in query_terms if term in counts)
+    n = len(passages)
+
+    scores = []
+    for counts, length in zip(term_counts, lengths):
+        score = 0.0
+        for term in query_terms:
+            tf = counts.get(term)
+            if not tf:
+                continue
+            idf = math.log(1 + (n - doc_freq[term] + 0.5) / (doc_freq[term] + 0.5))
+            score += idf * tf * (BM25_K1 + 1) / (tf + BM25_K1 * (1 - BM25_B + BM25_B * length / avg_length))
+        scores.append(score)
+    return scores
+
+def select_context(text, query, token_budget=None):
+    """
+    按与查询的相关性挑选段落，装入 token 预算
+
+    Args:
+        text: 提取出的全文
+        query: 查询文本（备注、课程名、章节名等）
+        token_budget: token 预算，默认读取 CONTEXT_TOKEN_BUDGET
+
+    Returns:
+        按原文顺序拼接的入选段落；没有查询或全文不超过预算时原样返回
+    """
+    if token_budget is None:
+        token_budget = get_int_env('CONTEXT_TOKEN_BUDGET', 6000)
+    if token_budget <= 0 or not tokenize(query) or estimate_tokens(text) <= token_budget:
+        return text
+
+    passages = split_passages(text)
+    scores = bm25_scores(passages, query)
+    if not any(scores):
+        return text
+
+    # 只保留相关段落，得分从高到低装入预算，同分时靠前的段落优先
+    ranked = sorted((i for i in range(len(passages)) if scores[i] > 0), key=lambda i: (-scores[i], i))
+    chosen = []
+    used = 0
+    for i in ranked:
+        cost = estimate_tokens(passages[i])
+        if used + cost > token_budget:
+            continue
+        chosen.append(i)
+        used += cost
+
+    if not chosen:
+        return text
+    logger.info(f"上下文筛选: {len(passages)}段中选取{len(chosen)}段，约{used} tokens")
+    return '\n\n'.join(passages[i] for i in sorted(chosen))
@@ -1,23 +1,100 @@
 import sqlite3
 import os
+import queue
 import logging
 import json
+import base64
+import time
+import threading
+from contextlib import contextmanager
+from config import get_int_env
+from blob_codec import encode_json, decode_json, write_format, FORMAT_JSON
 logger = logging.getLogger(__name__)
 
 DB_PATH = 'database.db'
+# 旧版本中测验和分析单独保存的数据库文件，迁移时合并到 DB_PATH
+LEGACY_QUIZ_DB = 'quiz.db'
 
-def get_db_connection():
-    """获取数据库连接"""
-    conn = sqlite3.connect(DB_PATH)
+# 每个线程持有一个长期连接；请求线程结束时把连接归还空闲池供后续请求复用
+_local = threading.local()
+_idle = queue.LifoQueue()
+
+def _connect():
+    """创建一个新连接并设置 WAL 模式和性能相关的 PRAGMA"""
+    conn = sqlite3.connect(DB_PATH, timeout=get_int_env('SQLITE_BUSY_TIMEOUT_MS', 5000) / 1000,
+                           isolation_level=None, check_same_thread=False)
     conn.row_factory = sqlite3.Row
+    # WAL 下读写互不阻塞；synchronous=NORMAL 在 WAL 下断电只会丢失最近的提交，不会损坏数据库
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA cache_size=-{max(0, get_int_env('SQLITE_CACHE_KB', 16384))}")
+    conn.execute(f"PRAGMA mmap_size={max(0, get_int_env('SQLITE_MMAP_MB', 64)) * 1024 * 1024}")
+    conn.execute(f"PRAGMA busy_timeout={max(0, get_int_env('SQLITE_BUSY_TIMEOUT_MS', 5000))}")
+    conn.execute("PRAGMA temp_store=MEMORY")
     return conn
 
-def execute_query(query, params=None, fetchall=True):
-    """执行SQL查询"""
+def _owner():
+    # 数据库路径变化或在子进程中时不能复用已有连接
+    return (os.path.abspath(DB_PATH), os.getpid())
+
+def get_db_connection():
+    """获取当前线程的数据库连接（连接由连接管理器持有，调用方不要关闭）"""
+    conn = getattr(_local, 'conn', None)
+    if conn is not None and _local.owner == _owner():
+        return conn
+
     conn = None
+    while conn is None:
+        try:
+            owner, candidate = _idle.get_nowait()
+        except queue.Empty:
+            conn = _connect()
+            break
+        if owner == _owner():
+            conn = candidate
+    _local.conn, _local.owner, _local.depth = conn, _owner(), 0
+    return conn
+
+def release_connection():
+    """归还当前线程的连接（请求结束时调用），空闲池已满时直接关闭"""
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        return
+    _local.conn = None
+    if conn.in_transaction:
+        conn.rollback()
+    if _local.owner == _owner() and _idle.qsize() < get_int_env('SQLITE_POOL_SIZE', 8):
+        _idle.put((_local.owner, conn))
+    else:
+        conn.close()
+
+@contextmanager
+def transaction():
+    """
+    显式事务：范围内的 execute_query 在同一个事务中执行，正常结束时提交，出错时回滚
+
+    可以嵌套，内层范围并入最外层事务。
+    """
+    conn = get_db_connection()
+    if _local.depth == 0:
+        conn.execute("BEGIN IMMEDIATE")
+    _local.depth += 1
+    try:
+        yield conn
+    except BaseException:
+        _local.depth -= 1
+        if _local.depth == 0 and conn.in_transaction:
+            conn.rollback()
+        raise
+    _local.depth -= 1
+    if _local.depth == 0:
+        conn.commit()
+
+def execute_query(query, params=None, fetchall=True):
+    """执行SQL查询（不在 transaction() 范围内时每条语句自动提交）"""
+    cursor = None
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        cursor = get_db_connection().cursor()
         
         if params:
             cursor.execute(query, params)
@@ -31,126 +108,418 @@ def execute_query(query, params=None, fetchall=True):
                 result = cursor.fetchone()
             return result
         else:
-            conn.commit()
             return cursor.lastrowid
             
     except Exception as e:
-        if conn:
-            conn.rollback()
         logger.error(f"数据库操作失败: {str(e)}")
         raise
     finally:
-        if conn:
-            conn.close()
+        # 及时结束语句，避免长期连接上残留的读语句阻止 WAL 检查点
+        if cursor:
+            cursor.close()
+
+def execute_many(query, seq_of_params):
+    """在同一个事务中批量执行SQL语句"""
+    try:
+        with transaction() as conn:
+            conn.executemany(query, seq_of_params)
+    except Exception as e:
+        logger.error(f"数据库批量操作失败: {str(e)}")
+        raise
+
+def _create_schema():
+    """迁移1：创建所有数据表"""
+    # 测验相关表
+    execute_query('''
+    CREATE TABLE IF NOT EXISTS quizzes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        title TEXT,
+        file_name TEXT,
+        quiz_json TEXT,
+        question_count INTEGER,
+        difficulty TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+    
+    execute_query('''
+    CREATE TABLE IF NOT EXISTS analyses (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        quiz_id INTEGER,
+        analysis_json TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (quiz_id) REFERENCES quizzes(id)
+    )
+    ''')
+    
+    # 用户管理相关表
+    # 教师表
+    execute_query('''
+    CREATE TABLE IF NOT EXISTS teacher (
+        tno TEXT PRIMARY KEY,
+        name TEXT,
+        password TEXT,
+        gender TEXT,
+        college TEXT
+    )
+    ''')
+    
+    # 学生表
+    execute_query('''
+    CREATE TABLE IF NOT EXISTS student (
+        sno TEXT PRIMARY KEY,
+        name TEXT,
+        password TEXT,
+        gender TEXT,
+        college TEXT,
+        major TEXT
+    )
+    ''')
+    
+    # 课程表
+    execute_query('''
+    CREATE TABLE IF NOT EXISTS course (
+        cno TEXT PRIMARY KEY,
+        cname TEXT,
+        tno TEXT,
+        credits INTEGER,
+        FOREIGN KEY (tno) REFERENCES teacher(tno)
+    )
+    ''')
+    
+    # 学生选课表
+    execute_query('''
+    CREATE TABLE IF NOT EXISTS student_course (
+        sno TEXT,
+        cno TEXT,
+        PRIMARY KEY (sno, cno),
+        FOREIGN KEY (sno) REFERENCES student(sno),
+        FOREIGN KEY (cno) REFERENCES course(cno)
+    )
+    ''')
+    
+    # 章节表
+    execute_query('''
+    CREATE TABLE IF NOT EXISTS question (
+        qid INTEGER PRIMARY KEY AUTOINCREMENT,
+        qname TEXT,
+        cno TEXT,
+        FOREIGN KEY (cno) REFERENCES course(cno)
+    )
+    ''')
+    
+    # 答题情况表
+    execute_query('''
+    CREATE TABLE IF NOT EXISTS student_answer (
+        sno TEXT,
+        cno TEXT,
+        qid INTEGER,
+        allcnt INTEGER,
+        correctcnt INTEGER,
+        PRIMARY KEY (sno, cno, qid),
+        FOREIGN KEY (sno) REFERENCES student(sno),
+        FOREIGN KEY (cno) REFERENCES course(cno),
+        FOREIGN KEY (qid) REFERENCES question(qid)
+    )
+    ''')
+    
+    # 测验章节关联表
+    execute_query('''
+    CREATE TABLE IF NOT EXISTS quiz_chapters (
+        quiz_id INTEGER,
+        chapter_id INTEGER,
+        PRIMARY KEY (quiz_id, chapter_id),
+        FOREIGN KEY (quiz_id) REFERENCES quizzes(id),
+        FOREIGN KEY (chapter_id) REFERENCES question(qid)
+    )
+    ''')
+    
+    # 测验生成缓存表
+    execute_query('''
+    CREATE TABLE IF NOT EXISTS quiz_cache (
+        cache_key TEXT PRIMARY KEY,
+        quiz_json TEXT NOT NULL,
+        hit_count INTEGER DEFAULT 0,
+        created_at REAL,
+        last_used_at REAL
+    )
+    ''')
+    execute_query("CREATE INDEX IF NOT EXISTS idx_quiz_cache_last_used ON quiz_cache(last_used_at)")
+
+    # 测验生成任务表
+    execute_query('''
+    CREATE TABLE IF NOT EXISTS jobs (
+        id TEXT PRIMARY KEY,
+        status TEXT NOT NULL,
+        progress INTEGER DEFAULT 0,
+        message TEXT,
+        params_json TEXT,
+        file_name TEXT,
+        user_id TEXT,
+        user_type TEXT,
+        quiz_id INTEGER,
+        chapter_id INTEGER,
+        error TEXT,
+        created_at REAL,
+        updated_at REAL
+    )
+    ''')
+    execute_query("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, created_at)")
+
+    # 题库表：按课程、章节、难度和题型保存生成过的题目
+    execute_query('''
+    CREATE TABLE IF NOT EXISTS question_bank (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        cno TEXT NOT NULL,
+        chapter_id INTEGER,
+        difficulty TEXT,
+        qtype TEXT,
+        title TEXT,
+        question_json TEXT NOT NULL,
+        signature TEXT NOT NULL,
+        source_quiz_id INTEGER,
+        dup_count INTEGER DEFAULT 0,
+        use_count INTEGER DEFAULT 0,
+        created_at REAL,
+        FOREIGN KEY (cno) REFERENCES course(cno),
+        FOREIGN KEY (chapter_id) REFERENCES question(qid)
+    )
+    ''')
+    execute_query("CREATE INDEX IF NOT EXISTS idx_question_bank_lookup "
+                  "ON question_bank(cno, chapter_id, difficulty, qtype, use_count)")
+
+    # 题库 LSH 分桶表，用于查找近似重复的题目
+    execute_query('''
+    CREATE TABLE IF NOT EXISTS question_bank_lsh (
+        band_key INTEGER NOT NULL,
+        question_id INTEGER NOT NULL,
+        PRIMARY KEY (band_key, question_id),
+        FOREIGN KEY (question_id) REFERENCES question_bank(id)
+    )
+    ''')
+
+    # 文档表：上传的文件按内容 SHA-256 去重保存
+    execute_query('''
+    CREATE TABLE IF NOT EXISTS documents (
+        id TEXT PRIMARY KEY,
+        file_name TEXT,
+        kind TEXT,
+        size INTEGER,
+        page_count INTEGER,
+        created_at REAL,
+        last_used_at REAL
+    )
+    ''')
+    execute_query("CREATE INDEX IF NOT EXISTS idx_documents_last_used ON documents(last_used_at)")
+
+    # 文档逐页文本缓存
+    execute_query('''
+    CREATE TABLE IF NOT EXISTS document_pages (
+        doc_id TEXT NOT NULL,
+        page_no INTEGER NOT NULL,
+        text TEXT,
+        PRIMARY KEY (doc_id, page_no),
+        FOREIGN KEY (doc_id) REFERENCES documents(id)
+    )
+    ''')
+
+    # 文档页面价值评分（空白页、页眉页脚页、目录页在生成时跳过）
+    execute_query('''
+    CREATE TABLE IF NOT EXISTS document_page_scores (
+        doc_id TEXT NOT NULL,
+        page_no INTEGER NOT NULL,
+        score REAL,
+        label TEXT,
+        chars INTEGER,
+        PRIMARY KEY (doc_id, page_no),
+        FOREIGN KEY (doc_id) REFERENCES documents(id)
+    )
+    ''')
+
+    # 文档章节划分（书签或章节标题识别，上传后只计算一次）
+    execute_query('''
+    CREATE TABLE IF NOT EXISTS document_chapters (
+        doc_id TEXT NOT NULL,
+        chapter_no INTEGER NOT NULL,
+        title TEXT,
+        start_page INTEGER,
+        end_page INTEGER,
+        source TEXT,
+        PRIMARY KEY (doc_id, chapter_no),
+        FOREIGN KEY (doc_id) REFERENCES documents(id)
+    )
+    ''')
+
+    # 批量生成进度表（命令行 batch_generate.py 中断后据此续跑）
+    execute_query('''
+    CREATE TABLE IF NOT EXISTS batch_items (
+        item_key TEXT PRIMARY KEY,
+        file_name TEXT,
+        course_id TEXT,
+        chapter_name TEXT,
+        status TEXT NOT NULL,
+        quiz_id INTEGER,
+        chapter_id INTEGER,
+        error TEXT,
+        updated_at REAL
+    )
+    ''')
+
+def _add_lookup_indexes():
+    """迁移2：为教师端和学生端的查询条件建立索引，避免全表扫描"""
+    execute_query("CREATE INDEX IF NOT EXISTS idx_analyses_quiz ON analyses(quiz_id)")
+    execute_query("CREATE INDEX IF NOT EXISTS idx_quiz_chapters_chapter ON quiz_chapters(chapter_id)")
+    execute_query("CREATE INDEX IF NOT EXISTS idx_question_course_name ON question(cno, qname)")
+    execute_query("CREATE INDEX IF NOT EXISTS idx_student_answer_course ON student_answer(cno, qid)")
+    execute_query("CREATE INDEX IF NOT EXISTS idx_course_teacher ON course(tno)")
+    # 学生选课表主键为 (sno, cno)，按课程查学生需要单独的索引
+    execute_query("CREATE INDEX IF NOT EXISTS idx_student_course_course ON student_course(cno)")
+
+def _decode_json(value):
+    """解析JSON字段；旧版本把已经序列化的字符串又序列化了一次，需要重复解析"""
+    data = json.loads(value)
+    while isinstance(data, str):
+        data = json.loads(data)
+    return data
+
+def _normalize_json_columns():
+    """迁移3：把重复序列化的测验和分析JSON改为只序列化一次"""
+    for table, column in (('quizzes', 'quiz_json'), ('analyses', 'analysis_json')):
+        for row in execute_query(f"SELECT id, {column} FROM {table} WHERE {column} LIKE '\"%'"):
+            execute_query(f"UPDATE {table} SET {column} = ? WHERE id = ?",
+                          (json.dumps(_decode_json(row[column]), ensure_ascii=False), row['id']))
+
+def _merge_legacy_quiz_db():
+    """迁移4：把旧版 db_service 使用的 quiz.db 中的测验和分析合并进来（测验重新编号）"""
+    legacy_path = os.path.join(os.path.dirname(os.path.abspath(DB_PATH)), LEGACY_QUIZ_DB)
+    if not os.path.exists(legacy_path):
+        return
+    legacy = sqlite3.connect(legacy_path)
+    legacy.row_factory = sqlite3.Row
+    try:
+        tables = {row['name'] for row in legacy.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        quiz_ids = {}
+        if 'quizzes' in tables:
+            for row in legacy.execute("SELECT * FROM quizzes ORDER BY id"):
+                quiz_ids[row['id']] = execute_query(
+                    "INSERT INTO quizzes (title, file_name, quiz_json, question_count, difficulty, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (row['title'], row['file_name'], json.dumps(_decode_json(row['quiz_json']), ensure_ascii=False),
+                     row['question_count'], row['difficulty'], row['created_at'])
+                )
+        if 'analysis_results' in tables:
+            for row in legacy.execute("SELECT * FROM analysis_results ORDER BY id"):
+                execute_query(
+                    "INSERT INTO analyses (quiz_id, analysis_json, created_at) VALUES (?, ?, ?)",
+                    (quiz_ids.get(row['quiz_id']), json.dumps(_decode_json(row['analysis_json']), ensure_ascii=False),
+                     row['created_at'])
+                )
+        logger.info(f"已合并 {LEGACY_QUIZ_DB} 中的{len(quiz_ids)}份测验")
+    finally:
+        legacy.close()
+
+def _add_history_columns():
+    """迁移5：记录测验和分析的所属用户，并为历史列表的分页排序建立索引"""
+    execute_query("ALTER TABLE quizzes ADD COLUMN user_id TEXT")
+    execute_query("ALTER TABLE analyses ADD COLUMN user_id TEXT")
+    execute_query("CREATE INDEX IF NOT EXISTS idx_quizzes_created ON quizzes(created_at, id)")
+    execute_query("CREATE INDEX IF NOT EXISTS idx_quizzes_user ON quizzes(user_id, created_at, id)")
+    execute_query("CREATE INDEX IF NOT EXISTS idx_quizzes_difficulty ON quizzes(difficulty, created_at, id)")
+    execute_query("CREATE INDEX IF NOT EXISTS idx_analyses_created ON analyses(created_at, id)")
+    execute_query("CREATE INDEX IF NOT EXISTS idx_analyses_user ON analyses(user_id, created_at, id)")
+
+def _add_blob_format_columns():
+    """迁移6：测验和分析JSON改为压缩保存，json_format 记录格式（NULL 为旧的明文JSON，由后台任务逐步压缩）"""
+    execute_query("ALTER TABLE quizzes ADD COLUMN json_format TEXT")
+    execute_query("ALTER TABLE analyses ADD COLUMN json_format TEXT")
+
+def _create_item_tables():
+    """迁移7：逐题保存测验题目和学生作答，按题目统计时不再解析JSON"""
+    execute_query('''
+    CREATE TABLE IF NOT EXISTS quiz_items (
+        quiz_id INTEGER NOT NULL,
+        item_no INTEGER NOT NULL,
+        name TEXT,
+        qtype TEXT,
+        title TEXT,
+        correct_answer TEXT,
+        PRIMARY KEY (quiz_id, item_no),
+        FOREIGN KEY (quiz_id) REFERENCES quizzes(id)
+    )
+    ''')
+    # 作答时按题目名称找到题号
+    execute_query("CREATE INDEX IF NOT EXISTS idx_quiz_items_name ON quiz_items(quiz_id, name, item_no)")
+
+    execute_query('''
+    CREATE TABLE IF NOT EXISTS item_responses (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        analysis_id INTEGER,
+        quiz_id INTEGER NOT NULL,
+        item_no INTEGER NOT NULL,
+        user_id TEXT,
+        answer TEXT,
+        is_correct INTEGER NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (analysis_id) REFERENCES analyses(id),
+        FOREIGN KEY (quiz_id, item_no) REFERENCES quiz_items(quiz_id, item_no)
+    )
+    ''')
+    # 覆盖索引：按题目统计正确率、查找答错某题的学生都只读索引
+    execute_query("CREATE INDEX IF NOT EXISTS idx_item_responses_item "
+                  "ON item_responses(quiz_id, item_no, is_correct, user_id)")
+    # 覆盖索引：查找某个学生答错的题目
+    execute_query("CREATE INDEX IF NOT EXISTS idx_item_responses_user "
+                  "ON item_responses(user_id, is_correct, quiz_id, item_no)")
+
+def _reset_page_scores():
+    """目录页判定规则收紧后，旧规则保存的页面得分在下次使用时重新计算"""
+    execute_query("DELETE FROM document_page_scores")
+
+def _add_legacy_blob_indexes():
+    """未压缩的旧JSON行的部分索引，后台压缩时不必扫描整张表"""
+    for table, _ in BLOB_COLUMNS:
+        execute_query(f"CREATE INDEX IF NOT EXISTS idx_{table}_legacy_json ON {table}(id) WHERE json_format IS NULL")
+
+def _create_document_uploads():
+    """同一文档按上传者分别记录文件名"""
+    execute_query('''
+    CREATE TABLE IF NOT EXISTS document_uploads (
+        doc_id TEXT NOT NULL,
+        user_id TEXT NOT NULL,
+        file_name TEXT,
+        uploaded_at REAL,
+        PRIMARY KEY (doc_id, user_id)
+    )
+    ''')
+
+# 按顺序执行的数据库迁移，已执行到第几个记录在 PRAGMA user_version 中；只能在末尾追加
+MIGRATIONS = [
+    _create_schema,
+    _add_lookup_indexes,
+    _normalize_json_columns,
+    _merge_legacy_quiz_db,
+    _add_history_columns,
+    _add_blob_format_columns,
+    _create_item_tables,
+    _reset_page_scores,
+    _add_legacy_blob_indexes,
+    _create_document_uploads,
+]
+
+def migrate():
+    """执行尚未执行的迁移，每个迁移在单独的事务中完成"""
+    version = execute_query("PRAGMA user_version", fetchall=False)[0]
+    for number, migration in enumerate(MIGRATIONS[version:], version + 1):
+        with transaction():
+            migration()
+            execute_query(f"PRAGMA user_version = {number}")
+        logger.info(f"数据库已迁移到版本{number}（{migration.__name__}）")
 
 def init_database():
-    """初始化并创建所有数据库表"""
+    """初始化数据库：执行迁移并在空库中插入测试数据"""
     try:
-        # 测验相关表
-        execute_query('''
-        CREATE TABLE IF NOT EXISTS quizzes (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            title TEXT,
-            file_name TEXT,
-            quiz_json TEXT,
-            question_count INTEGER,
-            difficulty TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        ''')
-        
-        execute_query('''
-        CREATE TABLE IF NOT EXISTS analyses (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            quiz_id INTEGER,
-            analysis_json TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (quiz_id) REFERENCES quizzes(id)
-        )
-        ''')
-        
-        # 用户管理相关表
-        # 教师表
-        execute_query('''
-        CREATE TABLE IF NOT EXISTS teacher (
-            tno TEXT PRIMARY KEY,
-            name TEXT,
-            password TEXT,
-            gender TEXT,
-            college TEXT
-        )
-        ''')
-        
-        # 学生表
-        execute_query('''
-        CREATE TABLE IF NOT EXISTS student (
-            sno TEXT PRIMARY KEY,
-            name TEXT,
-            password TEXT,
-            gender TEXT,
-            college TEXT,
-            major TEXT
-        )
-        ''')
-        
-        # 课程表
-        execute_query('''
-        CREATE TABLE IF NOT EXISTS course (
-            cno TEXT PRIMARY KEY,
-            cname TEXT,
-            tno TEXT,
-            credits INTEGER,
-            FOREIGN KEY (tno) REFERENCES teacher(tno)
-        )
-        ''')
-        
-        # 学生选课表
-        execute_query('''
-        CREATE TABLE IF NOT EXISTS student_course (
-            sno TEXT,
-            cno TEXT,
-            PRIMARY KEY (sno, cno),
-            FOREIGN KEY (sno) REFERENCES student(sno),
-            FOREIGN KEY (cno) REFERENCES course(cno)
-        )
-        ''')
-        
-        # 章节表
-        execute_query('''
-        CREATE TABLE IF NOT EXISTS question (
-            qid INTEGER PRIMARY KEY AUTOINCREMENT,
-            qname TEXT,
-            cno TEXT,
-            FOREIGN KEY (cno) REFERENCES course(cno)
-        )
-        ''')
-        
-        # 答题情况表
-        execute_query('''
-        CREATE TABLE IF NOT EXISTS student_answer (
-            sno TEXT,
-            cno TEXT,
-            qid INTEGER,
-            allcnt INTEGER,
-            correctcnt INTEGER,
-            PRIMARY KEY (sno, cno, qid),
-            FOREIGN KEY (sno) REFERENCES student(sno),
-            FOREIGN KEY (cno) REFERENCES course(cno),
-            FOREIGN KEY (qid) REFERENCES question(qid)
-        )
-        ''')
-        
-        # 测验章节关联表
-        execute_query('''
-        CREATE TABLE IF NOT EXISTS quiz_chapters (
-            quiz_id INTEGER,
-            chapter_id INTEGER,
-            PRIMARY KEY (quiz_id, chapter_id),
-            FOREIGN KEY (quiz_id) REFERENCES quizzes(id),
-            FOREIGN KEY (chapter_id) REFERENCES question(qid)
-        )
-        ''')
-        
+        migrate()
+
         # 插入测试数据（如果表是空的）
         if not execute_query("SELECT * FROM teacher LIMIT 1"):
             _initialize_test_data()
@@ -232,21 +601,97 @@ def delete_data_by_id(field1, field2, value1, value2, table_name):
     return execute_query(query, (value1, value2))
 
 # 测验和分析相关功能
-def save_quiz(title, file_name, quiz_json, question_count, difficulty):
-    """保存测验到数据库"""
+def save_quiz(title, file_name, quiz_json, question_count, difficulty, user_id=None):
+    """保存测验到数据库（测验JSON压缩保存）"""
     query = '''
-    INSERT INTO quizzes (title, file_name, quiz_json, question_count, difficulty)
-    VALUES (?, ?, ?, ?, ?)
+    INSERT INTO quizzes (title, file_name, quiz_json, json_format, question_count, difficulty, user_id)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
     '''
-    return execute_query(query, (title, file_name, quiz_json, question_count, difficulty))
+    with transaction():
+        value, json_format = encode_json(quiz_json)
+        quiz_id = execute_query(query, (title, file_name, value, json_format, question_count, difficulty, user_id))
+        save_quiz_items(quiz_id, quiz_json)
+    return quiz_id
+
+def _answer_text(answer):
+    return answer if isinstance(answer, str) or answer is None else json.dumps(answer, ensure_ascii=False)
+
+def save_quiz_items(quiz_id, quiz_json):
+    """把测验中的题目逐题写入 quiz_items（题号为题目在测验中的顺序，从0开始）"""
+    if isinstance(quiz_json, str):
+        quiz_json = json.loads(quiz_json)
+    items = []
+    for page in quiz_json.get('pages', []):
+        for question in page.get('elements', []):
+            items.append((quiz_id, len(items), question.get('name'), question.get('type'),
+                          question.get('title'), _answer_text(question.get('correctAnswer'))))
+    with transaction() as conn:
+        conn.executemany("INSERT OR REPLACE INTO quiz_items (quiz_id, item_no, name, qtype, title, correct_answer) "
+                         "VALUES (?, ?, ?, ?, ?, ?)", items)
+    return len(items)
+
+def save_item_responses(analysis_id, quiz_id, user_id, responses, quiz_json=None):
+    """
+    逐题保存一次作答的判分结果
+
+    Args:
+        responses: analysis_service.grade_answers 的结果
+        quiz_json: 测验JSON，测验还没有逐题记录时（旧数据）用来补写 quiz_items
+    """
+    with transaction() as conn:
+        if quiz_json is not None and not execute_query(
+                "SELECT 1 FROM quiz_items WHERE quiz_id = ? LIMIT 1", (quiz_id,), fetchall=False):
+            save_quiz_items(quiz_id, quiz_json)
+        conn.executemany(
+            """
+            INSERT INTO item_responses (analysis_id, quiz_id, item_no, user_id, answer, is_correct)
+            SELECT ?, quiz_id, item_no, ?, ?, ? FROM quiz_items WHERE quiz_id = ? AND name = ?
+            """,
+            [(analysis_id, user_id, _answer_text(response['answer']), int(bool(response['is_correct'])),
+              quiz_id, response['name']) for response in responses]
+        )
 
-def save_analysis(quiz_id, analysis_json):
-    """保存分析到数据库"""
+def save_analysis(quiz_id, analysis_json, user_id=None):
+    """保存分析到数据库（分析JSON压缩保存）"""
     query = '''
-    INSERT INTO analyses (quiz_id, analysis_json)
-    VALUES (?, ?)
+    INSERT INTO analyses (quiz_id, analysis_json, json_format, user_id)
+    VALUES (?, ?, ?, ?)
     '''
-    return execute_query(query, (quiz_id, analysis_json))
+    analysis_json, json_format = encode_json(analysis_json)
+    return execute_query(query, (quiz_id, analysis_json, json_format, user_id))
+
+def assign_quiz_to_chapter(quiz_id, course_id, teacher_id, chapter_name):
+    """将测验布置到教师课程的章节，章节不存在时自动创建；课程不属于该教师时返回None"""
+    # 查找章节、创建章节和关联测验在同一个事务中完成，并发布置同名章节时不会重复创建
+    with transaction():
+        course_result = execute_query(
+            "SELECT * FROM course WHERE cno=? AND tno=?",
+            (course_id, teacher_id)
+        )
+        if not course_result:
+            return None
+
+        # 检查章节是否已存在
+        chapter_result = execute_query(
+            "SELECT * FROM question WHERE qname=? AND cno=?",
+            (chapter_name, course_id)
+        )
+
+        if chapter_result:
+            chapter_id = chapter_result[0]['qid']
+        else:
+            # 创建新章节
+            chapter_id = execute_query(
+                "INSERT INTO question (qname, cno) VALUES (?, ?)",
+                (chapter_name, course_id)
+            )
+
+        # 关联测验和章节
+        execute_query(
+            "INSERT INTO quiz_chapters (quiz_id, chapter_id) VALUES (?, ?)",
+            (quiz_id, chapter_id)
+        )
+        return chapter_id
 
 def get_quiz_by_id(quiz_id):
     """根据ID获取测验"""
@@ -259,17 +704,154 @@ def get_quiz_by_id(quiz_id):
         'id': result['id'],
         'title': result['title'],
         'file_name': result['file_name'],
-        'quiz_json': result['quiz_json'],
+        'quiz_json': decode_json(result['quiz_json'], result['json_format']),
         'question_count': result['question_count'],
         'difficulty': result['difficulty'],
         'created_at': result['created_at']
     }
 
-def get_all_quizzes():
-    """获取所有测验"""
-    query = "SELECT * FROM quizzes ORDER BY created_at DESC"
-    results = execute_query(query)
-    return [dict(row) for row in results]
+# 压缩保存的JSON列
+BLOB_COLUMNS = (('quizzes', 'quiz_json'), ('analyses', 'analysis_json'))
+
+def compress_legacy_blobs(after_ids, batch_size):
+    """
+    按主键顺序压缩一批旧的明文JSON
+
+    Args:
+        after_ids: 各表已处理到的最大ID（原地更新）
+        batch_size: 每张表每批处理的行数
+
+    Returns:
+        本批扫描的行数，为0表示全部处理完
+    """
+    fmt = write_format()
+    if fmt == FORMAT_JSON:
+        return 0
+    scanned = 0
+    for table, column in BLOB_COLUMNS:
+        with transaction():
+            # 只读取未压缩的行（部分索引），全部压缩后每次启动只做一次空的索引查找
+            rows = execute_query(f"SELECT id, {column} FROM {table} WHERE json_format IS NULL AND id > ? "
+                                 f"ORDER BY id LIMIT ?", (after_ids.get(table, 0), batch_size))
+            for row in rows:
+                value, _ = encode_json(row[column], fmt)
+                execute_query(f"UPDATE {table} SET {column} = ?, json_format = ? WHERE id = ?",
+                              (value, fmt, row['id']))
+        if rows:
+            after_ids[table] = rows[-1]['id']
+        scanned += len(rows)
+    return scanned
+
+def backfill_quiz_items(after_ids, batch_size):
+    """
+    为还没有逐题记录的旧测验补写 quiz_items
+
+    Returns:
+        本批处理的测验数，为0表示全部处理完
+    """
+    with transaction():
+        rows = execute_query(
+            """
+            SELECT id, quiz_json, json_format FROM quizzes q
+            WHERE id > ? AND NOT EXISTS (SELECT 1 FROM quiz_items i WHERE i.quiz_id = q.id)
+            ORDER BY id LIMIT ?
+            """,
+            (after_ids.get('quiz_items', 0), batch_size)
+        )
+        for row in rows:
+            try:
+                save_quiz_items(row['id'], decode_json(row['quiz_json'], row['json_format']))
+            except Exception as e:
+                logger.warning(f"测验{row['id']}无法拆分为逐题记录: {str(e)}")
+    if rows:
+        after_ids['quiz_items'] = rows[-1]['id']
+    return len(rows)
+
+def start_background_migrations():
+    """
+    在后台线程中分批处理旧数据（压缩JSON、补写逐题记录）：每批一个短事务，
+    批与批之间暂停，不会长时间占用写锁，也不阻塞启动
+    """
+    def _run():
+        after_ids = {}
+        try:
+            for step in (compress_legacy_blobs, backfill_quiz_items):
+                while step(after_ids, max(1, get_int_env('BLOB_MIGRATION_BATCH', 200))):
+                    time.sleep(max(0, get_int_env('BLOB_MIGRATION_PAUSE_MS', 50)) / 1000)
+            logger.info("旧数据后台迁移完成")
+        except Exception as e:
+            logger.error(f"旧数据后台迁移失败: {str(e)}")
+        finally:
+            release_connection()
+
+    thread = threading.Thread(target=_run, name='background-migration', daemon=True)
+    thread.start()
+    return thread
+
+class InvalidCursorError(Exception):
+    """分页游标无法解析（返回400）"""
+
+def encode_cursor(row):
+    """把一页最后一行的 (created_at, id) 编码为下一页的游标"""
+    raw = json.dumps([row['created_at'], row['id']]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    try:
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        return str(created_at), int(row_id)
+    except Exception:
+        raise InvalidCursorError("分页游标无效")
+
+def _page(query, conditions, params, order_prefix, limit, cursor):
+    """
+    按 (created_at, id) 倒序的游标分页：只读取 limit+1 行，耗时与历史总量无关
+
+    Returns:
+        (本页的行, 下一页游标或None)
+    """
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        conditions = conditions + [f"({order_prefix}created_at, {order_prefix}id) < (?, ?)"]
+        params = params + [created_at, row_id]
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += f" ORDER BY {order_prefix}created_at DESC, {order_prefix}id DESC LIMIT ?"
+    rows = [dict(row) for row in execute_query(query, params + [limit + 1])]
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+def _course_quiz_ids():
+    # 先按课程找到章节再找测验，两步都走索引
+    return ("SELECT qc.quiz_id FROM question c JOIN quiz_chapters qc ON qc.chapter_id = c.qid "
+            "WHERE c.cno = ?")
+
+def list_quizzes(limit, cursor=None, user_id=None, course_id=None, difficulty=None):
+    """
+    分页获取测验列表（只返回摘要列，不包含测验JSON）
+
+    Args:
+        limit: 每页条数
+        cursor: 上一页返回的游标，为空时从最新的测验开始
+        user_id: 只看该用户生成的测验
+        course_id: 只看布置到该课程的测验
+        difficulty: 只看该难度的测验
+
+    Returns:
+        (测验列表, 下一页游标或None)
+    """
+    conditions, params = [], []
+    if user_id:
+        conditions.append("user_id = ?")
+        params.append(user_id)
+    if course_id:
+        conditions.append(f"id IN ({_course_quiz_ids()})")
+        params.append(course_id)
+    if difficulty:
+        conditions.append("difficulty = ?")
+        params.append(difficulty)
+    query = "SELECT id, title, file_name, question_count, difficulty, created_at FROM quizzes"
+    return _page(query, conditions, params, '', limit, cursor)
 
 def get_analysis_by_id(analysis_id):
     """根据ID获取分析"""
@@ -284,7 +866,7 @@ def get_analysis_by_id(analysis_id):
         return None
     
     # 解析JSON
-    analysis_data = json.loads(result['analysis_json'])
+    analysis_data = decode_json(result['analysis_json'], result['json_format'])
     analysis_data['id'] = result['id']
     analysis_data['quiz_id'] = result['quiz_id']
     analysis_data['quiz_title'] = result['quiz_title']
@@ -293,13 +875,89 @@ def get_analysis_by_id(analysis_id):
     
     return analysis_data
 
-def get_all_analyses():
-    """获取所有分析"""
+def list_analyses(limit, cursor=None, user_id=None, course_id=None, difficulty=None):
+    """
+    分页获取分析列表（只返回摘要列，不包含分析JSON），参数同 list_quizzes，
+    课程和难度按分析对应的测验筛选
+
+    Returns:
+        (分析列表, 下一页游标或None)
+    """
+    conditions, params = [], []
+    if user_id:
+        conditions.append("a.user_id = ?")
+        params.append(user_id)
+    if course_id:
+        conditions.append(f"a.quiz_id IN ({_course_quiz_ids()})")
+        params.append(course_id)
+    if difficulty:
+        conditions.append("q.difficulty = ?")
+        params.append(difficulty)
     query = """
-    SELECT a.id, a.quiz_id, a.created_at, q.title as quiz_title, q.file_name
+    SELECT a.id, a.quiz_id, a.created_at, q.title as quiz_title, q.file_name, q.difficulty
     FROM analyses a
     JOIN quizzes q ON a.quiz_id = q.id
-    ORDER BY a.created_at DESC
     """
-    results = execute_query(query)
-    return [dict(row) for row in results]
\ No newline at end of file
+    return _page(query, conditions, params, 'a.', limit, cursor)
+
+def hardest_items(course_id, chapter_id=None, limit=10, min_responses=1):
+    """
+    课程（或其中一个章节）中答错率最高的题目
+
+    Returns:
+        按答错率从高到低排列的题目统计列表；测验布置到多个章节时 chapter_id 取其中最小的章节ID
+    """
+    chapter_condition = "AND c.qid = ?" if chapter_id else ""
+    params = [course_id] + ([chapter_id] if chapter_id else []) + [min_responses, limit]
+    rows = execute_query(
+        f"""
+        SELECT r.quiz_id, r.item_no, i.title, i.qtype, c.qid AS chapter_id, c.qname AS chapter_name,
+               COUNT(*) AS responses, SUM(r.is_correct) AS correct,
+               1.0 - AVG(r.is_correct) AS miss_rate
+        FROM (
+            -- 每个测验只保留一行，布置到多个章节的测验不会重复计算作答
+            SELECT qc.quiz_id, MIN(c.qid) AS chapter_id
+            FROM question c JOIN quiz_chapters qc ON qc.chapter_id = c.qid
+            WHERE c.cno = ? {chapter_condition}
+            GROUP BY qc.quiz_id
+        ) q
+        JOIN question c ON c.qid = q.chapter_id
+        JOIN item_responses r ON r.quiz_id = q.quiz_id
+        JOIN quiz_items i ON i.quiz_id = r.quiz_id AND i.item_no = r.item_no
+        GROUP BY r.quiz_id, r.item_no
+        HAVING COUNT(*) >= ?
+        ORDER BY miss_rate DESC, responses DESC
+        LIMIT ?
+        """,
+        params
+    )
+    return [dict(row) for row in rows]
+
+def item_misses(quiz_id, item_no):
+    """答错某道题的学生及其答错次数"""
+    rows = execute_query(
+        """
+        SELECT r.user_id, s.name, COUNT(*) AS misses
+        FROM item_responses r
+        LEFT JOIN student s ON s.sno = r.user_id
+        WHERE r.quiz_id = ? AND r.item_no = ? AND r.is_correct = 0
+        GROUP BY r.user_id
+        ORDER BY misses DESC
+        """,
+        (quiz_id, item_no)
+    )
+    return [dict(row) for row in rows]
+
+def teacher_owns_quiz(quiz_id, teacher_id):
+    """测验是否布置到了该教师的课程"""
+    return execute_query(
+        """
+        SELECT 1 FROM quiz_chapters qc
+        JOIN question c ON c.qid = qc.chapter_id
+        JOIN course co ON co.cno = c.cno
+        WHERE qc.quiz_id = ? AND co.tno = ?
+        LIMIT 1
+        """,
+        (quiz_id, teacher_id),
+        fetchall=False
+    ) is not None
@@ -0,0 +1,365 @@
+import os
+import re
+import json
+import time
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from config import get_int_env
+from db_manager import execute_query, execute_many
+from file_service import count_pdf_pages, extract_pdf_pages, extract_pdf_pages_many
+from ingest_service import spool_upload, read_text_file
+from page_triage import score_pages, filter_pages, triage_enabled
+from chapter_segmenter import outline_chapters, heading_chapters, whole_document
+from text_dedupe import merge_documents
+from admission_service import extraction_memory, reserve
+
+logger = logging.getLogger(__name__)
+
+DOCUMENT_DIR = 'documents'
+
+_DOC_ID_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+class DocumentNotFoundError(Exception):
+    """文档不存在或已被清理"""
+
+def _kind_of(file_name):
+    return 'pdf' if (file_name or '').lower().endswith('.pdf') else 'text'
+
+def document_path(doc_id):
+    """文档在磁盘上的路径（按哈希前两位分目录）"""
+    if not _DOC_ID_PATTERN.match(doc_id or ''):
+        raise DocumentNotFoundError("文档不存在")
+    return os.path.join(DOCUMENT_DIR, doc_id[:2], doc_id)
+
+def save_document(file, file_name=None, user_id=None):
+    """
+    保存上传的文档，内容相同的文件只存一份
+
+    边读边计算 SHA-256 并写入临时文件，不在内存中保留整份文件；
+    超过 MAX_UPLOAD_MB 时抛出 UploadTooLargeError。
+    文件名按上传者分别记录，不会看到其他用户上传同一文件时使用的文件名。
+
+    Args:
+        file: 上传的文件对象
+        file_name: 原始文件名，默认取 file.filename
+        user_id: 上传者，之后按文档ID引用时使用其上传时的文件名
+
+    Returns:
+        文档信息字典，file_name 为本次上传的文件名
+    """
+    file_name = file_name or getattr(file, 'filename', None) or 'upload'
+    os.makedirs(DOCUMENT_DIR, exist_ok=True)
+    sha256 = hashlib.sha256()
+    tmp_path, size = spool_upload(file, directory=DOCUMENT_DIR, on_chunk=sha256.update)
+
+    doc_id = sha256.hexdigest()
+    path = document_path(doc_id)
+    existing = get_document(doc_id)
+    if existing and os.path.exists(path):
+        os.remove(tmp_path)
+        touch_document(doc_id)
+        _record_upload(doc_id, user_id, file_name)
+        logger.info(f"文档已存在，复用: {doc_id[:12]}")
+        return dict(existing, file_name=file_name)
+
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(tmp_path, path)
+        kind = _kind_of(file_name)
+        page_count = count_pdf_pages(path) if kind == 'pdf' else 1
+    except Exception:
+        for leftover in (tmp_path, path):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+        raise
+
+    now = time.time()
+    execute_query(
+        """
+        INSERT OR REPLACE INTO documents (id, file_name, kind, size, page_count, created_at, last_used_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        """,
+        (doc_id, file_name, kind, size, page_count, now, now)
+    )
+    logger.info(f"已保存文档: {doc_id[:12]}，{file_name}，{size}字节，{page_count}页")
+    _record_upload(doc_id, user_id, file_name)
+    _evict_documents(keep=doc_id)
+    return get_document(doc_id)
+
+def _record_upload(doc_id, user_id, file_name):
+    if user_id:
+        execute_query(
+            "INSERT OR REPLACE INTO document_uploads (doc_id, user_id, file_name, uploaded_at) VALUES (?, ?, ?, ?)",
+            (doc_id, str(user_id), file_name, time.time())
+        )
+
+def get_document(doc_id, user_id=None):
+    """获取文档元数据，不存在时返回None；指定用户时使用该用户上传时的文件名"""
+    if not _DOC_ID_PATTERN.match(doc_id or ''):
+        return None
+    row = execute_query("SELECT * FROM documents WHERE id = ?", (doc_id,), fetchall=False)
+    if not row:
+        return None
+    file_name = row['file_name']
+    if user_id:
+        upload = execute_query("SELECT file_name FROM document_uploads WHERE doc_id = ? AND user_id = ?",
+                               (doc_id, str(user_id)), fetchall=False)
+        if upload:
+            file_name = upload['file_name']
+    return {
+        'doc_id': row['id'],
+        'file_name': file_name,
+        'kind': row['kind'],
+        'size': row['size'],
+        'page_count': row['page_count'],
+        'created_at': row['created_at']
+    }
+
+def require_document(doc_id, user_id=None):
+    """获取文档元数据，文档或文件缺失时抛出 DocumentNotFoundError"""
+    document = get_document(doc_id, user_id)
+    if not document or not os.path.exists(document_path(doc_id)):
+        raise DocumentNotFoundError("文档不存在或已过期，请重新上传")
+    return document
+
+def document_title(documents):
+    """多份文档合并生成时用于测验标题的文件名"""
+    return ' + '.join(document['file_name'] for document in documents)
+
+def touch_document(doc_id):
+    """更新最近使用时间（LRU 清理依据）"""
+    execute_query("UPDATE documents SET last_used_at = ? WHERE id = ?", (time.time(), doc_id))
+
+def _load_pages(document, timeout=None):
+    """提取文档每一页的文本并存入 document_pages，之后直接读取缓存"""
+    doc_id = document['doc_id']
+    rows = execute_query("SELECT page_no, text FROM document_pages WHERE doc_id = ? ORDER BY page_no", (doc_id,))
+    if rows:
+        return [row['text'] for row in rows]
+
+    path = document_path(doc_id)
+    with reserve(extraction_memory(document['page_count'], document['size']), '提取文档文本', timeout):
+        if document['kind'] == 'pdf':
+            pages = extract_pdf_pages(path)
+        else:
+            pages = [read_text_file(path)]
+    _store_pages(doc_id, pages)
+    return pages
+
+def _store_pages(doc_id, pages):
+    execute_many("INSERT OR REPLACE INTO document_pages (doc_id, page_no, text) VALUES (?, ?, ?)",
+                 [(doc_id, page_no, text) for page_no, text in enumerate(pages)])
+    _save_scores(doc_id, score_pages(pages))
+
+def _load_pages_many(documents, timeout=None):
+    """
+    同时提取多份尚未建立索引的文档
+
+    所有PDF的页段一起交给进程池，文本文件在其他线程中解码，
+    总耗时接近最慢的一份文档，而不是逐份相加。
+    """
+    missing = [document for document in documents if not _has_pages(document['doc_id'])]
+    if not missing:
+        return
+    pdf_documents = [document for document in missing if document['kind'] == 'pdf']
+    text_documents = [document for document in missing if document['kind'] != 'pdf']
+    memory = sum(extraction_memory(document['page_count'], document['size']) for document in missing)
+
+    with reserve(memory, '提取文档文本', timeout), \
+            ThreadPoolExecutor(max_workers=len(text_documents) + 1, thread_name_prefix='ingest') as executor:
+        pdf_future = None
+        if pdf_documents:
+            pdf_future = executor.submit(extract_pdf_pages_many,
+                                         [document_path(document['doc_id']) for document in pdf_documents])
+        text_futures = [executor.submit(read_text_file, document_path(document['doc_id']))
+                        for document in text_documents]
+        for document, future in zip(text_documents, text_futures):
+            _store_pages(document['doc_id'], [future.result()])
+        if pdf_future:
+            for document, pages in zip(pdf_documents, pdf_future.result()):
+                _store_pages(document['doc_id'], pages)
+
+def _save_scores(doc_id, scores):
+    execute_many(
+        "INSERT OR REPLACE INTO document_page_scores (doc_id, page_no, score, label, chars) VALUES (?, ?, ?, ?, ?)",
+        [(doc_id, item['page'], item['score'], item['label'], item['chars']) for item in scores]
+    )
+
+def get_page_scores(doc_id, timeout=None):
+    """
+    获取文档每一页的价值评分（首次调用时提取文本并打分）
+
+    Args:
+        timeout: 内存预算不足时的最长等待秒数，见 get_document_text
+
+    Returns:
+        每页一项的列表，包含 page、score、label 和 chars
+    """
+    document = require_document(doc_id)
+    rows = execute_query(
+        "SELECT page_no, score, label, chars FROM document_page_scores WHERE doc_id = ? ORDER BY page_no", (doc_id,)
+    )
+    if rows:
+        return [{'page': row['page_no'], 'score': row['score'], 'label': row['label'], 'chars': row['chars']}
+                for row in rows]
+
+    pages = _load_pages(document, timeout)
+    scores = score_pages(pages)
+    # 升级前已建立文本索引的文档在这里补充评分
+    _save_scores(doc_id, scores)
+    return scores
+
+def get_document_chapters(doc_id):
+    """
+    获取文档的章节划分（首次调用时计算并保存）
+
+    优先使用PDF书签，没有书签时按页面开头的章节标题识别，都失败时整份文档作为一章。
+
+    Returns:
+        章节列表，每项包含 chapter_no、title、start_page、end_page（含）和 source
+    """
+    document = require_document(doc_id)
+    rows = execute_query(
+        "SELECT chapter_no, title, start_page, end_page, source FROM document_chapters "
+        "WHERE doc_id = ? ORDER BY chapter_no", (doc_id,)
+    )
+    if rows:
+        return [dict(row) for row in rows]
+
+    chapters = None
+    if document['kind'] == 'pdf':
+        chapters = outline_chapters(document_path(doc_id), document['page_count'])
+        if not chapters:
+            pages = _load_pages(document)
+            labels = [item['label'] for item in get_page_scores(doc_id)]
+            chapters = heading_chapters(pages, labels)
+    if not chapters:
+        chapters = whole_document(os.path.splitext(document['file_name'])[0], document['page_count'])
+
+    execute_many(
+        "INSERT OR REPLACE INTO document_chapters (doc_id, chapter_no, title, start_page, end_page, source) "
+        "VALUES (?, ?, ?, ?, ?, ?)",
+        [(doc_id, c['chapter_no'], c['title'], c['start_page'], c['end_page'], c['source']) for c in chapters]
+    )
+    logger.info(f"文档分章完成: {doc_id[:12]}，共{len(chapters)}章（{chapters[0]['source']}）")
+    return chapters
+
+def get_document_chapter(doc_id, chapter_no):
+    """获取文档的某一章，不存在时返回None"""
+    for chapter in get_document_chapters(doc_id):
+        if chapter['chapter_no'] == chapter_no:
+            return chapter
+    return None
+
+def get_document_text(doc_id, selected_pages=None, triage=None, timeout=None):
+    """
+    获取文档文本，同一文档只解析一次
+
+    Args:
+        doc_id: 文档ID
+        selected_pages: 选定的页面列表（从0开始），为None时返回全部页面
+        triage: 是否跳过空白页、页眉页脚页和目录页，默认 PAGE_TRIAGE_ENABLED
+        timeout: 提取文本时内存预算不足的最长等待秒数，默认 ADMISSION_QUEUE_TIMEOUT；
+                 后台任务传 math.inf 一直排队，不会因为请求高峰而失败
+
+    Returns:
+        拼接后的文本
+    """
+    document = require_document(doc_id)
+    touch_document(doc_id)
+    if triage is None:
+        triage = triage_enabled()
+    if triage:
+        scores = get_page_scores(doc_id, timeout)
+        if selected_pages is None:
+            selected_pages = range(len(scores))
+        selected_pages = filter_pages(selected_pages, scores)
+    if selected_pages is not None and _has_pages(doc_id):
+        # 已建立页面文本索引时只读取选定的页面
+        return ''.join(_read_pages(doc_id, selected_pages))
+    pages = _load_pages(document, timeout)
+    if selected_pages is None:
+        selected_pages = range(len(pages))
+    return ''.join(pages[page_no] for page_no in selected_pages if 0 <= page_no < len(pages))
+
+def index_documents(doc_ids, timeout=None):
+    """并行提取多份文档的逐页文本并建立索引（已建立索引的文档跳过）"""
+    _load_pages_many([require_document(doc_id) for doc_id in doc_ids], timeout)
+
+def get_documents_text(doc_ids, selected_pages=None, triage=None, timeout=None):
+    """
+    获取一份或多份文档合并后的文本
+
+    多份文档时并行提取，再去掉与前面文档重复的段落（按 doc_ids 的顺序优先保留）。
+
+    Args:
+        doc_ids: 文档ID列表
+        selected_pages: 单份文档时为页面列表；多份文档时为 {文档ID: 页面列表}，未列出的文档使用全部页面
+        triage: 是否跳过低价值页面，默认 PAGE_TRIAGE_ENABLED
+        timeout: 内存预算不足时的最长等待秒数，见 get_document_text
+
+    Returns:
+        合并后的文本
+    """
+    if len(doc_ids) == 1:
+        if isinstance(selected_pages, dict):
+            selected_pages = selected_pages.get(doc_ids[0])
+        return get_document_text(doc_ids[0], selected_pages, triage, timeout)
+
+    index_documents(doc_ids, timeout)
+    selected_pages = selected_pages if isinstance(selected_pages, dict) else {}
+    return merge_documents([get_document_text(doc_id, selected_pages.get(doc_id), triage, timeout)
+                            for doc_id in doc_ids])
+
+def _has_pages(doc_id):
+    return execute_query("SELECT 1 FROM document_pages WHERE doc_id = ? LIMIT 1", (doc_id,), fetchall=False) is not None
+
+def _read_pages(doc_id, page_numbers):
+    """按给定顺序读取指定页面的文本"""
+    page_numbers = list(page_numbers)
+    texts = {}
+    # SQLite 单条语句的参数个数有限，分批查询
+    for i in range(0, len(page_numbers), 500):
+        batch = page_numbers[i:i + 500]
+        rows = execute_query(
+            f"SELECT page_no, text FROM document_pages WHERE doc_id = ? AND page_no IN ({', '.join('?' * len(batch))})",
+            (doc_id, *batch)
+        )
+        texts.update((row['page_no'], row['text']) for row in rows)
+    return [texts[page_no] for page_no in page_numbers if page_no in texts]
+
+def _evict_documents(keep=None):
+    """文档总大小超过 DOCUMENT_STORE_MAX_MB 时，按最近使用时间删除最旧的文档"""
+    max_bytes = get_int_env('DOCUMENT_STORE_MAX_MB', 1024) * 1024 * 1024
+    total = execute_query("SELECT COALESCE(SUM(size), 0) AS total FROM documents", fetchall=False)['total']
+    if total <= max_bytes:
+        return
+
+    # 排队或运行中的任务仍会用到的文档不删除
+    in_use = {keep}
+    for row in execute_query("SELECT params_json FROM jobs WHERE status IN ('queued', 'running')"):
+        params = json.loads(row['params_json'] or '{}')
+        in_use.update(params.get('doc_ids') or [])
+    removed = 0
+    for row in execute_query("SELECT id, size FROM documents ORDER BY last_used_at"):
+        if total <= max_bytes:
+            break
+        if row['id'] in in_use:
+            continue
+        delete_document(row['id'])
+        total -= row['size']
+        removed += 1
+    logger.info(f"文档存储清理了{removed}个文档")
+
+def delete_document(doc_id):
+    """删除文档文件、元数据和缓存的页面文本"""
+    try:
+        os.remove(document_path(doc_id))
+    except FileNotFoundError:
+        pass
+    execute_query("DELETE FROM document_pages WHERE doc_id = ?", (doc_id,))
+    execute_query("DELETE FROM document_page_scores WHERE doc_id = ?", (doc_id,))
+    execute_query("DELETE FROM document_chapters WHERE doc_id = ?", (doc_id,))
+    execute_query("DELETE FROM document_uploads WHERE doc_id = ?", (doc_id,))
+    execute_query("DELETE FROM documents WHERE id = ?", (doc_id,))
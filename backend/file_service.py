@@ -1,9 +1,15 @@
-import logging
-import PyPDF2
+import os
 import io
 import base64
-from pdf2image import convert_from_bytes
-from PIL import Image
+import logging
+import tempfile
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from config import get_int_env
+from ingest_service import spool_upload, open_mapped
+from admission_service import inspect_pdf, plan_full_preview, reserve
 
 logger = logging.getLogger(__name__)
 
@@ -18,19 +24,22 @@ def extract_text_from_pdf(pdf_file, selected_pages=None):
     Returns:
         提取的文本
     """
+    import PyPDF2
+
     try:
         pdf_reader = PyPDF2.PdfReader(pdf_file)
-        text = ""
         
         # 如果未指定页面，则提取全部页面
         if selected_pages is None:
             selected_pages = range(len(pdf_reader.pages))
         
         # 只提取选定页面的文本
+        parts = []
         for page_num in selected_pages:
             if 0 <= page_num < len(pdf_reader.pages):
                 page = pdf_reader.pages[page_num]
-                text += page.extract_text() + "\n\n"
+                parts.append(page.extract_text() + "\n\n")
+        text = ''.join(parts)
         
         logger.info(f"成功从PDF中提取了{len(text)}个字符，共{len(selected_pages)}页")
         return text
@@ -38,6 +47,162 @@ def extract_text_from_pdf(pdf_file, selected_pages=None):
         logger.error(f"PDF文本提取失败: {str(e)}")
         raise
 
+_process_pool = None
+_process_pool_lock = threading.Lock()
+
+def _new_process_pool(workers):
+    # Web 进程中有多个线程，使用 spawn 避免 fork 继承锁状态
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+
+def _get_process_pool():
+    """获取（并按需创建）文本提取进程池"""
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            workers = max(1, get_int_env('PDF_EXTRACT_WORKERS', os.cpu_count() or 1))
+            _process_pool = _new_process_pool(workers)
+            logger.info(f"PDF文本提取进程池已启动，进程数: {workers}")
+        return _process_pool
+
+def _extract_page_range(pdf_path, start, end):
+    """提取 [start, end) 页的文本（在子进程中执行）"""
+    import PyPDF2
+
+    with open_mapped(pdf_path) as f:
+        pdf_reader = PyPDF2.PdfReader(f)
+        return [pdf_reader.pages[i].extract_text() + "\n\n" for i in range(start, end)]
+
+def extract_pdf_pages(pdf_path, workers=None):
+    """
+    逐页提取PDF文本，页数较多时按页段并行提取
+
+    页数不少于 PDF_EXTRACT_PARALLEL_MIN_PAGES 时，按 PDF_EXTRACT_BATCH_PAGES 页一段
+    分发到进程池（PyPDF2 是纯 Python 实现，多线程无法利用多核）。
+
+    Args:
+        pdf_path: PDF文件路径
+        workers: 并行进程数，默认使用共享进程池；为1时在当前进程中顺序提取
+
+    Returns:
+        每页文本的列表（每页末尾带空行，与 extract_text_from_pdf 的拼接方式一致）
+    """
+    return extract_pdf_pages_many([pdf_path], workers)[0]
+
+def extract_pdf_pages_many(pdf_paths, workers=None):
+    """
+    同时提取多份PDF的逐页文本
+
+    所有文档的页段一起分发到进程池，总耗时取决于总页数和进程数，
+    而不是逐份提取的耗时之和。
+
+    Returns:
+        与 pdf_paths 一一对应的每页文本列表
+    """
+    page_counts = [count_pdf_pages(path) for path in pdf_paths]
+    total_pages = sum(page_counts)
+    if workers == 1 or total_pages < max(2, get_int_env('PDF_EXTRACT_PARALLEL_MIN_PAGES', 32)):
+        results = [_extract_page_range(path, 0, count) for path, count in zip(pdf_paths, page_counts)]
+    else:
+        batch_size = max(1, get_int_env('PDF_EXTRACT_BATCH_PAGES', 25))
+        tasks = [(index, start, min(start + batch_size, count))
+                 for index, count in enumerate(page_counts)
+                 for start in range(0, count, batch_size)]
+        pool = _new_process_pool(workers) if workers else _get_process_pool()
+        try:
+            chunks = pool.map(_extract_page_range, [pdf_paths[index] for index, _, _ in tasks],
+                              [start for _, start, _ in tasks], [end for _, _, end in tasks])
+            results = [[] for _ in pdf_paths]
+            for (index, _, _), chunk in zip(tasks, chunks):
+                results[index].extend(chunk)
+        finally:
+            if workers:
+                pool.shutdown()
+    logger.info(f"成功从{len(pdf_paths)}份PDF中逐页提取文本，共{total_pages}页")
+    return results
+
+# 预览图最大尺寸
+THUMBNAIL_SIZE = (300, 400)
+
+def count_pdf_pages(pdf_path):
+    """读取PDF页数（只解析目录结构，不渲染页面）"""
+    import PyPDF2
+
+    with open_mapped(pdf_path) as f:
+        return len(PyPDF2.PdfReader(f).pages)
+
+def encode_thumbnail(image):
+    """将页面图片缩放到预览尺寸并编码为JPEG"""
+    from PIL import Image
+
+    width, height = image.size
+    ratio = min(THUMBNAIL_SIZE[0] / width, THUMBNAIL_SIZE[1] / height)
+    # reducing_gap 先按整数倍快速缩小再做 LANCZOS，缩放大图时快很多且画质几乎不变
+    image = image.resize((int(width * ratio), int(height * ratio)), Image.LANCZOS, reducing_gap=3.0)
+
+    buffered = io.BytesIO()
+    image.convert('RGB').save(buffered, format="JPEG", quality=70)
+    return buffered.getvalue()
+
+def _render_batch(pdf_path, first_page, last_page, dpi):
+    """
+    渲染一批连续页面并编码为预览图
+
+    渲染结果写入临时目录（pdf2image 按文件懒加载像素数据），处理完一页即释放。
+    """
+    from pdf2image import convert_from_path
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix='pdf-preview-') as output_dir:
+        images = convert_from_path(pdf_path, dpi=dpi, first_page=first_page, last_page=last_page,
+                                   output_folder=output_dir, fmt='ppm')
+        for offset, image in enumerate(images):
+            try:
+                results.append((first_page - 1 + offset, encode_thumbnail(image)))
+            finally:
+                image.close()
+    return results
+
+def preview_batch_settings():
+    """整本预览的批大小和并行批次数"""
+    return (max(1, get_int_env('PREVIEW_BATCH_PAGES', 8)),
+            max(1, get_int_env('PREVIEW_WORKERS', min(4, os.cpu_count() or 1))))
+
+def iter_pdf_previews(pdf_path, dpi=72, max_pages=None, workers=None):
+    """
+    分批并行渲染PDF预览图，按页码顺序逐页产出
+
+    每批 PREVIEW_BATCH_PAGES 页，最多 PREVIEW_WORKERS 批同时渲染，
+    内存占用只与批大小和并发数有关，与文档总页数无关。
+
+    Args:
+        pdf_path: PDF文件路径
+        dpi: 渲染DPI
+        max_pages: 只渲染前多少页，默认全部
+        workers: 并行批次数，默认 PREVIEW_WORKERS
+
+    Yields:
+        (页码（从0开始）, JPEG字节)
+    """
+    total_pages = count_pdf_pages(pdf_path)
+    if max_pages is not None:
+        total_pages = min(total_pages, max_pages)
+    batch_size, default_workers = preview_batch_settings()
+    workers = workers or default_workers
+    batches = [(start, min(start + batch_size - 1, total_pages))
+               for start in range(1, total_pages + 1, batch_size)]
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='pdf-preview') as executor:
+        # 限制在途批次数量，已完成但尚未轮到产出的批次也计入
+        pending = deque()
+        next_batch = 0
+        while next_batch < len(batches) or pending:
+            while next_batch < len(batches) and len(pending) < workers:
+                first_page, last_page = batches[next_batch]
+                pending.append(executor.submit(_render_batch, pdf_path, first_page, last_page, dpi))
+                next_batch += 1
+            for page in pending.popleft().result():
+                yield page
+
 def generate_pdf_previews(pdf_file):
     """
     生成PDF文件每一页的预览图
@@ -46,36 +211,32 @@ def generate_pdf_previews(pdf_file):
         pdf_file: PDF文件对象
         
     Returns:
-        包含每一页预览图base64编码和页数的列表
+        字典：previews 为每一页预览图base64编码和页数的列表，total_pages 为文档总页数，
+        downgraded 表示是否因文档过大而降低DPI或只预览了前面的页面
     """
     try:
-        # 保存PDF文件到临时内存对象
-        pdf_bytes = io.BytesIO(pdf_file.read())
+        # 上传内容写入临时文件，渲染进程直接读取文件，不在内存中保留整份PDF
+        tmp_path, _ = spool_upload(pdf_file)
         pdf_file.seek(0)  # 重置文件指针，以便后续还能读取
-        
-        # 将PDF转换为图片
-        images = convert_from_bytes(pdf_bytes.getvalue(), dpi=72)  # 低DPI以加快速度，足够预览使用
-        
-        previews = []
-        for i, image in enumerate(images):
-            # 调整图片大小以优化传输
-            width, height = image.size
-            ratio = min(300 / width, 400 / height)
-            new_size = (int(width * ratio), int(height * ratio))
-            image = image.resize(new_size, Image.LANCZOS)
-            
-            # 转换为base64
-            buffered = io.BytesIO()
-            image.save(buffered, format="JPEG", quality=70)
-            img_base64 = base64.b64encode(buffered.getvalue()).decode('utf-8')
-            
-            previews.append({
-                "page": i,
-                "image": f"data:image/jpeg;base64,{img_base64}"
-            })
+
+        try:
+            # 按页数和页面尺寸估算内存，必要时降级，并在全局内存预算中预留
+            info = inspect_pdf(tmp_path)
+            plan = plan_full_preview(info, 72, *preview_batch_settings())  # 低DPI以加快速度，足够预览使用
+            previews = []
+            with reserve(plan['memory'], '生成PDF预览'):
+                for page, image_data in iter_pdf_previews(tmp_path, dpi=plan['dpi'], max_pages=plan['pages'],
+                                                          workers=plan['workers']):
+                    img_base64 = base64.b64encode(image_data).decode('utf-8')
+                    previews.append({
+                        "page": page,
+                        "image": f"data:image/jpeg;base64,{img_base64}"
+                    })
+        finally:
+            os.remove(tmp_path)
         
         logger.info(f"成功生成PDF预览图，共{len(previews)}页")
-        return previews
+        return {'previews': previews, 'total_pages': info['pages'], 'downgraded': plan['downgraded']}
     except Exception as e:
         logger.error(f"生成PDF预览图失败: {str(e)}")
-        raise
\ No newline at end of file
+        raise
@@ -0,0 +1,86 @@
+import json
+import logging
+import http_client
+
+logger = logging.getLogger(__name__)
+
+class ModelAPIError(Exception):
+    """Gemini REST 接口返回错误"""
+
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+class GenerationResponse:
+    """与 SDK 响应对象兼容的最小实现，只提供 text 属性"""
+
+    def __init__(self, text):
+        self.text = text
+
+def _extract_text(payload):
+    """从 generateContent 响应中提取文本"""
+    texts = []
+    for candidate in payload.get('candidates', []):
+        for part in candidate.get('content', {}).get('parts', []):
+            if 'text' in part:
+                texts.append(part['text'])
+        # 只使用第一个候选结果
+        break
+    return ''.join(texts)
+
+class GeminiModel:
+    """
+    通过共享 HTTP 连接池直接调用 Gemini REST 接口的模型客户端
+
+    接口与 google.generativeai.GenerativeModel.generate_content 保持一致，
+    stream=True 时返回逐块产出 GenerationResponse 的迭代器。
+    """
+
+    def __init__(self, model_name, api_key, api_url):
+        self.model_name = model_name
+        self.api_key = api_key
+        self.api_url = api_url.rstrip('/')
+
+    def _url(self, method):
+        return f"{self.api_url}/models/{self.model_name}:{method}"
+
+    def _headers(self):
+        return {
+            "Content-Type": "application/json",
+            "x-goog-api-key": self.api_key
+        }
+
+    def _body(self, prompt):
+        return {"contents": [{"role": "user", "parts": [{"text": prompt}]}]}
+
+    def generate_content(self, prompt, stream=False, timeout=None):
+        # 未指定时使用共享客户端的默认超时
+        options = {'timeout': timeout} if timeout is not None else {}
+        if stream:
+            return self._stream_content(prompt, options)
+
+        response = http_client.request('POST', self._url('generateContent'),
+                                       headers=self._headers(), json=self._body(prompt), **options)
+        if response.status_code != 200:
+            raise ModelAPIError(f"模型调用失败: HTTP {response.status_code} {response.text[:500]}",
+                                status_code=response.status_code)
+        return GenerationResponse(_extract_text(response.json()))
+
+    def _stream_content(self, prompt, options):
+        import httpx
+
+        try:
+            for line in http_client.stream('POST', self._url('streamGenerateContent'),
+                                           params={'alt': 'sse'},
+                                           headers=self._headers(), json=self._body(prompt), **options):
+                if not line.startswith('data:'):
+                    continue
+                data = line[5:].strip()
+                if not data:
+                    continue
+                text = _extract_text(json.loads(data))
+                if text:
+                    yield GenerationResponse(text)
+        except httpx.HTTPStatusError as e:
+            raise ModelAPIError(f"模型调用失败: HTTP {e.response.status_code} {e.response.text[:500]}",
+                                status_code=e.response.status_code)
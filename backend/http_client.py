@@ -0,0 +1,127 @@
+import os
+import time
+import logging
+import threading
+from config import get_int_env, get_float_env
+
+logger = logging.getLogger(__name__)
+
+_client = None
+_client_lock = threading.Lock()
+
+# 连接池使用统计
+_stats = {
+    'requests': 0,
+    'errors': 0,
+    'in_flight': 0,
+    'max_in_flight': 0,
+    'total_seconds': 0.0
+}
+_stats_lock = threading.Lock()
+
+# 创建客户端时使用的连接池配置
+_pool_config = {}
+
+def _http2_enabled():
+    """是否启用 HTTP/2（需要安装 h2）"""
+    if os.getenv('HTTP2_ENABLED', 'false').lower() not in ('true', '1', 't'):
+        return False
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        logger.warning("未安装 h2，HTTP/2 已禁用，回退到 HTTP/1.1")
+        return False
+
+def get_http_client():
+    """获取全局共享的 httpx 客户端（线程安全，连接池复用、保持长连接）"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                import httpx
+
+                limits = httpx.Limits(
+                    max_connections=get_int_env('HTTP_MAX_CONNECTIONS', 20),
+                    max_keepalive_connections=get_int_env('HTTP_MAX_KEEPALIVE', 10),
+                    keepalive_expiry=get_float_env('HTTP_KEEPALIVE_EXPIRY', 60.0)
+                )
+                timeout = httpx.Timeout(
+                    get_float_env('HTTP_TIMEOUT', 120.0),
+                    connect=get_float_env('HTTP_CONNECT_TIMEOUT', 20.0),
+                    pool=get_float_env('HTTP_POOL_TIMEOUT', 30.0)
+                )
+                http2 = _http2_enabled()
+                _client = httpx.Client(limits=limits, timeout=timeout, http2=http2)
+                _pool_config.update(
+                    max_connections=limits.max_connections,
+                    max_keepalive_connections=limits.max_keepalive_connections,
+                    keepalive_expiry=limits.keepalive_expiry,
+                    http2=http2
+                )
+                logger.info(f"共享HTTP客户端已创建，最大连接数: {limits.max_connections}")
+    return _client
+
+def _record_start():
+    with _stats_lock:
+        _stats['requests'] += 1
+        _stats['in_flight'] += 1
+        _stats['max_in_flight'] = max(_stats['max_in_flight'], _stats['in_flight'])
+
+def _record_end(started, failed):
+    with _stats_lock:
+        _stats['in_flight'] -= 1
+        _stats['total_seconds'] += time.perf_counter() - started
+        if failed:
+            _stats['errors'] += 1
+
+def request(method, url, **kwargs):
+    """通过共享客户端发送请求并记录统计"""
+    started = time.perf_counter()
+    _record_start()
+    failed = True
+    try:
+        response = get_http_client().request(method, url, **kwargs)
+        failed = response.status_code >= 400
+        return response
+    finally:
+        _record_end(started, failed)
+
+def stream(method, url, **kwargs):
+    """
+    通过共享客户端发送流式请求
+
+    Yields:
+        响应的每一行文本；状态码异常时抛出 httpx.HTTPStatusError
+    """
+    started = time.perf_counter()
+    _record_start()
+    failed = True
+    try:
+        with get_http_client().stream(method, url, **kwargs) as response:
+            if response.status_code >= 400:
+                response.read()
+                response.raise_for_status()
+            for line in response.iter_lines():
+                yield line
+        failed = False
+    finally:
+        _record_end(started, failed)
+
+def get_pool_stats():
+    """获取连接池使用统计"""
+    with _stats_lock:
+        stats = dict(_stats)
+    stats['avg_seconds'] = stats['total_seconds'] / stats['requests'] if stats['requests'] else 0.0
+
+    # 只报告本模块自己记录的数据，不读取 httpx/httpcore 的私有属性
+    stats['pool'] = dict(_pool_config) if _client is not None else None
+    return stats
+
+def close_http_client():
+    """关闭共享客户端（主要用于测试和进程退出）"""
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
@@ -0,0 +1,132 @@
+import os
+import mmap
+import codecs
+import logging
+import tempfile
+from contextlib import contextmanager
+from config import get_int_env
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+# multipart 边界和其他表单字段所需的额外空间
+FORM_OVERHEAD = 1024 * 1024
+# 编码检测读取的字节数
+ENCODING_SNIFF_BYTES = 64 * 1024
+# UTF-8 失败后依次尝试的编码（GB18030 兼容 GBK/GB2312）
+FALLBACK_ENCODINGS = ('gb18030', 'big5')
+
+_BOMS = (
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+)
+
+class UploadTooLargeError(Exception):
+    """上传文件超过 MAX_UPLOAD_MB"""
+
+def max_upload_bytes():
+    """单个上传文件的大小上限"""
+    return max(1, get_int_env('MAX_UPLOAD_MB', 50)) * 1024 * 1024
+
+def max_request_bytes():
+    """请求体大小上限（用于 Flask 的 MAX_CONTENT_LENGTH，在读取请求体之前检查）"""
+    return max_upload_bytes() + FORM_OVERHEAD
+
+def spool_upload(file, directory=None, on_chunk=None):
+    """
+    将上传文件分块写入临时文件，不在内存中保留整份文件
+
+    Args:
+        file: 上传的文件对象
+        directory: 临时文件所在目录，默认系统临时目录
+        on_chunk: 每读取一块时的回调（如计算哈希）
+
+    Returns:
+        (临时文件路径, 文件大小)，调用方负责删除或移动临时文件
+    """
+    limit = max_upload_bytes()
+    size = 0
+    with tempfile.NamedTemporaryFile(dir=directory, suffix='.tmp', delete=False) as tmp:
+        try:
+            while True:
+                chunk = file.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                # 分块传输的请求没有 Content-Length，只能边读边检查
+                if size > limit:
+                    raise UploadTooLargeError(f"上传文件超过{limit // (1024 * 1024)}MB上限")
+                if on_chunk:
+                    on_chunk(chunk)
+                tmp.write(chunk)
+        except Exception:
+            tmp.close()
+            os.remove(tmp.name)
+            raise
+    return tmp.name, size
+
+@contextmanager
+def open_mapped(path):
+    """
+    以内存映射方式只读打开文件
+
+    PyPDF2 解析时会频繁 seek 和小块读取，内存映射后直接从页缓存读取，
+    多个请求打开同一文档也共享同一份物理内存。空文件无法映射，返回普通文件对象。
+    """
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            yield f
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            yield mapped
+
+def _decodes(sample, encoding):
+    """样本能否按给定编码解码（末尾被截断的多字节字符不算错误）"""
+    try:
+        codecs.getincrementaldecoder(encoding)().decode(sample, final=False)
+        return True
+    except UnicodeDecodeError:
+        return False
+
+def detect_encoding(path):
+    """
+    检测文本文件的编码
+
+    先看BOM，再依次尝试 UTF-8、GB18030、Big5，都失败时按 UTF-8 处理（非法字节替换）。
+    开头是纯 ASCII 的块（如英文封面、代码）跳过，用第一个含非 ASCII 字节的块判断。
+    """
+    with open(path, 'rb') as f:
+        sample = f.read(ENCODING_SNIFF_BYTES)
+        for bom, encoding in _BOMS:
+            if sample.startswith(bom):
+                return encoding
+        while sample.isascii():
+            sample = f.read(ENCODING_SNIFF_BYTES)
+            if not sample:
+                return 'utf-8'
+    for encoding in ('utf-8',) + FALLBACK_ENCODINGS:
+        if _decodes(sample, encoding):
+            return encoding
+    return 'utf-8'
+
+def read_text_file(path, encoding=None):
+    """
+    分块增量解码文本文件
+
+    每次只读取 UPLOAD_CHUNK_SIZE 字节，跨块的多字节字符由增量解码器处理；
+    检测范围之外出现的非法字节替换为 U+FFFD，不会使整个文件解析失败。
+    """
+    encoding = encoding or detect_encoding(path)
+    decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+    parts = []
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            parts.append(decoder.decode(chunk))
+    parts.append(decoder.decode(b'', final=True))
+    text = ''.join(parts)
+    logger.info(f"已读取文本文件，编码: {encoding}，共{len(text)}个字符")
+    return text
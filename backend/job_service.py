@@ -0,0 +1,182 @@
+import json
+import math
+import time
+import uuid
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from config import get_int_env
+from quiz_service import generate_quiz, update_survey_json
+from db_manager import execute_query, save_quiz, assign_quiz_to_chapter, transaction
+from question_bank import lookup_bank_quiz, store_quiz_questions, BANK_FILE_NAME
+from document_store import get_document, get_documents_text, document_title
+
+logger = logging.getLogger(__name__)
+
+# 任务状态
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_SUCCEEDED = 'succeeded'
+JOB_FAILED = 'failed'
+
+_executor = None
+_executor_lock = threading.Lock()
+
+class JobQueueFullError(Exception):
+    """等待中的任务过多"""
+
+def get_executor():
+    """获取（并按需创建）后台任务线程池"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            max_workers = max(1, get_int_env('QUIZ_JOB_WORKERS', 2))
+            _executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='quiz-job')
+            logger.info(f"测验生成任务线程池已启动，工作线程数: {max_workers}")
+        return _executor
+
+def _update_job(job_id, **fields):
+    """更新任务记录"""
+    fields['updated_at'] = time.time()
+    set_clause = ', '.join(f"{k} = ?" for k in fields)
+    execute_query(f"UPDATE jobs SET {set_clause} WHERE id = ?", tuple(fields.values()) + (job_id,))
+
+def submit_quiz_job(documents, params, current_user):
+    """
+    提交测验生成任务
+
+    Args:
+        documents: 文档存储中的文档信息列表（多份文档合并生成一份测验）
+        params: 生成参数字典
+        current_user: 当前用户信息
+
+    Returns:
+        任务ID
+    """
+    max_pending = get_int_env('QUIZ_JOB_MAX_PENDING', 50)
+    pending = execute_query(
+        "SELECT COUNT(*) AS count FROM jobs WHERE status IN (?, ?)",
+        (JOB_QUEUED, JOB_RUNNING), fetchall=False
+    )
+    if max_pending > 0 and pending['count'] >= max_pending:
+        raise JobQueueFullError("当前生成任务过多，请稍后再试")
+
+    job_id = uuid.uuid4().hex
+    params = dict(params, doc_ids=[document['doc_id'] for document in documents])
+
+    now = time.time()
+    execute_query(
+        """
+        INSERT INTO jobs (id, status, progress, message, params_json, file_name,
+                          user_id, user_type, created_at, updated_at)
+        VALUES (?, ?, 0, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        (job_id, JOB_QUEUED, '排队中', json.dumps(params, ensure_ascii=False),
+         document_title(documents) or BANK_FILE_NAME, current_user['id'], current_user['user_type'], now, now)
+    )
+
+    get_executor().submit(_run_quiz_job, job_id)
+    logger.info(f"已提交测验生成任务: {job_id}")
+    return job_id
+
+def _run_quiz_job(job_id):
+    """在后台线程中执行测验生成任务"""
+    job = execute_query("SELECT * FROM jobs WHERE id = ?", (job_id,), fetchall=False)
+    if not job:
+        logger.error(f"任务不存在: {job_id}")
+        return
+
+    try:
+        params = json.loads(job['params_json'])
+        file_name = job['file_name']
+        question_count = params['question_count']
+        difficulty = params['difficulty']
+
+        # 章节题库中已有足够题目时直接组卷，不提取文本也不调用模型
+        _update_job(job_id, status=JOB_RUNNING, progress=5, message='正在查询题库')
+        quiz_json = lookup_bank_quiz(params, job['user_id'], job['user_type'])
+        from_bank = quiz_json is not None
+
+        if not from_bank:
+            # 提取文本（同一文档只解析一次）
+            _update_job(job_id, progress=10, message='正在提取文本')
+            doc_ids = params.get('doc_ids')
+            if not doc_ids:
+                raise ValueError("题库中符合条件的题目不足，请上传文件生成")
+            # 任务已在自己的线程池中排队，内存预算不足时一直等待，不因请求高峰失败
+            content = get_documents_text(doc_ids, params.get('selected_pages'), params.get('page_triage'),
+                                         timeout=math.inf)
+
+            # 生成测验题目
+            _update_job(job_id, progress=40, message='正在生成题目')
+            quiz_json = generate_quiz(content, question_count, difficulty,
+                                      params['include_multiple_choice'], params['include_fill_in_blank'],
+                                      params.get('notes'), use_cache=params.get('use_cache', True))
+
+        # 更新前端文件（保留原有功能）
+        _update_job(job_id, progress=80, message='正在保存测验')
+        update_survey_json(quiz_json)
+
+        title = f"{file_name} - {difficulty}难度 ({question_count}题)"
+        # 保存测验、布置到课程和标记任务完成在同一个事务中完成，重启后不会重复保存同一测验；
+        # 如果是教师且指定了课程，则直接布置测验到课程
+        chapter_id = None
+        with transaction():
+            quiz_id = save_quiz(title, file_name, quiz_json, question_count, difficulty, job['user_id'])
+            if job['user_type'] == 'teacher' and params.get('course_id'):
+                chapter_id = assign_quiz_to_chapter(quiz_id, params['course_id'], job['user_id'],
+                                                    params.get('chapter_name') or '默认章节')
+            message = '测验已成功创建并布置到课程' if chapter_id else '测验生成完成'
+            _update_job(job_id, status=JOB_SUCCEEDED, progress=100, message=message,
+                        quiz_id=quiz_id, chapter_id=chapter_id)
+        if not from_bank:
+            store_quiz_questions(quiz_json, params, chapter_id, quiz_id)
+        logger.info(f"测验生成任务完成: {job_id}，测验ID: {quiz_id}")
+    except Exception as e:
+        logger.error(f"测验生成任务失败: {job_id}，{str(e)}")
+        _update_job(job_id, status=JOB_FAILED, message='生成失败', error=str(e))
+
+def get_job(job_id):
+    """根据ID获取任务状态"""
+    job = execute_query("SELECT * FROM jobs WHERE id = ?", (job_id,), fetchall=False)
+    if not job:
+        return None
+
+    return {
+        'job_id': job['id'],
+        'status': job['status'],
+        'progress': job['progress'],
+        'message': job['message'],
+        'quiz_id': job['quiz_id'],
+        'chapter_id': job['chapter_id'],
+        'error': job['error'],
+        'user_id': job['user_id'],
+        'created_at': job['created_at'],
+        'updated_at': job['updated_at']
+    }
+
+def resume_pending_jobs():
+    """服务重启后重新提交未完成的任务"""
+    try:
+        jobs = execute_query(
+            "SELECT id, params_json, quiz_id FROM jobs WHERE status IN (?, ?) ORDER BY created_at",
+            (JOB_QUEUED, JOB_RUNNING)
+        )
+        for job in jobs:
+            if job['quiz_id']:
+                # 测验已经保存，只是状态没来得及更新，不再重新生成
+                _update_job(job['id'], status=JOB_SUCCEEDED, progress=100, message='测验生成完成')
+                continue
+            params = json.loads(job['params_json'] or '{}')
+            # 只从题库组卷的任务没有引用文档
+            available = all(get_document(doc_id) is not None for doc_id in params.get('doc_ids') or [])
+            if not available:
+                _update_job(job['id'], status=JOB_FAILED, message='生成失败', error='上传文件已丢失，请重新提交')
+                continue
+            _update_job(job['id'], status=JOB_QUEUED, progress=0, message='排队中')
+            get_executor().submit(_run_quiz_job, job['id'])
+        if jobs:
+            logger.info(f"已恢复{len(jobs)}个未完成的测验生成任务")
+    except Exception as e:
+        logger.error(f"恢复测验生成任务失败: {str(e)}")
@@ -0,0 +1,259 @@
+import time
+import random
+import logging
+import threading
+from collections import deque
+from config import get_model, get_int_env, get_float_env
+
+logger = logging.getLogger(__name__)
+
+class ModelUnavailableError(Exception):
+    """模型服务暂不可用（熔断、限流或并发等待超时），调用方应快速失败"""
+
+class TokenBucket:
+    """令牌桶限流器，rate 为每秒补充的令牌数，capacity 为桶容量（允许的突发量）"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def acquire(self, timeout):
+        """获取一个令牌，timeout 秒内获取不到返回 False"""
+        deadline = time.monotonic() + timeout
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                wait = (1 - self.tokens) / self.rate
+            if now + wait > deadline:
+                return False
+            time.sleep(wait)
+
+class CircuitBreaker:
+    """
+    基于滑动窗口错误率的熔断器
+
+    最近 window 次调用中失败比例超过 failure_ratio（且至少 min_calls 次）时打开，
+    cooldown 秒后进入半开状态放行一次试探调用，成功则关闭，失败则重新打开。
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, window, failure_ratio, min_calls, cooldown):
+        self.results = deque(maxlen=window)
+        self.failure_ratio = failure_ratio
+        self.min_calls = min_calls
+        self.cooldown = cooldown
+        self.state = self.CLOSED
+        self.opened_at = 0.0
+        self.trial_in_flight = False
+        self.lock = threading.Lock()
+
+    def allow(self):
+        """当前是否允许发起调用"""
+        with self.lock:
+            if self.state == self.OPEN:
+                if time.monotonic() - self.opened_at < self.cooldown:
+                    return False
+                self.state = self.HALF_OPEN
+                self.trial_in_flight = False
+            if self.state == self.HALF_OPEN:
+                if self.trial_in_flight:
+                    return False
+                self.trial_in_flight = True
+            return True
+
+    def record(self, success):
+        """记录一次调用结果"""
+        with self.lock:
+            if self.state == self.HALF_OPEN:
+                self.trial_in_flight = False
+                if success:
+                    self.state = self.CLOSED
+                    self.results.clear()
+                    logger.info("模型调用熔断器已关闭")
+                else:
+                    self._open()
+                return
+
+            self.results.append(success)
+            failures = self.results.count(False)
+            if (len(self.results) >= self.min_calls
+                    and failures / len(self.results) >= self.failure_ratio):
+                self._open()
+
+    def cancel(self):
+        """放弃本次调用（未真正请求上游），释放半开状态的试探名额"""
+        with self.lock:
+            if self.state == self.HALF_OPEN:
+                self.trial_in_flight = False
+
+    def _open(self):
+        self.state = self.OPEN
+        self.opened_at = time.monotonic()
+        self.results.clear()
+        logger.warning(f"模型调用错误率过高，熔断器打开{self.cooldown:.0f}秒")
+
+_lock = threading.Lock()
+_semaphore = None
+_bucket = None
+_breaker = None
+_in_flight = 0
+
+def _init():
+    """按环境变量创建并发信号量、令牌桶和熔断器"""
+    global _semaphore, _bucket, _breaker
+    with _lock:
+        if _semaphore is None:
+            _semaphore = threading.BoundedSemaphore(max(1, get_int_env('LLM_MAX_CONCURRENCY', 4)))
+            _bucket = TokenBucket(max(0.01, get_float_env('LLM_RATE_PER_MINUTE', 60) / 60),
+                                  max(1, get_int_env('LLM_RATE_BURST', 10)))
+            _breaker = CircuitBreaker(max(1, get_int_env('LLM_BREAKER_WINDOW', 20)),
+                                      get_float_env('LLM_BREAKER_FAILURE_RATIO', 0.5),
+                                      max(1, get_int_env('LLM_BREAKER_MIN_CALLS', 5)),
+                                      get_float_env('LLM_BREAKER_COOLDOWN', 30))
+
+def _is_retryable(error):
+    """判断错误是否值得重试（限流、服务端错误、网络错误）"""
+    status_code = getattr(error, 'status_code', None)
+    if status_code is not None:
+        return status_code == 429 or status_code >= 500
+    name = type(error).__name__
+    return any(keyword in name for keyword in ('Timeout', 'Connect', 'Network', 'Transport', 'Unavailable',
+                                               'ResourceExhausted', 'ServiceUnavailable', 'InternalServerError'))
+
+def _backoff(attempt):
+    """指数退避加完全抖动"""
+    base = get_float_env('LLM_BACKOFF_BASE', 0.5)
+    cap = get_float_env('LLM_BACKOFF_MAX', 8.0)
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+def _acquire(deadline):
+    """依次通过熔断器、令牌桶和并发信号量，失败时抛出 ModelUnavailableError"""
+    global _in_flight
+    _init()
+    if not _breaker.allow():
+        raise ModelUnavailableError("模型服务暂时不可用，请稍后重试")
+    remaining = deadline - time.monotonic()
+    if remaining <= 0 or not _bucket.acquire(remaining):
+        _breaker.cancel()
+        raise ModelUnavailableError("模型调用频率超出配额，请稍后重试")
+    remaining = deadline - time.monotonic()
+    if remaining <= 0 or not _semaphore.acquire(timeout=remaining):
+        _breaker.cancel()
+        raise ModelUnavailableError("模型调用并发已满，请稍后重试")
+    with _lock:
+        _in_flight += 1
+
+def _release():
+    global _in_flight
+    with _lock:
+        _in_flight -= 1
+    _semaphore.release()
+
+def _call_timeout(model, deadline):
+    """按剩余时间为单次调用设置超时，卡住的调用不会一直占用并发名额"""
+    from gemini_client import GeminiModel
+
+    timeout = max(1.0, deadline - time.monotonic())
+    if isinstance(model, GeminiModel):
+        return {'timeout': timeout}
+    # MODEL_TRANSPORT=sdk：google.generativeai 通过 request_options 设置超时
+    return {'request_options': {'timeout': timeout}}
+
+def call_model(prompt, deadline=None):
+    """
+    经网关调用模型生成内容
+
+    Args:
+        prompt: 提示词
+        deadline: 本次调用（含重试）的总时限（秒），默认 LLM_CALL_DEADLINE
+
+    Returns:
+        模型响应对象（带 text 属性）
+    """
+    deadline = time.monotonic() + (deadline or get_float_env('LLM_CALL_DEADLINE', 90))
+    max_retries = max(0, get_int_env('LLM_MAX_RETRIES', 2))
+    attempt = 0
+    while True:
+        _acquire(deadline)
+        try:
+            model = get_model()
+            response = model.generate_content(prompt, **_call_timeout(model, deadline))
+            _breaker.record(True)
+            return response
+        except Exception as e:
+            retryable = _is_retryable(e)
+            _breaker.record(not retryable)
+            if not retryable or attempt >= max_retries:
+                raise
+            sleep_time = _backoff(attempt)
+            if time.monotonic() + sleep_time >= deadline:
+                raise
+            attempt += 1
+            logger.warning(f"模型调用失败，{sleep_time:.2f}秒后第{attempt}次重试: {str(e)}")
+        finally:
+            _release()
+        time.sleep(sleep_time)
+
+def stream_model(prompt, deadline=None):
+    """
+    经网关流式调用模型，逐块产出响应
+
+    只在收到第一块之前重试；整个流式过程占用一个并发名额。
+    """
+    deadline = time.monotonic() + (deadline or get_float_env('LLM_CALL_DEADLINE', 90))
+    max_retries = max(0, get_int_env('LLM_MAX_RETRIES', 2))
+    attempt = 0
+    while True:
+        _acquire(deadline)
+        received = False
+        recorded = False
+        try:
+            model = get_model()
+            for chunk in model.generate_content(prompt, stream=True, **_call_timeout(model, deadline)):
+                received = True
+                yield chunk
+            _breaker.record(True)
+            recorded = True
+            return
+        except Exception as e:
+            retryable = _is_retryable(e)
+            _breaker.record(not retryable)
+            recorded = True
+            if received or not retryable or attempt >= max_retries:
+                raise
+            sleep_time = _backoff(attempt)
+            if time.monotonic() + sleep_time >= deadline:
+                raise
+            attempt += 1
+            logger.warning(f"模型流式调用失败，{sleep_time:.2f}秒后第{attempt}次重试: {str(e)}")
+        finally:
+            # 调用方提前关闭生成器时不计入成败
+            if not recorded:
+                _breaker.cancel()
+            _release()
+        time.sleep(sleep_time)
+
+def get_gateway_stats():
+    """获取网关状态"""
+    _init()
+    with _lock:
+        in_flight = _in_flight
+    return {
+        'in_flight': in_flight,
+        'breaker_state': _breaker.state,
+        'available_tokens': round(_bucket.tokens, 2)
+    }
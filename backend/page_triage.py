@@ -0,0 +1,107 @@
+import os
+import re
+import logging
+from collections import Counter
+from config import get_int_env
+
+logger = logging.getLogger(__name__)
+
+LABEL_CONTENT = 'content'
+LABEL_BLANK = 'blank'
+LABEL_BOILERPLATE = 'boilerplate'
+LABEL_TOC = 'toc'
+
+# 每页检查开头和结尾的几行是否为重复的页眉页脚
+EDGE_LINES = 3
+# 在至少这么大比例的页面上重复出现的行视为页眉页脚
+REPEAT_RATIO = 0.4
+REPEAT_MIN_PAGES = 3
+# 有效字符数达到该值的页面密度得分为满分
+FULL_PAGE_CHARS = 400
+# 目录或索引行占比超过该值的页面视为目录页
+TOC_LINE_RATIO = 0.5
+
+# 带点线或制表符的目录行："第一章 引言 ........ 3"
+_TOC_LEADER_LINE = re.compile(r'(\.{3,}|…+|·{3,}|\t)\s*\d{1,4}\s*$')
+# 编号开头、页码结尾的目录行："1.2 进程调度 15"。习题（"1. 计算 2 与 3 的和"）也是这种格式，
+# 只有页面上有"目录"标题时才计入
+_TOC_NUMBERED_LINE = re.compile(r'^(第.{1,4}[章节部篇]|\d+(\.\d+)*|chapter\s+\d+)\s*\S.*\s\d{1,4}\s*$',
+                                re.IGNORECASE)
+# 索引条目："进程, 12, 45"、"scheduler, 23–25"
+_INDEX_LINE = re.compile(r'^[^\d,，]{1,60}[,，]\s*\d{1,4}(\s*[-–,，]\s*\d{1,4})*\s*$')
+_TOC_TITLE = re.compile(r'^(目\s*录|索\s*引|contents|table of contents|index)$', re.IGNORECASE)
+
+def triage_enabled():
+    """是否启用页面筛选"""
+    return os.getenv('PAGE_TRIAGE_ENABLED', 'true').lower() in ('true', '1', 't')
+
+def _lines(text):
+    return [line.strip() for line in (text or '').splitlines() if line.strip()]
+
+def _normalize(line):
+    """页码等数字统一替换，使 "第 3 页" 和 "第 4 页" 视为同一行"""
+    return re.sub(r'\d+', '#', re.sub(r'\s+', ' ', line)).lower()
+
+def find_boilerplate(page_lines):
+    """找出在多数页面的开头或结尾重复出现的行（页眉、页脚、页码）"""
+    if len(page_lines) < REPEAT_MIN_PAGES:
+        return set()
+    counts = Counter()
+    for lines in page_lines:
+        counts.update({_normalize(line) for line in lines[:EDGE_LINES] + lines[-EDGE_LINES:]})
+    min_pages = max(REPEAT_MIN_PAGES, int(len(page_lines) * REPEAT_RATIO))
+    return {line for line, count in counts.items() if count >= min_pages}
+
+def score_pages(pages):
+    """
+    为每一页打分，判断其是否值得放入生成测验的上下文
+
+    综合有效字符密度（去掉页眉页脚后）、重复的页眉页脚行和目录/索引格式，
+    只做字符串统计，不调用模型。
+
+    Args:
+        pages: 每页文本的列表
+
+    Returns:
+        与 pages 等长的列表，每项包含 page、score（0~1）、label 和 chars
+    """
+    min_chars = get_int_env('PAGE_TRIAGE_MIN_CHARS', 50)
+    page_lines = [_lines(text) for text in pages]
+    boilerplate = find_boilerplate(page_lines)
+
+    scores = []
+    for page_no, lines in enumerate(page_lines):
+        content = [line for line in lines if _normalize(line) not in boilerplate]
+        chars = sum(len(re.sub(r'\s+', '', line)) for line in content)
+        has_title = any(_TOC_TITLE.match(line) for line in content[:EDGE_LINES])
+        toc_lines = sum(1 for line in content
+                        if _TOC_LEADER_LINE.search(line) or _INDEX_LINE.match(line)
+                        or (has_title and _TOC_NUMBERED_LINE.match(line)))
+        toc_ratio = toc_lines / len(content) if content else 0.0
+        if has_title:
+            # 有"目录"标题时放宽比例要求
+            toc_ratio = min(1.0, toc_ratio * 2)
+
+        if chars < min_chars:
+            label = LABEL_BOILERPLATE if len(content) < len(lines) else LABEL_BLANK
+        elif toc_ratio >= TOC_LINE_RATIO:
+            label = LABEL_TOC
+        else:
+            label = LABEL_CONTENT
+        score = min(1.0, chars / FULL_PAGE_CHARS) * (1 - toc_ratio)
+        scores.append({'page': page_no, 'score': round(score, 3), 'label': label, 'chars': chars})
+    return scores
+
+def filter_pages(selected_pages, scores):
+    """
+    从选定页面中去掉低价值页面
+
+    全部被判为低价值时（如整份扫描件）保留原选择，避免生成时没有任何内容。
+    """
+    labels = {item['page']: item['label'] for item in scores}
+    kept = [page for page in selected_pages if labels.get(page, LABEL_CONTENT) == LABEL_CONTENT]
+    if not kept:
+        return list(selected_pages)
+    if len(kept) < len(selected_pages):
+        logger.info(f"页面筛选跳过了{len(selected_pages) - len(kept)}个低价值页面，保留{len(kept)}页")
+    return kept
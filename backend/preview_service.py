@@ -0,0 +1,147 @@
+import os
+import logging
+import threading
+from config import get_int_env
+from file_service import encode_thumbnail
+from document_store import save_document, require_document, document_path, DocumentNotFoundError
+from admission_service import inspect_pdf, plan_page_render, reserve
+
+logger = logging.getLogger(__name__)
+
+PREVIEW_DIR = 'preview_cache'
+PAGES_DIR = os.path.join(PREVIEW_DIR, 'pages')
+
+MIN_DPI = 36
+MAX_DPI = 150
+
+# 同一页只渲染一次：按缓存文件路径加锁
+_render_locks = {}
+_render_locks_guard = threading.Lock()
+
+# 每渲染这么多页检查一次缓存大小，避免每次都扫描目录
+EVICT_CHECK_INTERVAL = 32
+_render_count = 0
+
+class PreviewNotFoundError(Exception):
+    """文档未注册或页码超出范围"""
+
+def register_document(pdf_file, user_id=None):
+    """
+    注册PDF文档用于按页预览（保存到文档存储，同一文件只保存一次）
+
+    Args:
+        pdf_file: 上传的PDF文件对象
+        user_id: 上传者（登录时记录其文件名，生成测验时按文档ID引用）
+
+    Returns:
+        (文档ID, 总页数)
+    """
+    document = save_document(pdf_file, user_id=user_id)
+    if document['kind'] != 'pdf':
+        raise ValueError("只支持PDF文件预览")
+    logger.info(f"已注册PDF预览文档: {document['doc_id'][:12]}，共{document['page_count']}页")
+    return document['doc_id'], document['page_count']
+
+def normalize_dpi(dpi):
+    """预览DPI，默认 PREVIEW_DPI，限制在合理范围内"""
+    if dpi is None:
+        dpi = get_int_env('PREVIEW_DPI', 72)
+    return max(MIN_DPI, min(MAX_DPI, int(dpi)))
+
+def page_etag(doc_id, page, dpi):
+    """文档按内容寻址，同一文档、页码和DPI的预览图内容不变"""
+    return f"{doc_id[:32]}-{page}-{dpi}"
+
+def _render_page(pdf_path, page, dpi):
+    """渲染单页预览图并编码为JPEG"""
+    from pdf2image import convert_from_path
+
+    images = convert_from_path(pdf_path, dpi=dpi, first_page=page + 1, last_page=page + 1)
+    if not images:
+        raise PreviewNotFoundError(f"页码超出范围: {page + 1}")
+    return encode_thumbnail(images[0])
+
+def get_page_preview(doc_id, page, dpi=None):
+    """
+    获取单页预览图，首次请求时渲染并缓存到磁盘
+
+    Args:
+        doc_id: register_document 返回的文档ID
+        page: 页码（从0开始）
+        dpi: 渲染DPI
+
+    Returns:
+        (预览图文件路径, ETag)
+    """
+    try:
+        document = require_document(doc_id)
+    except DocumentNotFoundError as e:
+        raise PreviewNotFoundError(str(e))
+    if document['kind'] != 'pdf' or not 0 <= page < document['page_count']:
+        raise PreviewNotFoundError(f"页码超出范围: {page + 1}")
+    pdf_path = document_path(doc_id)
+
+    # 超大页面自动降低DPI，渲染内存计入全局预算
+    dpi, memory = plan_page_render(inspect_pdf(pdf_path), normalize_dpi(dpi))
+    cache_path = os.path.abspath(os.path.join(PAGES_DIR, f"{doc_id}_{page}_{dpi}.jpg"))
+    etag = page_etag(doc_id, page, dpi)
+
+    with _render_locks_guard:
+        lock = _render_locks.setdefault(cache_path, threading.Lock())
+    try:
+        with lock:
+            if os.path.exists(cache_path):
+                # 更新修改时间，作为LRU淘汰依据
+                os.utime(cache_path)
+                return cache_path, etag
+
+            with reserve(memory, '渲染PDF预览'):
+                image_data = _render_page(pdf_path, page, dpi)
+            os.makedirs(PAGES_DIR, exist_ok=True)
+            tmp_path = f"{cache_path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(image_data)
+            os.replace(tmp_path, cache_path)
+    finally:
+        with _render_locks_guard:
+            if not lock.locked():
+                _render_locks.pop(cache_path, None)
+
+    global _render_count
+    with _render_locks_guard:
+        _render_count += 1
+        check = _render_count % EVICT_CHECK_INTERVAL == 0
+    if check:
+        _evict_lru(PAGES_DIR, get_int_env('PREVIEW_CACHE_MAX_MB', 200) * 1024 * 1024, keep=cache_path)
+    return cache_path, etag
+
+def _evict_lru(directory, max_bytes, keep=None):
+    """目录总大小超过上限时，按最近使用时间（mtime）删除最旧的文件"""
+    try:
+        entries = []
+        total = 0
+        with os.scandir(directory) as it:
+            for entry in it:
+                if not entry.is_file() or entry.name.endswith('.tmp'):
+                    continue
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+        if total <= max_bytes:
+            return
+
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+                total -= size
+                removed += 1
+            except FileNotFoundError:
+                pass
+        logger.info(f"预览缓存淘汰了{removed}个文件: {directory}")
+    except OSError as e:
+        logger.warning(f"预览缓存淘汰失败: {str(e)}")
@@ -0,0 +1,207 @@
+import os
+import re
+import json
+import time
+import zlib
+import random
+import logging
+from db_manager import execute_query, transaction
+from quiz_parser import CHOICE_TYPES
+
+logger = logging.getLogger(__name__)
+
+# MinHash 参数：64 个哈希函数分为 16 个 band，每个 band 4 行，
+# 相似度约 0.5 以上的题目才会落入同一个桶成为候选
+NUM_PERM = 64
+LSH_BANDS = 16
+LSH_ROWS = NUM_PERM // LSH_BANDS
+SHINGLE_SIZE = 3
+
+_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+# 固定种子，保证签名在进程重启后仍可比较
+_rng = random.Random(1009)
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+
+# 只从题库组卷、没有引用文档的测验使用的文件名
+BANK_FILE_NAME = '章节题库'
+
+def bank_enabled():
+    """是否启用题库"""
+    return os.getenv('QUESTION_BANK_ENABLED', 'true').lower() in ('true', '1', 't')
+
+def _dup_threshold():
+    try:
+        return float(os.getenv('QUESTION_BANK_DUP_THRESHOLD', 0.8))
+    except ValueError:
+        return 0.8
+
+def _shingles(question):
+    """题干规范化后按字符三元组切分；选项和答案也参与比较，避免题干相近的不同题目被误判重复"""
+    text = re.sub(r'[\W_]+', '', str(question.get('title') or '')).lower()
+    choices = question.get('choices') or []
+    text += '|' + '|'.join(sorted(re.sub(r'\s+', '', str(c)).lower() for c in choices))
+    text += '|' + re.sub(r'\s+', '', str(question.get('correctAnswer') or '')).lower()
+    if len(text) <= SHINGLE_SIZE:
+        return {text}
+    return {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+
+def minhash_signature(question):
+    """计算题目的 MinHash 签名"""
+    hashes = [zlib.crc32(shingle.encode('utf-8')) for shingle in _shingles(question)]
+    return [min((a * h + b) % _PRIME for h in hashes) & _MAX_HASH for a, b in _PERMUTATIONS]
+
+def estimate_similarity(sig_a, sig_b):
+    """由签名估计两道题的 Jaccard 相似度"""
+    return sum(1 for a, b in zip(sig_a, sig_b) if a == b) / NUM_PERM
+
+def lsh_band_keys(signature):
+    """签名按 band 分段后的桶键"""
+    keys = []
+    for band in range(LSH_BANDS):
+        rows = signature[band * LSH_ROWS:(band + 1) * LSH_ROWS]
+        keys.append((band << 32) | zlib.crc32(','.join(map(str, rows)).encode()))
+    return keys
+
+def _question_type(question):
+    return 'choice' if question.get('type') in CHOICE_TYPES else question.get('type')
+
+def _find_duplicate(course_id, chapter_id, signature, band_keys):
+    """在同一章节的题库中查找近似重复的题目，返回其ID"""
+    placeholders = ', '.join('?' * len(band_keys))
+    candidates = execute_query(
+        f"""
+        SELECT DISTINCT q.id, q.signature
+        FROM question_bank_lsh b JOIN question_bank q ON q.id = b.question_id
+        WHERE b.band_key IN ({placeholders}) AND q.cno = ? AND q.chapter_id = ?
+        """,
+        tuple(band_keys) + (course_id, chapter_id)
+    )
+    threshold = _dup_threshold()
+    for candidate in candidates:
+        if estimate_similarity(signature, json.loads(candidate['signature'])) >= threshold:
+            return candidate['id']
+    return None
+
+def add_questions(quiz_json, course_id, chapter_id, difficulty, quiz_id=None):
+    """
+    将测验中的题目存入题库，近似重复的题目只累加重复次数
+
+    Returns:
+        新增的题目数量
+    """
+    added = 0
+    # 题目和它的LSH分桶在同一个事务中写入
+    with transaction():
+        for page in quiz_json.get('pages', []):
+            for question in page.get('elements', []):
+                signature = minhash_signature(question)
+                band_keys = lsh_band_keys(signature)
+                duplicate_id = _find_duplicate(course_id, chapter_id, signature, band_keys)
+                if duplicate_id:
+                    execute_query("UPDATE question_bank SET dup_count = dup_count + 1 WHERE id = ?", (duplicate_id,))
+                    continue
+
+                question_id = execute_query(
+                    """
+                    INSERT INTO question_bank (cno, chapter_id, difficulty, qtype, title, question_json,
+                                               signature, source_quiz_id, created_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    """,
+                    (course_id, chapter_id, difficulty, _question_type(question), question.get('title'),
+                     json.dumps(question, ensure_ascii=False), json.dumps(signature), quiz_id, time.time())
+                )
+                for band_key in band_keys:
+                    execute_query("INSERT OR IGNORE INTO question_bank_lsh (band_key, question_id) VALUES (?, ?)",
+                                  (band_key, question_id))
+                added += 1
+    logger.info(f"题库新增{added}道题目，课程: {course_id}，章节: {chapter_id}")
+    return added
+
+def find_chapter_id(course_id, chapter_name):
+    """查找课程下已有章节的ID，不存在时返回None"""
+    chapter = execute_query("SELECT qid FROM question WHERE cno = ? AND qname = ?",
+                            (course_id, chapter_name or '默认章节'), fetchall=False)
+    return chapter['qid'] if chapter else None
+
+def has_course_access(course_id, user_id, user_type):
+    """教师只能使用自己课程的题库，学生只能使用已选课程的题库"""
+    if user_type == 'teacher':
+        query = "SELECT 1 FROM course WHERE cno = ? AND tno = ?"
+    else:
+        query = "SELECT 1 FROM student_course WHERE cno = ? AND sno = ?"
+    return execute_query(query, (course_id, user_id), fetchall=False) is not None
+
+def assemble_from_bank(course_id, chapter_id, question_count, difficulty,
+                       include_multiple_choice=True, include_fill_in_blank=False):
+    """
+    从题库组卷（不调用模型）
+
+    优先选择使用次数少的题目；符合条件的题目不足 question_count 道时返回None。
+    """
+    from quiz_service import assemble_quiz
+
+    qtypes = []
+    if include_multiple_choice:
+        qtypes.append('choice')
+    if include_fill_in_blank:
+        qtypes.append('text')
+    placeholders = ', '.join('?' * len(qtypes))
+    rows = execute_query(
+        f"""
+        SELECT id, question_json FROM question_bank
+        WHERE cno = ? AND chapter_id = ? AND difficulty = ? AND qtype IN ({placeholders})
+        ORDER BY use_count, RANDOM()
+        LIMIT ?
+        """,
+        (course_id, chapter_id, difficulty, *qtypes, question_count)
+    )
+    if len(rows) < question_count:
+        return None
+
+    ids = [row['id'] for row in rows]
+    execute_query(f"UPDATE question_bank SET use_count = use_count + 1 WHERE id IN ({', '.join('?' * len(ids))})",
+                  tuple(ids))
+
+    questions = []
+    for i, row in enumerate(rows, 1):
+        question = json.loads(row['question_json'])
+        question['name'] = f"question{i}"
+        questions.append(question)
+    logger.info(f"从题库组卷成功，课程: {course_id}，章节: {chapter_id}，题目数: {len(questions)}")
+    return assemble_quiz(json.loads(os.getenv('EXAMPLE_JSON')), questions)
+
+def lookup_bank_quiz(params, user_id, user_type):
+    """
+    根据生成参数尝试从题库组卷，未启用、无权限或题目不足时返回None
+
+    题库只按课程章节组卷，不读取材料内容，因此需要请求显式传 useBank=true；
+    指定了文档、备注、页面或文档章节时按这些内容生成，不使用题库。
+    """
+    course_id = params.get('course_id')
+    if not course_id or not params.get('use_bank', False) or not bank_enabled():
+        return None
+    if (params.get('doc_ids') or params.get('notes')
+            or params.get('selected_pages') or params.get('chapter_no') is not None):
+        return None
+    try:
+        if not has_course_access(course_id, user_id, user_type):
+            return None
+        chapter_id = find_chapter_id(course_id, params.get('chapter_name'))
+        if chapter_id is None:
+            return None
+        return assemble_from_bank(course_id, chapter_id, params['question_count'], params['difficulty'],
+                                  params['include_multiple_choice'], params['include_fill_in_blank'])
+    except Exception as e:
+        # 题库只是加速手段，出错时回退到模型生成
+        logger.error(f"从题库组卷失败: {str(e)}")
+        return None
+
+def store_quiz_questions(quiz_json, params, chapter_id, quiz_id):
+    """将新生成的测验题目存入题库（只在测验已布置到章节时调用）"""
+    if not chapter_id or not bank_enabled():
+        return
+    try:
+        add_questions(quiz_json, params['course_id'], chapter_id, params['difficulty'], quiz_id)
+    except Exception as e:
+        logger.error(f"保存题目到题库失败: {str(e)}")
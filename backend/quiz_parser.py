@@ -0,0 +1,268 @@
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+class QuestionStreamParser:
+    """
+    增量解析模型流式输出中的 SurveyJS 题目
+
+    每次 feed 一段文本，返回其中新完成的 elements 数组成员（题目对象）。
+    只做括号和字符串状态跟踪，不要求整段文本是合法JSON。
+    panel 等容器内部嵌套的 elements 不单独返回，容器闭合后作为一个整体返回。
+    """
+
+    def __init__(self, array_key='elements'):
+        self.array_key = array_key
+        self.buffer = ''
+        self._pos = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = None
+        self._last_string = None
+        self._pending_key = None
+        # 容器栈，元素为 (类型, 该容器对应的键名, 起始位置)
+        self._stack = []
+
+    def feed(self, text):
+        """追加文本并返回新解析出的题目列表"""
+        self.buffer += text
+        questions = []
+        buf = self.buffer
+        i = self._pos
+        while i < len(buf):
+            ch = buf[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    self._last_string = buf[self._string_start + 1:i]
+            elif ch == '"':
+                self._in_string = True
+                self._string_start = i
+            elif ch == ':':
+                self._pending_key = self._last_string
+            elif ch in '{[':
+                key = self._pending_key if self._stack and self._stack[-1][0] == '{' else None
+                self._stack.append((ch, key, i))
+                self._pending_key = None
+            elif ch in '}]':
+                if self._stack:
+                    kind, _, start = self._stack.pop()
+                    if kind == '{' and self._is_top_level_array():
+                        question = self._load(buf[start:i + 1])
+                        if question is not None:
+                            questions.append(question)
+                self._pending_key = None
+            elif ch == ',':
+                self._pending_key = None
+            i += 1
+        self._pos = i
+        return questions
+
+    def _is_top_level_array(self):
+        """栈顶是否为最外层的 elements 数组（不在其他 elements 成员内部）"""
+        arrays = [key for kind, key, _ in self._stack if kind == '[' and key == self.array_key]
+        return bool(self._stack) and self._stack[-1][:2] == ('[', self.array_key) and len(arrays) == 1
+
+    def _load(self, text):
+        """解析单个题目对象，失败时记录日志并跳过"""
+        try:
+            question = json.loads(text)
+        except json.JSONDecodeError as e:
+            logger.warning(f"流式题目解析失败: {str(e)}")
+            return None
+        return question if isinstance(question, dict) else None
+
+# 需要选项的题型
+CHOICE_TYPES = ('radiogroup', 'checkbox', 'dropdown')
+QUESTION_TYPES = CHOICE_TYPES + ('text',)
+
+_CLOSERS = {'{': '}', '[': ']'}
+_VALID_ESCAPES = '"\\/bfnrtu'
+
+def _drop_trailing_comma(out):
+    """去掉已输出内容末尾的空白和多余逗号"""
+    while out and out[-1] in ' \t\r\n':
+        out.pop()
+    if out and out[-1] == ',':
+        out.pop()
+
+def extract_json(text):
+    """
+    从模型输出中提取并修复JSON对象
+
+    跳过第一个 { 之前的说明文字和代码块标记，根对象闭合后的内容忽略；
+    修复字符串中的裸换行/控制字符、非法转义和多余逗号。输出被截断时
+    回退到最后一个完整的数组或对象成员，再补齐括号。
+    """
+    start = text.find('{')
+    if start < 0:
+        raise ValueError("响应中未找到有效的JSON格式内容")
+
+    # 多数响应本身就是合法JSON，先走快速路径
+    end = text.rfind('}') + 1
+    try:
+        return json.loads(text[start:end])
+    except json.JSONDecodeError:
+        pass
+
+    out = []
+    stack = []
+    in_string = False
+    escape = False
+    # 最后一个完整成员结束时的 (输出长度, 容器栈)，用于截断恢复
+    safe = None
+    for ch in text[start:]:
+        if in_string:
+            if escape:
+                escape = False
+                if ch not in _VALID_ESCAPES:
+                    out.append('\\')
+                out.append(ch)
+            elif ch == '\\':
+                escape = True
+                out.append(ch)
+            elif ch == '"':
+                in_string = False
+                out.append(ch)
+            elif ch == '\n':
+                out.append('\\n')
+            elif ch < ' ':
+                out.append(f'\\u{ord(ch):04x}')
+            else:
+                out.append(ch)
+        elif ch == '"':
+            in_string = True
+            out.append(ch)
+        elif ch in '{[':
+            stack.append(ch)
+            out.append(ch)
+        elif ch in '}]':
+            _drop_trailing_comma(out)
+            out.append(_CLOSERS[stack.pop()])
+            if not stack:
+                break
+            safe = (len(out), list(stack))
+        else:
+            out.append(ch)
+
+    if stack:
+        if safe is None:
+            raise ValueError("生成的内容被截断，未包含完整的题目")
+        length, stack = safe
+        del out[length:]
+        _drop_trailing_comma(out)
+        out.extend(_CLOSERS[opener] for opener in reversed(stack))
+        logger.warning("模型输出被截断，已丢弃不完整的部分")
+
+    repaired = ''.join(out)
+    try:
+        return json.loads(repaired)
+    except json.JSONDecodeError as e:
+        logger.error(f"JSON修复后仍无法解析: {str(e)}")
+        raise ValueError(f"生成的内容不是有效的JSON格式: {str(e)}")
+
+def _choice_value(choice):
+    """选项可以是字符串，也可以是 {value, text} 对象"""
+    if isinstance(choice, dict):
+        return choice.get('value', choice.get('text'))
+    return choice
+
+def _match_answer(answer, values):
+    """将正确答案对齐到选项：去空白、忽略大小写，或按 A/B/C/D 序号匹配"""
+    if answer in values:
+        return answer
+    text = str(answer).strip()
+    for value in values:
+        if str(value).strip().lower() == text.lower():
+            return value
+    letter = text.rstrip('.、．) ').upper()
+    if len(letter) == 1 and 'A' <= letter < chr(ord('A') + len(values)):
+        return values[ord(letter) - ord('A')]
+    return answer
+
+def repair_question(question):
+    """对单个题目做本地可完成的修复，返回修复后的副本"""
+    question = dict(question)
+    if isinstance(question.get('title'), str):
+        question['title'] = question['title'].strip()
+    if question.get('type') in CHOICE_TYPES and isinstance(question.get('choices'), list):
+        if all(isinstance(c, str) for c in question['choices']):
+            question['choices'] = [c.strip() for c in question['choices']]
+        values = [_choice_value(c) for c in question['choices']]
+        answer = question.get('correctAnswer')
+        if isinstance(answer, list):
+            question['correctAnswer'] = [_match_answer(a, values) for a in answer]
+        elif answer is not None:
+            question['correctAnswer'] = _match_answer(answer, values)
+    return question
+
+def validate_question(question, choice_count=4):
+    """
+    按应用使用的 SurveyJS 题目结构校验单个题目
+
+    Returns:
+        问题描述列表，为空表示合法
+    """
+    if not isinstance(question, dict):
+        return ["题目不是对象"]
+    problems = []
+    qtype = question.get('type')
+    if qtype not in QUESTION_TYPES:
+        problems.append(f"不支持的题型: {qtype}")
+    if not isinstance(question.get('title'), str) or not question['title'].strip():
+        problems.append("缺少题干")
+    answer = question.get('correctAnswer')
+
+    if qtype == 'text':
+        if not isinstance(answer, str) or not answer.strip():
+            problems.append("缺少正确答案")
+    elif qtype in CHOICE_TYPES:
+        choices = question.get('choices')
+        if not isinstance(choices, list) or len(choices) < 2:
+            problems.append("选项不足")
+            return problems
+        if choice_count and len(choices) != choice_count:
+            problems.append(f"选项数量应为{choice_count}个，实际{len(choices)}个")
+        values = [_choice_value(c) for c in choices]
+        if len(set(map(str, values))) != len(values):
+            problems.append("选项重复")
+        answers = answer if isinstance(answer, list) else [answer]
+        if answer is None or answer == [] or any(a not in values for a in answers):
+            problems.append("正确答案不在选项中")
+    return problems
+
+def validate_questions(questions, choice_count=4):
+    """
+    校验并修复一组题目，保证 name 唯一
+
+    Returns:
+        (合法题目列表, [(不合法题目, 问题描述列表), ...])
+    """
+    valid = []
+    broken = []
+    names = set()
+    for question in questions:
+        if isinstance(question, dict):
+            question = repair_question(question)
+        problems = validate_question(question, choice_count)
+        if problems:
+            broken.append((question, problems))
+            continue
+        # 重名题目重新编号
+        name = question.get('name')
+        if not name or name in names:
+            number = len(valid) + 1
+            while f"question{number}" in names:
+                number += 1
+            name = f"question{number}"
+            question['name'] = name
+        names.add(name)
+        valid.append(question)
+    if broken:
+        logger.warning(f"{len(broken)}道题目未通过校验: {'; '.join(', '.join(p) for _, p in broken)}")
+    return valid, broken
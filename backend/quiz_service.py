@@ -1,13 +1,19 @@
 import os
+import re
 import json
+import math
 import logging
-from config import get_model
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from config import get_int_env
+from llm_gateway import call_model, stream_model, ModelUnavailableError
+from cache_service import make_cache_key, get_cached_quiz, save_cached_quiz
+from quiz_parser import QuestionStreamParser, extract_json, validate_question, validate_questions, repair_question
+from context_service import select_context
 
 logger = logging.getLogger(__name__)
 
-def generate_quiz(content, question_count, difficulty, include_multiple_choice=True, include_fill_in_blank=False, notes=None):
-    """生成测验题目"""
-    model = get_model()
+def build_quiz_prompt(content, question_count, difficulty, include_multiple_choice=True, include_fill_in_blank=False, notes=None):
+    """构建测验生成提示词"""
     example_json = json.loads(os.getenv('EXAMPLE_JSON'))
     
     # 构建题型要求
@@ -46,47 +52,417 @@ def generate_quiz(content, question_count, difficulty, include_multiple_choice=T
     """
     
     # 完成提示
-    prompt = prompt_base + f"""
+    return prompt_base + f"""
     参考内容:
-    {content[:3000]}
+    {content}
     
     请严格按照以下JSON格式生成（不要添加任何其他文本）:
     {json.dumps(example_json, indent=2, ensure_ascii=False)}
     """
 
+def parse_quiz_response(response_text):
+    """从模型响应文本中解析测验JSON（容忍代码块标记、多余逗号和截断）"""
+    return extract_json(response_text.strip())
+
+def _questions_of(quiz_json):
+    """取出测验JSON中的全部题目"""
+    return [q for page in quiz_json.get('pages', []) for q in page.get('elements', [])]
+
+def _choice_count():
+    return max(0, get_int_env('QUIZ_CHOICE_COUNT', 4))
+
+def _regenerate_questions(content, count, difficulty, include_multiple_choice, include_fill_in_blank, notes, existing, broken):
+    """只为缺失或未通过校验的题目重新请求模型，返回通过校验的新题目"""
+    prompt = build_quiz_prompt(content, count, difficulty,
+                               include_multiple_choice, include_fill_in_blank, notes)
+    prompt += f"""
+    以下题目已经生成，新题目不要与它们重复:
+    {chr(10).join(f"- {q.get('title')}" for q in existing)}
+    """
+    if broken:
+        prompt += f"""
+    以下题目格式有误，请勿再出现同样的问题:
+    {chr(10).join(f"- {q.get('title') if isinstance(q, dict) else q}: {', '.join(p)}" for q, p in broken)}
+    """
+    response = call_model(prompt)
+    seen = {_normalize_title(q.get('title')) for q in existing}
+    valid, _ = validate_questions(_questions_of(parse_quiz_response(response.text)), _choice_count())
+    return [q for q in valid if _normalize_title(q.get('title')) not in seen][:count]
+
+def _complete_questions(questions, broken, question_count, content, difficulty, include_multiple_choice, include_fill_in_blank, notes):
+    """
+    题目不足时（校验失败或输出截断）补充生成差额，而不是重新生成整份测验
+
+    Returns:
+        新补充的题目列表（name 已与已有题目区分）
+    """
+    added = []
+    for _ in range(max(0, get_int_env('QUIZ_REPAIR_ATTEMPTS', 1))):
+        missing = question_count - len(questions) - len(added)
+        if missing <= 0:
+            break
+        logger.info(f"题目不足，补充生成{missing}道（未通过校验{len(broken)}道）")
+        try:
+            new = _regenerate_questions(content, missing, difficulty, include_multiple_choice,
+                                        include_fill_in_blank, notes, questions + added, broken)
+        except ModelUnavailableError:
+            raise
+        except Exception as e:
+            logger.error(f"补充生成题目失败: {str(e)}")
+            break
+        names = {q.get('name') for q in questions + added}
+        for question in new:
+            number = len(questions) + len(added) + 1
+            while question.get('name') in names:
+                question['name'] = f"question{number}"
+                number += 1
+            names.add(question['name'])
+            added.append(question)
+        broken = []
+    return added
+
+def split_into_chunks(content, chunk_size):
+    """按段落将文本切分为不超过 chunk_size 个字符的片段"""
+    chunks = []
+    current = []
+    current_len = 0
+    for paragraph in re.split(r'\n\s*\n', content):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        # 超长段落直接按长度切开
+        pieces = [paragraph[i:i + chunk_size] for i in range(0, len(paragraph), chunk_size)]
+        for piece in pieces:
+            if current and current_len + len(piece) > chunk_size:
+                chunks.append('\n\n'.join(current))
+                current, current_len = [], 0
+            current.append(piece)
+            current_len += len(piece) + 2
+    if current:
+        chunks.append('\n\n'.join(current))
+    return chunks
+
+def build_sections(content, question_count, query=None):
+    """
+    将全文划分为若干连续章节段，每段对应一次模型调用
+
+    段数不超过 QUIZ_MAP_MAX_SECTIONS 和题目数量，因此调用次数与文档长度无关；
+    每段文本超过 QUIZ_SECTION_MAX_CHARS 时在段内均匀抽取片段。
+    有查询（备注）时改为在段内按相关性挑选段落，CONTEXT_TOKEN_BUDGET 按段计算，
+    整份文档的每个部分仍然都会参与生成。
+    """
+    chunk_size = max(500, get_int_env('QUIZ_CHUNK_CHARS', 3000))
+    section_max_chars = max(chunk_size, get_int_env('QUIZ_SECTION_MAX_CHARS', 8000))
+    chunks = split_into_chunks(content, chunk_size)
+    if len(chunks) <= 1:
+        return chunks
+
+    section_count = min(len(chunks), max(1, get_int_env('QUIZ_MAP_MAX_SECTIONS', 8)), max(1, question_count))
+    sections = []
+    for i in range(section_count):
+        group = chunks[i * len(chunks) // section_count:(i + 1) * len(chunks) // section_count]
+        if query:
+            text = '\n\n'.join(group)
+            selected = select_context(text, query)
+            if selected != text:
+                sections.append(selected)
+                continue
+        keep = max(1, section_max_chars // chunk_size)
+        if len(group) > keep:
+            step = len(group) / keep
+            group = [group[int(j * step)] for j in range(keep)]
+        sections.append('\n\n'.join(group))
+    return sections
+
+def _normalize_title(title):
+    """题干规范化，用于去重"""
+    return re.sub(r'[\W_]+', '', str(title or '')).lower()
+
+class QuestionMerger:
+    """
+    合并各段生成的候选题目：按题干去重，并按各段配额抽样到目标数量
+
+    add_section 返回该段被直接采用的题目，finalize 用剩余候选补足数量。
+    题目按采用顺序重新编号为 question1..N。
+    """
+
+    def __init__(self, quotas):
+        self.quotas = quotas
+        self.target = sum(quotas)
+        self.selected = []
+        self._seen = set()
+        self._leftovers = []
+
+    def _accept(self, question):
+        question = dict(question)
+        question['name'] = f"question{len(self.selected) + 1}"
+        self.selected.append(question)
+        return question
+
+    def add_section(self, index, questions):
+        accepted = []
+        for question in questions:
+            key = _normalize_title(question.get('title'))
+            if not key or key in self._seen:
+                continue
+            self._seen.add(key)
+            if len(accepted) < self.quotas[index] and len(self.selected) < self.target:
+                accepted.append(self._accept(question))
+            else:
+                self._leftovers.append(question)
+        return accepted
+
+    def finalize(self):
+        extra = []
+        for question in self._leftovers:
+            if len(self.selected) >= self.target:
+                break
+            extra.append(self._accept(question))
+        return extra
+
+    def add_extra(self, questions):
+        """追加补充生成的题目，同样按题干去重且不超过目标数量"""
+        extra = []
+        for question in questions:
+            key = _normalize_title(question.get('title'))
+            if len(self.selected) >= self.target or not key or key in self._seen:
+                continue
+            self._seen.add(key)
+            extra.append(self._accept(question))
+        return extra
+
+def _allocate_questions(sections, question_count):
+    """按各段文本长度分配题目数量，每段至少一题"""
+    total = sum(len(section) for section in sections) or 1
+    quotas = [max(1, round(question_count * len(section) / total)) for section in sections]
+    # 修正四舍五入误差
+    while sum(quotas) > question_count:
+        quotas[quotas.index(max(quotas))] -= 1
+    while sum(quotas) < question_count:
+        quotas[quotas.index(min(quotas))] += 1
+    return quotas
+
+def _generate_section(section, quota, difficulty, include_multiple_choice, include_fill_in_blank, notes):
+    """为单个段落生成候选题目（多生成一些以便去重后仍能满足配额）"""
+    candidate_count = max(quota + 1, math.ceil(quota * 1.5))
+    prompt = build_quiz_prompt(section, candidate_count, difficulty,
+                               include_multiple_choice, include_fill_in_blank, notes)
+    response = call_model(prompt)
+    quiz_json = parse_quiz_response(response.text)
+    # 不合格的题目直接丢弃，由其他候选题目补足
+    questions, _ = validate_questions(_questions_of(quiz_json), _choice_count())
+    return quiz_json, questions
+
+def _map_sections(sections, quotas, difficulty, include_multiple_choice, include_fill_in_blank, notes):
+    """
+    并发为每个段落生成候选题目
+
+    Yields:
+        (段序号, 段测验JSON, 题目列表)，按完成顺序产出；单段失败只记录日志，模型不可用时直接抛出
+    """
+    max_workers = max(1, get_int_env('QUIZ_MAP_CONCURRENCY', 4))
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='quiz-map') as executor:
+        futures = {
+            executor.submit(_generate_section, section, quotas[i], difficulty,
+                            include_multiple_choice, include_fill_in_blank, notes): i
+            for i, section in enumerate(sections)
+        }
+        for future in as_completed(futures):
+            index = futures[future]
+            try:
+                quiz_json, questions = future.result()
+            except ModelUnavailableError:
+                # 熔断或限流时其余段落同样会失败，取消未开始的段落，交给调用方返回503
+                executor.shutdown(wait=False, cancel_futures=True)
+                raise
+            except Exception as e:
+                logger.error(f"第{index + 1}段生成失败: {str(e)}")
+                continue
+            yield index, quiz_json, questions
+
+def assemble_quiz(template, questions):
+    """以某段的测验JSON为模板，组装合并后的完整测验"""
+    quiz_json = dict(template)
+    pages = template.get('pages') or [{}]
+    quiz_json['pages'] = [dict(pages[0], elements=questions)]
+    return quiz_json
+
+def _generate_chunked_quiz(sections, question_count, difficulty, include_multiple_choice, include_fill_in_blank, notes):
+    """
+    分段生成测验（map-reduce）
+
+    Yields:
+        与 generate_quiz_stream 相同的事件字典
+    """
+    quotas = _allocate_questions(sections, question_count)
+    merger = QuestionMerger(quotas)
+    template = None
+    done = set()
+    for index, quiz_json, questions in _map_sections(sections, quotas, difficulty,
+                                                     include_multiple_choice, include_fill_in_blank, notes):
+        template = template or quiz_json
+        done.add(index)
+        for question in merger.add_section(index, questions):
+            yield {'type': 'question', 'question': question}
+    if template is None:
+        raise ValueError("所有段落均生成失败")
+    for question in merger.finalize():
+        yield {'type': 'question', 'question': question}
+
+    # 仍然不足时只补充差额，优先使用生成失败的段落
+    if len(merger.selected) < question_count:
+        failed = [i for i in range(len(sections)) if i not in done]
+        section = sections[failed[0]] if failed else max(sections, key=len)
+        added = _complete_questions(merger.selected, [], question_count, section, difficulty,
+                                    include_multiple_choice, include_fill_in_blank, notes)
+        for question in merger.add_extra(added):
+            yield {'type': 'question', 'question': question}
+    logger.info(f"分段生成完成，共{len(sections)}段，合并得到{len(merger.selected)}道题目")
+    yield {'type': 'quiz', 'quiz': assemble_quiz(template, merger.selected)}
+
+def generate_quiz(content, question_count, difficulty, include_multiple_choice=True, include_fill_in_blank=False, notes=None, use_cache=True):
+    """
+    生成测验题目，相同输入优先返回缓存结果
+
+    填写了备注时，备注用于在各段内筛选相关内容。
+    """
+    cache_key = make_cache_key(content, question_count, difficulty,
+                               include_multiple_choice, include_fill_in_blank, notes)
+    if use_cache:
+        cached_quiz = get_cached_quiz(cache_key)
+        if cached_quiz is not None:
+            return cached_quiz
+
+    # 先对整份文档分段，再按备注在每段内筛选相关段落，控制每次调用的提示词长度
+    sections = build_sections(content, question_count, notes)
+    content = sections[0] if len(sections) == 1 else content
+    if len(sections) > 1:
+        try:
+            for event in _generate_chunked_quiz(sections, question_count, difficulty,
+                                                include_multiple_choice, include_fill_in_blank, notes):
+                if event['type'] == 'quiz':
+                    quiz_json = event['quiz']
+            save_cached_quiz(cache_key, quiz_json)
+            return quiz_json
+        except ModelUnavailableError:
+            raise
+        except Exception as e:
+            logger.error(f"生成测验失败: {str(e)}")
+            raise ValueError(f"生成测验失败: {str(e)}")
+
+    prompt = build_quiz_prompt(content, question_count, difficulty,
+                               include_multiple_choice, include_fill_in_blank, notes)
+
     try:
-        response = model.generate_content(prompt)
+        response = call_model(prompt)
         logger.info("测验内容生成成功")
         response_text = response.text.strip()
-        
-        # 尝试清理响应文本以获取有效的JSON
-        # 找到第一个 { 和最后一个 }
-        start_idx = response_text.find('{')
-        end_idx = response_text.rfind('}') + 1
-        
-        if start_idx >= 0 and end_idx > start_idx:
-            json_str = response_text[start_idx:end_idx]
-            
-            # 额外的清理步骤
-            json_str = json_str.replace('\n', ' ')  # 移除换行符
-            json_str = ' '.join(json_str.split())   # 规范化空白字符
-            
-            # 尝试解析JSON
-            try:
-                quiz_json = json.loads(json_str)
-                return quiz_json
-            except json.JSONDecodeError as je:
-                logger.error(f"JSON parsing error: {str(je)}")
-                logger.error(f"Attempted to parse: {json_str}")
-                raise ValueError(f"生成的内容不是有效的JSON格式: {str(je)}")
-        else:
-            raise ValueError("响应中未找到有效的JSON格式内容")
-            
+        quiz_json = parse_quiz_response(response_text)
+        questions, broken = validate_questions(_questions_of(quiz_json), _choice_count())
+        questions += _complete_questions(questions, broken, question_count, content, difficulty,
+                                         include_multiple_choice, include_fill_in_blank, notes)
+        if not questions:
+            raise ValueError("未生成有效的题目")
+        quiz_json = assemble_quiz(quiz_json, questions)
+        save_cached_quiz(cache_key, quiz_json)
+        return quiz_json
+    except ModelUnavailableError:
+        raise
     except Exception as e:
         logger.error(f"生成测验失败: {str(e)}")
         logger.error(f"原始响应: {response_text if 'response_text' in locals() else '未获取到响应'}")
         raise ValueError(f"生成测验失败: {str(e)}")
 
+def generate_quiz_stream(content, question_count, difficulty, include_multiple_choice=True, include_fill_in_blank=False, notes=None, use_cache=True):
+    """
+    流式生成测验题目，参数同 generate_quiz
+
+    Yields:
+        {'type': 'question', 'question': 题目对象}：每道题生成完成时产出
+        {'type': 'quiz', 'quiz': 完整测验JSON}：全部生成结束后产出一次
+    """
+    cache_key = make_cache_key(content, question_count, difficulty,
+                               include_multiple_choice, include_fill_in_blank, notes)
+    if use_cache:
+        cached_quiz = get_cached_quiz(cache_key)
+        if cached_quiz is not None:
+            for page in cached_quiz.get('pages', []):
+                for question in page.get('elements', []):
+                    yield {'type': 'question', 'question': question}
+            yield {'type': 'quiz', 'quiz': cached_quiz}
+            return
+
+    # 先对整份文档分段，再按备注在每段内筛选相关段落，控制每次调用的提示词长度
+    sections = build_sections(content, question_count, notes)
+    content = sections[0] if len(sections) == 1 else content
+    if len(sections) > 1:
+        try:
+            for event in _generate_chunked_quiz(sections, question_count, difficulty,
+                                                include_multiple_choice, include_fill_in_blank, notes):
+                if event['type'] == 'quiz':
+                    save_cached_quiz(cache_key, event['quiz'])
+                yield event
+            return
+        except ModelUnavailableError:
+            raise
+        except Exception as e:
+            logger.error(f"流式生成测验失败: {str(e)}")
+            raise ValueError(f"生成测验失败: {str(e)}")
+
+    prompt = build_quiz_prompt(content, question_count, difficulty,
+                               include_multiple_choice, include_fill_in_blank, notes)
+    parser = QuestionStreamParser()
+
+    questions = []
+    broken = []
+    names = set()
+
+    def accept(question):
+        """校验单个流式题目，合格则返回（必要时重新编号），否则记入 broken"""
+        question = repair_question(question)
+        problems = validate_question(question, _choice_count())
+        if problems:
+            logger.warning(f"题目未通过校验: {', '.join(problems)}")
+            broken.append((question, problems))
+            return None
+        number = len(questions) + 1
+        while not question.get('name') or question['name'] in names:
+            question['name'] = f"question{number}"
+            number += 1
+        names.add(question['name'])
+        questions.append(question)
+        return question
+
+    try:
+        for chunk in stream_model(prompt):
+            for question in parser.feed(chunk.text):
+                question = accept(question)
+                if question:
+                    yield {'type': 'question', 'question': question}
+        logger.info("测验内容流式生成成功")
+        quiz_json = parse_quiz_response(parser.buffer)
+        if not questions and not broken:
+            # 输出结构与预期不同，流式解析未识别出题目
+            for question in _questions_of(quiz_json):
+                question = accept(question)
+                if question:
+                    yield {'type': 'question', 'question': question}
+        for question in _complete_questions(questions, broken, question_count, content, difficulty,
+                                            include_multiple_choice, include_fill_in_blank, notes):
+            questions.append(question)
+            yield {'type': 'question', 'question': question}
+        if not questions:
+            raise ValueError("未生成有效的题目")
+        quiz_json = assemble_quiz(quiz_json, questions)
+        save_cached_quiz(cache_key, quiz_json)
+        yield {'type': 'quiz', 'quiz': quiz_json}
+    except ModelUnavailableError:
+        raise
+    except Exception as e:
+        logger.error(f"流式生成测验失败: {str(e)}")
+        logger.error(f"原始响应: {parser.buffer or '未获取到响应'}")
+        raise ValueError(f"生成测验失败: {str(e)}")
+
 def update_survey_json(quiz_json):
     """更新测验JSON文件"""
     survey_json_path = "../frontend/src/data/survey_json.js"
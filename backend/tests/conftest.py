@@ -0,0 +1,5 @@
+import os
+import sys
+
+# 后端模块以平铺方式导入（from quiz_parser import ...），测试时把 backend 加入搜索路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
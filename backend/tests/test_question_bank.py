@@ -0,0 +1,67 @@
+import pytest
+
+import db_manager
+import question_bank
+from question_bank import estimate_similarity, lsh_band_keys, minhash_signature
+
+
+def _question(title, choices=('栈', '队列', '链表', '树'), answer='栈'):
+    return {'type': 'radiogroup', 'title': title, 'choices': list(choices), 'correctAnswer': answer}
+
+
+TITLE = '在函数调用过程中，用于保存返回地址和局部变量、遵循后进先出原则的数据结构是哪一种？'
+NEAR_TITLE = '在函数调用过程中，用于保存返回地址和局部变量、遵循“后进先出”原则的数据结构是哪个？'
+OTHER_TITLE = 'TCP 三次握手中第二次握手发送的报文段是什么？'
+
+
+def test_signature_is_stable():
+    assert minhash_signature(_question(TITLE)) == minhash_signature(_question(TITLE))
+
+
+def test_punctuation_and_case_are_ignored():
+    assert minhash_signature(_question('Which one is a LIFO structure?')) == \
+        minhash_signature(_question('which one is a lifo structure'))
+
+
+def test_near_duplicate_titles_are_similar():
+    similarity = estimate_similarity(minhash_signature(_question(TITLE)),
+                                     minhash_signature(_question(NEAR_TITLE)))
+    assert similarity >= question_bank._dup_threshold()
+
+
+def test_different_questions_are_not_similar():
+    other = _question(OTHER_TITLE, choices=('SYN', 'ACK', 'SYN+ACK', 'FIN'), answer='SYN+ACK')
+    similarity = estimate_similarity(minhash_signature(_question(TITLE)), minhash_signature(other))
+    assert similarity < 0.3
+
+
+def test_same_title_with_different_answer_is_not_duplicate():
+    similarity = estimate_similarity(
+        minhash_signature(_question(TITLE, answer='栈')),
+        minhash_signature(_question(TITLE, choices=('数组', '队列', '堆', '图'), answer='队列')))
+    assert similarity < question_bank._dup_threshold()
+
+
+def test_near_duplicates_share_an_lsh_bucket():
+    keys = set(lsh_band_keys(minhash_signature(_question(TITLE))))
+    assert keys & set(lsh_band_keys(minhash_signature(_question(NEAR_TITLE))))
+
+
+@pytest.fixture
+def bank_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(db_manager, 'DB_PATH', str(tmp_path / 'test.db'))
+    db_manager.migrate()
+    yield
+    db_manager.release_connection()
+
+
+def test_add_questions_counts_near_duplicates(bank_db):
+    other = _question(OTHER_TITLE, choices=('SYN', 'ACK', 'SYN+ACK', 'FIN'), answer='SYN+ACK')
+    quiz = {'pages': [{'elements': [_question(TITLE), _question(NEAR_TITLE), other]}]}
+    assert question_bank.add_questions(quiz, 'CS101', 1, 'medium') == 2
+
+    rows = db_manager.execute_query("SELECT title, dup_count FROM question_bank ORDER BY id")
+    assert [(row['title'], row['dup_count']) for row in rows] == [(TITLE, 1), (OTHER_TITLE, 0)]
+
+    # 不同章节的题目互不去重
+    assert question_bank.add_questions(quiz, 'CS101', 2, 'medium') == 2
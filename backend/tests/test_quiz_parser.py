@@ -0,0 +1,122 @@
+import json
+
+import pytest
+
+from quiz_parser import QuestionStreamParser, extract_json, validate_questions
+
+
+def _question(name, title='题干', answer='A'):
+    return {
+        'type': 'radiogroup',
+        'name': name,
+        'title': title,
+        'choices': ['A', 'B', 'C', 'D'],
+        'correctAnswer': answer
+    }
+
+
+def _quiz(*questions):
+    return {'title': '测验', 'pages': [{'name': 'page1', 'elements': list(questions)}]}
+
+
+def _feed_in_chunks(parser, text, size=7):
+    questions = []
+    for i in range(0, len(text), size):
+        questions.extend(parser.feed(text[i:i + size]))
+    return questions
+
+
+# extract_json
+
+def test_extract_json_skips_surrounding_text():
+    quiz = _quiz(_question('q1'))
+    text = f"下面是测验：\n```json\n{json.dumps(quiz, ensure_ascii=False)}\n```\n以上。"
+    assert extract_json(text) == quiz
+
+
+def test_extract_json_repairs_bad_escape_and_bare_newline():
+    text = '{"title": "路径 C:\\data", "pages": [{"elements": [{"title": "第一行\n第二行"}]}]}'
+    result = extract_json(text)
+    assert result['title'] == '路径 C:\\data'
+    assert result['pages'][0]['elements'][0]['title'] == '第一行\n第二行'
+
+
+def test_extract_json_drops_trailing_commas():
+    result = extract_json('{"pages": [{"elements": [1, 2, ],}, ]}')
+    assert result == {'pages': [{'elements': [1, 2]}]}
+
+
+def test_extract_json_keeps_braces_inside_strings():
+    quiz = _quiz(_question('q1', title='集合 {1, 2} 与 [3] 的并集'))
+    # 末尾多一个换行使快速路径失败，走逐字符修复
+    text = json.dumps(quiz, ensure_ascii=False).replace('"page1"', '"page\n1"')
+    result = extract_json(text)
+    assert result['pages'][0]['elements'][0]['title'] == '集合 {1, 2} 与 [3] 的并集'
+
+
+def test_extract_json_recovers_truncated_output():
+    text = json.dumps(_quiz(_question('q1'), _question('q2')), ensure_ascii=False)
+    truncated = text[:text.index('"q2"') + 10]
+    result = extract_json(truncated)
+    assert [q['name'] for q in result['pages'][0]['elements']] == ['q1']
+
+
+def test_extract_json_rejects_output_without_complete_member():
+    with pytest.raises(ValueError):
+        extract_json('{"title": "测验", "pages": [{"elements": [{"title": "未完')
+
+
+def test_extract_json_rejects_text_without_object():
+    with pytest.raises(ValueError):
+        extract_json('模型拒绝了请求')
+
+
+# QuestionStreamParser
+
+def test_stream_parser_emits_each_question_once():
+    text = json.dumps(_quiz(_question('q1'), _question('q2'), _question('q3')), ensure_ascii=False)
+    questions = _feed_in_chunks(QuestionStreamParser(), text)
+    assert [q['name'] for q in questions] == ['q1', 'q2', 'q3']
+
+
+def test_stream_parser_ignores_braces_and_quotes_inside_strings():
+    tricky = _question('q1', title='表达式 "{a: [1]}" 中的 } 和 ]')
+    text = json.dumps(_quiz(tricky, _question('q2')), ensure_ascii=False)
+    questions = _feed_in_chunks(QuestionStreamParser(), text, size=3)
+    assert questions == [tricky, _question('q2')]
+
+
+def test_stream_parser_truncated_stream_returns_completed_questions():
+    text = json.dumps(_quiz(_question('q1'), _question('q2')), ensure_ascii=False)
+    truncated = text[:text.index('"q2"') + 10]
+    assert [q['name'] for q in _feed_in_chunks(QuestionStreamParser(), truncated)] == ['q1']
+
+
+def test_stream_parser_returns_panel_as_one_element():
+    panel = {'type': 'panel', 'name': 'panel1', 'elements': [_question('q1'), _question('q2')]}
+    text = json.dumps(_quiz(panel, _question('q3')), ensure_ascii=False)
+    questions = _feed_in_chunks(QuestionStreamParser(), text)
+    assert questions == [panel, _question('q3')]
+
+
+# validate_questions
+
+def test_validate_questions_renumbers_duplicate_names():
+    questions = [_question('question1'), _question('question1'), _question(''), _question('question2')]
+    valid, broken = validate_questions(questions)
+    assert broken == []
+    names = [q['name'] for q in valid]
+    assert len(set(names)) == len(names)
+    # 先出现的题目保留原名，其余重名或缺名的题目重新编号
+    assert names[0] == 'question1'
+    assert all(name.startswith('question') for name in names)
+
+
+def test_validate_questions_aligns_letter_answers_and_reports_broken():
+    ok = _question('q1', answer='b.')
+    ok['choices'] = ['甲', '乙', '丙', '丁']
+    bad = _question('q2', answer='E')
+    valid, broken = validate_questions([ok, bad])
+    assert valid[0]['correctAnswer'] == '乙'
+    assert broken[0][0]['name'] == 'q2'
+    assert '正确答案不在选项中' in broken[0][1]
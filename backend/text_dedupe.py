@@ -0,0 +1,62 @@
+import os
+import re
+import zlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 连续五个词元为一组：英文按单词、中文按单字切分
+SHINGLE_SIZE = 5
+# 分组太少的段落（标题、页码）不做去重
+MIN_SHINGLES = 20
+
+_TOKEN = re.compile(r'[\u4e00-\u9fff]|[a-z0-9]+')
+
+def _dup_threshold():
+    try:
+        return float(os.getenv('DOCUMENT_DEDUP_THRESHOLD', 0.8))
+    except ValueError:
+        return 0.8
+
+def _paragraphs(text):
+    return [paragraph for paragraph in re.split(r'\n\s*\n', text or '') if paragraph.strip()]
+
+def _shingle_hashes(paragraph):
+    tokens = _TOKEN.findall(paragraph.lower())
+    return {zlib.crc32(' '.join(tokens[i:i + SHINGLE_SIZE]).encode('utf-8'))
+            for i in range(max(1, len(tokens) - SHINGLE_SIZE + 1))}
+
+def merge_documents(texts):
+    """
+    合并多份文档的文本，去掉与前面文档重复的段落
+
+    段落的词元分组中有 DOCUMENT_DEDUP_THRESHOLD 以上已出现在前面的文档中时视为重复
+    （按包含度而不是 Jaccard 相似度判断，摘要中摘抄的讲义段落也能识别）。
+    同一文档内部的段落不互相比较，第一份文档完整保留。
+
+    Args:
+        texts: 各文档的文本，按优先级排列
+
+    Returns:
+        合并后的文本
+    """
+    threshold = _dup_threshold()
+    seen = set()
+    merged = []
+    removed = 0
+    for text in texts:
+        kept = []
+        document_hashes = set()
+        for paragraph in _paragraphs(text):
+            hashes = _shingle_hashes(paragraph)
+            if (seen and len(hashes) >= MIN_SHINGLES
+                    and len(hashes & seen) / len(hashes) >= threshold):
+                removed += 1
+                continue
+            kept.append(paragraph)
+            document_hashes |= hashes
+        seen |= document_hashes
+        merged.append('\n\n'.join(kept))
+    if removed:
+        logger.info(f"合并{len(texts)}份文档时去掉了{removed}个重复段落")
+    return '\n\n'.join(part for part in merged if part)
@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import {
   Box,
   Typography,
@@ -12,15 +12,82 @@ import {
   DialogContent,
   DialogTitle,
   Alert,
-  FormControlLabel
+  FormControlLabel,
+  Chip
 } from '@mui/material';
 import DoneIcon from '@mui/icons-material/Done';
 import CloseIcon from '@mui/icons-material/Close';
 
+const API_BASE = 'http://localhost:5000';
+
+// 低价值页面的标签（生成测验时默认跳过）
+const PAGE_LABELS = {
+  blank: '空白页',
+  boilerplate: '仅页眉页脚',
+  toc: '目录/索引'
+};
+
+// 单页预览图需要登录令牌，<img> 无法携带请求头：滚动到可见时再带令牌获取
+function PageImage({ src, alt }) {
+  const ref = useRef(null);
+  const [url, setUrl] = useState(null);
+  
+  useEffect(() => {
+    let objectUrl = null;
+    let cancelled = false;
+    const load = async () => {
+      try {
+        const token = localStorage.getItem('token');
+        const response = await fetch(src, {
+          headers: token ? { Authorization: `Bearer ${token}` } : {},
+        });
+        if (!response.ok || cancelled) {
+          return;
+        }
+        objectUrl = URL.createObjectURL(await response.blob());
+        if (cancelled) {
+          URL.revokeObjectURL(objectUrl);
+        } else {
+          setUrl(objectUrl);
+        }
+      } catch (error) {
+        console.error('获取页面预览失败:', error);
+      }
+    };
+    
+    const observer = new IntersectionObserver(entries => {
+      if (entries.some(entry => entry.isIntersecting)) {
+        observer.disconnect();
+        load();
+      }
+    }, { rootMargin: '200px' });
+    observer.observe(ref.current);
+    
+    return () => {
+      cancelled = true;
+      observer.disconnect();
+      if (objectUrl) {
+        URL.revokeObjectURL(objectUrl);
+      }
+    };
+  }, [src]);
+  
+  return (
+    <img 
+      ref={ref}
+      src={url || undefined} 
+      alt={alt} 
+      style={{ width: '100%', height: 'auto', minHeight: 120, backgroundColor: '#f5f5f5' }}
+    />
+  );
+}
+
 export default function PdfPreview({ file, onPagesSelected, onClose }) {
   const [loading, setLoading] = useState(true);
   const [previews, setPreviews] = useState([]);
   const [selectedPages, setSelectedPages] = useState([]);
+  const [docId, setDocId] = useState(null);
+  const [pageScores, setPageScores] = useState({});
   const [error, setError] = useState(null);
   
   useEffect(() => {
@@ -35,9 +102,14 @@ export default function PdfPreview({ file, onPagesSelected, onClose }) {
       try {
         const formData = new FormData();
         formData.append('file', file);
+        // 只注册文档并获取页数，每页预览图由浏览器按需加载
+        formData.append('mode', 'lazy');
         
-        const response = await fetch('http://localhost:5000/pdf-preview', {
+        // 登录时服务端记录本人上传的文件名，生成测验时按文档ID引用
+        const token = localStorage.getItem('token');
+        const response = await fetch(`${API_BASE}/pdf-preview`, {
           method: 'POST',
+          headers: token ? { Authorization: `Bearer ${token}` } : {},
           body: formData,
         });
         
@@ -47,11 +119,16 @@ export default function PdfPreview({ file, onPagesSelected, onClose }) {
           throw new Error(data.error || '生成预览失败');
         }
         
-        setPreviews(data.previews);
+        setDocId(data.docId);
+        setPreviews(Array.from({ length: data.totalPages }, (_, page) => ({
+          page,
+          image: `${API_BASE}/pdf-preview/${data.docId}/${page}`
+        })));
         
         // 默认选中所有页面
-        const allPages = data.previews.map(preview => preview.page);
+        const allPages = Array.from({ length: data.totalPages }, (_, page) => page);
         setSelectedPages(allPages);
+        loadPageScores(data.docId, allPages);
       } catch (error) {
         console.error('PDF预览生成错误:', error);
         setError(error.message);
@@ -60,9 +137,37 @@ export default function PdfPreview({ file, onPagesSelected, onClose }) {
       }
     };
     
+    // 页面评分需要提取全文，在后台获取，不阻塞预览显示
+    const loadPageScores = async (id, allPages) => {
+      try {
+        const token = localStorage.getItem('token');
+        const response = await fetch(`${API_BASE}/documents/${id}/pages`, {
+          headers: token ? { Authorization: `Bearer ${token}` } : {},
+        });
+        const data = await response.json();
+        if (!response.ok) {
+          return;
+        }
+        
+        const scores = {};
+        data.pages.forEach(item => { scores[item.page] = item; });
+        setPageScores(scores);
+        
+        // 默认不选低价值页面（全部都是低价值页面时保持全选）
+        const contentPages = allPages.filter(page => !scores[page] || scores[page].label === 'content');
+        if (contentPages.length > 0) {
+          setSelectedPages(prevSelected => prevSelected.filter(page => contentPages.includes(page)));
+        }
+      } catch (error) {
+        console.error('获取页面评分失败:', error);
+      }
+    };
+    
     uploadPdf();
   }, [file]);
   
+  const isLowValue = (pageNum) => pageScores[pageNum] && pageScores[pageNum].label !== 'content';
+  
   const handlePageToggle = (pageNum) => {
     setSelectedPages(prevSelected => {
       if (prevSelected.includes(pageNum)) {
@@ -82,8 +187,13 @@ export default function PdfPreview({ file, onPagesSelected, onClose }) {
     setSelectedPages([]);
   };
   
+  const handleSelectContent = () => {
+    setSelectedPages(previews.map(preview => preview.page).filter(page => !isLowValue(page)));
+  };
+  
   const handleConfirm = () => {
-    onPagesSelected(selectedPages);
+    // 同时返回文档ID，生成测验时直接引用，无需再次上传
+    onPagesSelected(selectedPages, docId);
   };
   
   return (
@@ -103,7 +213,7 @@ export default function PdfPreview({ file, onPagesSelected, onClose }) {
           <Box sx={{ display: 'flex', justifyContent: 'center', py: 4 }}>
             <CircularProgress />
             <Typography variant="body1" sx={{ ml: 2 }}>
-              正在生成PDF预览，这可能需要一些时间...
+              正在读取PDF页数...
             </Typography>
           </Box>
         ) : error ? (
@@ -124,6 +234,15 @@ export default function PdfPreview({ file, onPagesSelected, onClose }) {
                 >
                   全选
                 </Button>
+                <Button 
+                  variant="outlined" 
+                  size="small" 
+                  onClick={handleSelectContent}
+                  sx={{ mr: 1 }}
+                  disabled={Object.keys(pageScores).length === 0}
+                >
+                  仅选内容页
+                </Button>
                 <Button 
                   variant="outlined" 
                   size="small" 
@@ -152,11 +271,7 @@ export default function PdfPreview({ file, onPagesSelected, onClose }) {
                     }}
                     onClick={() => handlePageToggle(preview.page)}
                   >
-                    <img 
-                      src={preview.image} 
-                      alt={`Page ${preview.page + 1}`} 
-                      style={{ width: '100%', height: 'auto' }}
-                    />
+                    <PageImage src={preview.image} alt={`Page ${preview.page + 1}`} />
                     <Box 
                       sx={{ 
                         position: 'absolute', 
@@ -176,6 +291,14 @@ export default function PdfPreview({ file, onPagesSelected, onClose }) {
                         <DoneIcon fontSize="small" sx={{ color: 'white' }} />
                       )}
                     </Box>
+                    {isLowValue(preview.page) && (
+                      <Chip
+                        label={PAGE_LABELS[pageScores[preview.page].label] || '低价值页'}
+                        size="small"
+                        color="warning"
+                        sx={{ position: 'absolute', top: 5, left: 5 }}
+                      />
+                    )}
                     <Typography 
                       variant="body2" 
                       align="center" 
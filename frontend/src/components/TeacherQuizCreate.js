@@ -26,7 +26,7 @@ import ArrowBackIcon from '@mui/icons-material/ArrowBack';
 import { styled } from '@mui/material/styles';
 import PdfPreview from '../components/PdfPreview';
 import { getTeacherCourses } from '../services/teacherService';
-import { generateQuiz } from '../services/api';
+import { generateQuiz, getDocumentChapters } from '../services/api';
 
 // 隐藏的文件输入框
 const VisuallyHiddenInput = styled('input')({
@@ -55,6 +55,9 @@ export function TeacherQuizCreatePage() {
   const [fileSelected, setFileSelected] = useState(false);
   const [showPdfPreview, setShowPdfPreview] = useState(false);
   const [selectedPages, setSelectedPages] = useState([]);
+  const [docId, setDocId] = useState(null);
+  const [chapters, setChapters] = useState([]);
+  const [chapterNo, setChapterNo] = useState('');
   const [isPdf, setIsPdf] = useState(false);
   const [snackbar, setSnackbar] = useState({ open: false, message: '', severity: 'success' });
   
@@ -90,6 +93,9 @@ export function TeacherQuizCreatePage() {
       setFile(selectedFile);
       setFileSelected(true);
       setError(null);
+      setDocId(null);
+      setChapters([]);
+      setChapterNo('');
       
       // 检查是否为PDF文件
       const isPdfFile = selectedFile.type === 'application/pdf' || 
@@ -125,9 +131,21 @@ export function TeacherQuizCreatePage() {
   };
 
   // 处理页面选择完成
-  const handlePagesSelected = (pages) => {
+  const handlePagesSelected = async (pages, selectedDocId) => {
     setSelectedPages(pages);
     setShowPdfPreview(false);
+    
+    if (selectedDocId && selectedDocId !== docId) {
+      setDocId(selectedDocId);
+      setChapterNo('');
+      try {
+        // 只有识别出多个章节时才提供按章节生成
+        const documentChapters = await getDocumentChapters(selectedDocId);
+        setChapters(documentChapters.length > 1 ? documentChapters : []);
+      } catch (error) {
+        setChapters([]);
+      }
+    }
   };
 
   // 关闭PDF预览对话框
@@ -152,7 +170,12 @@ export function TeacherQuizCreatePage() {
     setError(null);
 
     const formData = new FormData();
-    formData.append("file", file);
+    // 预览时已上传的文档直接引用文档ID
+    if (docId) {
+      formData.append("docId", docId);
+    } else {
+      formData.append("file", file);
+    }
     formData.append("questionCount", questionCount);
     formData.append("difficulty", difficulty);
     formData.append("courseId", courseId);
@@ -170,6 +193,11 @@ export function TeacherQuizCreatePage() {
     if (isPdf && selectedPages.length > 0) {
       formData.append("selectedPages", JSON.stringify(selectedPages));
     }
+    
+    // 按识别出的章节生成，测验布置到同名章节
+    if (chapterNo !== '') {
+      formData.append("chapterNo", chapterNo);
+    }
 
     try {
       const response = await generateQuiz(formData);
@@ -295,6 +323,26 @@ export function TeacherQuizCreatePage() {
               </Select>
             </FormControl>
             
+            {chapters.length > 0 && (
+              <FormControl fullWidth margin="normal">
+                <InputLabel id="chapter-label">文档章节</InputLabel>
+                <Select
+                  labelId="chapter-label"
+                  id="chapter"
+                  value={chapterNo}
+                  label="文档章节"
+                  onChange={(e) => setChapterNo(e.target.value)}
+                >
+                  <MenuItem value="">按所选页面（不分章节）</MenuItem>
+                  {chapters.map(chapter => (
+                    <MenuItem key={chapter.chapter_no} value={chapter.chapter_no}>
+                      {chapter.title}（第 {chapter.start_page + 1}-{chapter.end_page + 1} 页）
+                    </MenuItem>
+                  ))}
+                </Select>
+              </FormControl>
+            )}
+            
             <TextField
               fullWidth
               multiline
@@ -24,7 +24,9 @@ import { format } from 'date-fns';
 
 export function AnalyticsHistoryPage() {
   const [analyses, setAnalyses] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
   const [loading, setLoading] = useState(true);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [error, setError] = useState(null);
   const history = useHistory();
 
@@ -32,7 +34,8 @@ export function AnalyticsHistoryPage() {
     const fetchAnalyses = async () => {
       try {
         const data = await getAnalyses();
-        setAnalyses(data);
+        setAnalyses(data.items);
+        setNextCursor(data.next_cursor);
         setLoading(false);
       } catch (error) {
         console.error("获取分析历史失败:", error);
@@ -44,6 +47,21 @@ export function AnalyticsHistoryPage() {
     fetchAnalyses();
   }, []);
 
+  // 加载下一页
+  const handleLoadMore = async () => {
+    try {
+      setLoadingMore(true);
+      const data = await getAnalyses({ cursor: nextCursor });
+      setAnalyses((prev) => [...prev, ...data.items]);
+      setNextCursor(data.next_cursor);
+    } catch (error) {
+      console.error("加载更多分析失败:", error);
+      setError("无法加载更多分析。请稍后再试。");
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const handleViewAnalysis = (analysisId) => {
     history.push(`/analytics/${analysisId}`);
   };
@@ -145,6 +163,13 @@ export function AnalyticsHistoryPage() {
                 </ListItem>
               </React.Fragment>
             ))}
+            {nextCursor && (
+              <ListItem sx={{ justifyContent: 'center', pt: 2 }}>
+                <Button variant="outlined" onClick={handleLoadMore} disabled={loadingMore}>
+                  {loadingMore ? '加载中...' : '加载更多'}
+                </Button>
+              </ListItem>
+            )}
           </List>
         ) : (
           <Box sx={{ textAlign: 'center', py: 4 }}>
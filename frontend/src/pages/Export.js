@@ -28,6 +28,8 @@ import { format } from "date-fns";
 export function ExportToPDFPage() {
   // 剩余代码保持不变
   const [quizzes, setQuizzes] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [selectedQuiz, setSelectedQuiz] = useState(null);
   const [loading, setLoading] = useState(true);
   const [exporting, setExporting] = useState(false);
@@ -37,7 +39,8 @@ export function ExportToPDFPage() {
     const fetchQuizzes = async () => {
       try {
         const data = await getQuizzes();
-        setQuizzes(data);
+        setQuizzes(data.items);
+        setNextCursor(data.next_cursor);
         setLoading(false);
       } catch (error) {
         console.error("获取测验列表失败:", error);
@@ -47,10 +50,23 @@ export function ExportToPDFPage() {
     };
 
     fetchQuizzes();
-
-    fetchQuizzes();
   }, []);
 
+  // 加载下一页
+  const handleLoadMore = async () => {
+    try {
+      setLoadingMore(true);
+      const data = await getQuizzes({ cursor: nextCursor });
+      setQuizzes((prev) => [...prev, ...data.items]);
+      setNextCursor(data.next_cursor);
+    } catch (error) {
+      console.error("加载更多测验失败:", error);
+      setError("无法加载更多测验。请稍后再试。");
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const handleSelectQuiz = async (quizId) => {
     try {
       setExporting(true);
@@ -209,6 +225,13 @@ export function ExportToPDFPage() {
                     </ListItem>
                   </React.Fragment>
                 ))}
+                {nextCursor && (
+                  <ListItem sx={{ justifyContent: "center", pt: 2 }}>
+                    <Button variant="outlined" onClick={handleLoadMore} disabled={loadingMore}>
+                      {loadingMore ? "加载中..." : "加载更多"}
+                    </Button>
+                  </ListItem>
+                )}
               </List>
             ) : (
               <Box sx={{ textAlign: "center", py: 4 }}>
@@ -23,7 +23,7 @@ import {
 import CloudUploadIcon from '@mui/icons-material/CloudUpload';
 import { styled } from '@mui/material/styles';
 import { useHistory } from "react-router-dom";
-import { generateQuiz } from "../services/api";
+import { streamGenerateQuiz } from "../services/api";
 import PdfPreview from '../components/PdfPreview';
 
 // 自定义文件上传按钮样式
@@ -50,7 +50,11 @@ export function HomePage() {
   const [fileSelected, setFileSelected] = useState(false);
   const [showPdfPreview, setShowPdfPreview] = useState(false);
   const [selectedPages, setSelectedPages] = useState([]);
+  // 预览时已上传到服务器的文档ID
+  const [docId, setDocId] = useState(null);
   const [isPdf, setIsPdf] = useState(false);
+  // 流式生成过程中已收到的题目
+  const [streamedQuestions, setStreamedQuestions] = useState([]);
   // 题目类型状态
   const [questionTypes, setQuestionTypes] = useState({
     multipleChoice: true,
@@ -62,6 +66,7 @@ export function HomePage() {
       const selectedFile = event.target.files[0];
       setFile(selectedFile);
       setFileSelected(true);
+      setDocId(null);
       setError(null);
       
       // 检查是否为PDF文件
@@ -98,8 +103,9 @@ export function HomePage() {
   };
 
   // 处理页面选择完成
-  const handlePagesSelected = (pages) => {
+  const handlePagesSelected = (pages, uploadedDocId) => {
     setSelectedPages(pages);
+    setDocId(uploadedDocId);
     setShowPdfPreview(false);
   };
 
@@ -117,9 +123,15 @@ export function HomePage() {
     e.preventDefault();
     setLoading(true);
     setError(null);
+    setStreamedQuestions([]);
 
     const formData = new FormData();
-    formData.append("file", file);
+    // 预览时已上传过的PDF只传文档ID
+    if (docId) {
+      formData.append("docId", docId);
+    } else {
+      formData.append("file", file);
+    }
     formData.append("questionCount", questionCount);
     formData.append("difficulty", difficulty);
     
@@ -138,8 +150,10 @@ export function HomePage() {
     }
 
     try {
-      // 修改: 从响应中获取quiz_id
-      const response = await generateQuiz(formData);
+      // 流式生成，题目逐道显示，完成后获取quiz_id
+      const response = await streamGenerateQuiz(formData, (question) => {
+        setStreamedQuestions(prev => [...prev, question]);
+      });
       setLoading(false);
       
       // 生成成功后直接跳转到相应测验页面
@@ -280,6 +294,19 @@ export function HomePage() {
                 helperText="例如：侧重某个章节、题型偏好、特定知识点等"
               />
 
+              {loading && streamedQuestions.length > 0 && (
+                <Box sx={{ mt: 2 }}>
+                  <Typography variant="subtitle1" gutterBottom>
+                    已生成 {streamedQuestions.length} / {questionCount} 题
+                  </Typography>
+                  {streamedQuestions.map((question, index) => (
+                    <Typography key={question.name || index} variant="body2" sx={{ mb: 0.5 }}>
+                      {index + 1}. {question.title}
+                    </Typography>
+                  ))}
+                </Box>
+              )}
+
               {error && (
                 <Alert severity="error" sx={{ mt: 2 }}>
                   {error}
@@ -14,6 +14,10 @@ import {
   Button,
   IconButton,
   Tooltip,
+  FormControl,
+  InputLabel,
+  Select,
+  MenuItem,
 } from '@mui/material';
 import PlayArrowIcon from '@mui/icons-material/PlayArrow';
 import FolderIcon from '@mui/icons-material/Folder';
@@ -23,15 +27,20 @@ import { format } from 'date-fns';
 
 export function QuizHistoryPage() {
   const [quizzes, setQuizzes] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [difficulty, setDifficulty] = useState('');
   const [loading, setLoading] = useState(true);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [error, setError] = useState(null);
   const history = useHistory();
 
   useEffect(() => {
     const fetchQuizzes = async () => {
       try {
-        const data = await getQuizzes();
-        setQuizzes(data);
+        setLoading(true);
+        const data = await getQuizzes({ difficulty: difficulty || undefined });
+        setQuizzes(data.items);
+        setNextCursor(data.next_cursor);
         setLoading(false);
       } catch (error) {
         console.error("获取测验历史失败:", error);
@@ -41,7 +50,22 @@ export function QuizHistoryPage() {
     };
 
     fetchQuizzes();
-  }, []);
+  }, [difficulty]);
+
+  // 加载下一页
+  const handleLoadMore = async () => {
+    try {
+      setLoadingMore(true);
+      const data = await getQuizzes({ cursor: nextCursor, difficulty: difficulty || undefined });
+      setQuizzes((prev) => [...prev, ...data.items]);
+      setNextCursor(data.next_cursor);
+    } catch (error) {
+      console.error("加载更多测验失败:", error);
+      setError("无法加载更多测验。请稍后再试。");
+    } finally {
+      setLoadingMore(false);
+    }
+  };
 
   const handleStartQuiz = (quizId) => {
     history.push(`/survey/${quizId}`);
@@ -90,6 +114,18 @@ export function QuizHistoryPage() {
         测验历史
       </Typography>
 
+      <Box sx={{ display: 'flex', justifyContent: 'flex-end', mb: 2 }}>
+        <FormControl size="small" sx={{ minWidth: 140 }}>
+          <InputLabel>难度</InputLabel>
+          <Select value={difficulty} label="难度" onChange={(e) => setDifficulty(e.target.value)}>
+            <MenuItem value="">全部</MenuItem>
+            <MenuItem value="easy">简单</MenuItem>
+            <MenuItem value="medium">中等</MenuItem>
+            <MenuItem value="hard">困难</MenuItem>
+          </Select>
+        </FormControl>
+      </Box>
+
       <Paper elevation={3} sx={{ p: 3, borderRadius: 2 }}>
         {quizzes.length > 0 ? (
           <List>
@@ -161,6 +197,13 @@ export function QuizHistoryPage() {
                 </ListItem>
               </React.Fragment>
             ))}
+            {nextCursor && (
+              <ListItem sx={{ justifyContent: 'center', pt: 2 }}>
+                <Button variant="outlined" onClick={handleLoadMore} disabled={loadingMore}>
+                  {loadingMore ? '加载中...' : '加载更多'}
+                </Button>
+              </ListItem>
+            )}
           </List>
         ) : (
           <Box sx={{ textAlign: 'center', py: 4 }}>
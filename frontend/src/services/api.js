@@ -38,20 +38,106 @@ api.interceptors.response.use(
   }
 );
 
+// 测验生成任务轮询间隔
+const JOB_POLL_INTERVAL = 2000;
+
 // 测验相关接口
-export const generateQuiz = async (formData) => {
+export const getJobStatus = async (jobId) => {
   try {
-    const response = await api.post('/generate-quiz', formData);
+    const response = await api.get(`/jobs/${jobId}`);
     return response.data;
+  } catch (error) {
+    console.error(`Error fetching job ${jobId}:`, error);
+    throw error;
+  }
+};
+
+// 提交生成任务并轮询直到完成，onProgress 可用于展示进度
+export const generateQuiz = async (formData, onProgress) => {
+  try {
+    const response = await api.post('/generate-quiz', formData);
+    const { job_id: jobId } = response.data;
+
+    while (true) {
+      await new Promise(resolve => setTimeout(resolve, JOB_POLL_INTERVAL));
+      const job = await getJobStatus(jobId);
+      if (onProgress) {
+        onProgress(job);
+      }
+      if (job.status === 'succeeded') {
+        return { success: true, quiz_id: job.quiz_id, chapter_id: job.chapter_id, message: job.message };
+      }
+      if (job.status === 'failed') {
+        throw new Error(job.error || job.message);
+      }
+    }
   } catch (error) {
     console.error('Error generating quiz:', error);
     throw error;
   }
 };
 
-export const getQuizzes = async () => {
+// 流式生成测验：每收到一道题调用 onQuestion，结束后返回 { quiz_id, chapter_id }
+export const streamGenerateQuiz = async (formData, onQuestion) => {
+  const token = localStorage.getItem('token');
+  const response = await fetch(`${API_BASE_URL}/generate-quiz/stream`, {
+    method: 'POST',
+    headers: token ? { Authorization: `Bearer ${token}` } : {},
+    body: formData,
+  });
+
+  if (!response.ok) {
+    const data = await response.json().catch(() => ({}));
+    throw new Error(data.error || data.message || `HTTP ${response.status}`);
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder('utf-8');
+  let buffer = '';
+  let result = null;
+
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    // SSE 事件之间以空行分隔
+    let boundary = buffer.indexOf('\n\n');
+    while (boundary >= 0) {
+      const frame = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+      boundary = buffer.indexOf('\n\n');
+
+      let event = 'message';
+      let data = '';
+      frame.split('\n').forEach(line => {
+        if (line.startsWith('event:')) event = line.slice(6).trim();
+        else if (line.startsWith('data:')) data += line.slice(5).trim();
+      });
+      if (!data) continue;
+
+      const payload = JSON.parse(data);
+      if (event === 'question') {
+        if (onQuestion) onQuestion(payload);
+      } else if (event === 'done') {
+        result = payload;
+      } else if (event === 'error') {
+        throw new Error(payload.error);
+      }
+    }
+  }
+
+  if (!result) {
+    throw new Error('生成中断，请重试');
+  }
+  return result;
+};
+
+// 历史列表按游标分页：返回 { items, next_cursor }，next_cursor 为空表示没有更多
+// params: { limit, cursor, userId, courseId, difficulty }
+export const getQuizzes = async (params = {}) => {
   try {
-    const response = await api.get('/quizzes');
+    const response = await api.get('/quizzes', { params });
     return response.data;
   } catch (error) {
     console.error('Error fetching quizzes:', error);
@@ -80,9 +166,9 @@ export const analyzeQuiz = async (answers, quizId) => {
   }
 };
 
-export const getAnalyses = async () => {
+export const getAnalyses = async (params = {}) => {
   try {
-    const response = await api.get('/analyses');
+    const response = await api.get('/analyses', { params });
     return response.data;
   } catch (error) {
     console.error('Error fetching analyses:', error);
@@ -113,13 +199,50 @@ export const getPdfPreview = async (file) => {
   }
 };
 
+// 文档章节划分（书签或章节标题识别），可按章节生成测验
+export const getDocumentChapters = async (docId) => {
+  try {
+    const response = await api.get(`/documents/${docId}/chapters`);
+    return response.data.chapters;
+  } catch (error) {
+    console.error(`Error fetching chapters of document ${docId}:`, error);
+    throw error;
+  }
+};
+
+// 逐题统计接口（仅任课教师）
+export const getHardestItems = async (courseId, params = {}) => {
+  try {
+    const response = await api.get(`/courses/${courseId}/hardest-items`, { params });
+    return response.data.items;
+  } catch (error) {
+    console.error(`Error fetching hardest items of course ${courseId}:`, error);
+    throw error;
+  }
+};
+
+export const getItemMisses = async (quizId, itemNo) => {
+  try {
+    const response = await api.get(`/quizzes/${quizId}/items/${itemNo}/misses`);
+    return response.data.students;
+  } catch (error) {
+    console.error(`Error fetching misses of quiz ${quizId} item ${itemNo}:`, error);
+    throw error;
+  }
+};
+
 // 导出所有函数
 export default {
   generateQuiz,
+  getJobStatus,
+  streamGenerateQuiz,
   getQuizzes,
   getQuizById,
   analyzeQuiz,
   getAnalyses,
   getAnalysisById,
-  getPdfPreview
+  getPdfPreview,
+  getDocumentChapters,
+  getHardestItems,
+  getItemMisses
 };
\ No newline at end of file